@@ -1,11 +1,17 @@
-from fastapi import APIRouter, UploadFile, File, Depends
+from typing import Literal, Optional
+from fastapi import APIRouter, UploadFile, File, Depends, Request
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import SessionLocal, get_db
+from app.core.responses import ndjson_response, negotiated_response
 from app.api.v1.students.services.excel_inspect import inspect_excel
 from .services.students import Student
 
 from app.api.v1.students.services.excel_proccessor_high_level import ExcelProcessor as ExcelProcessorHighSchool
 from app.api.v1.students.services.excel_processor_primary_level import ExcelProcessor as ExcelProcessorPrimary
+from app.api.v1.students.services.grades_loader import GradesLoader
+
+# Mismos valores que upload_artifacts.ARTIFACT_KINDS
+ArtifactKind = Literal["secundaria", "primaria"]
 
 router = APIRouter(
     prefix="/students",
@@ -23,10 +29,27 @@ router = APIRouter(
 
 
 @router.get("/")
-async def get_students(page: int = 1, page_size: int = 10, db: Session = Depends(get_db)):
+async def get_students(
+    request: Request,
+    page: int = 1,
+    page_size: int = 10,
+    after: str = None,
+    limit: int = None,
+    count_strategy: str = None,
+    include_total: bool = True,
+    db: Session = Depends(get_db)
+):
+    """
+    Endpoint para obtener alumnos con sus datos asociados.
+
+    - **page** / **page_size**: Paginación por página (incluye total_records)
+    - **after** / **limit**: Paginación por cursor; se usa el next_cursor de la respuesta anterior
+    - **count_strategy**: Cómo calcular total_records: "exact", "estimated" o "cached" (por defecto la configurada)
+    - **include_total**: Si es false no se calcula total_records
+    """
     students_service = Student(db)
     print(f"page: {page}, page_size: {page_size}")
-    return students_service.get_students(page, page_size)
+    return negotiated_response(request, students_service.get_students(page, page_size, after, limit, count_strategy, include_total))
 
 @router.get("/filters")
 def get_available_filters(db: Session = Depends(get_db)):
@@ -38,6 +61,7 @@ def get_available_filters(db: Session = Depends(get_db)):
 
 @router.get("/by-filters/")
 async def get_students_by_filters(
+    request: Request,
     anio_academico_id: int = None,
     seccion_id: int = None,
     nivel_id: int = None,
@@ -46,13 +70,19 @@ async def get_students_by_filters(
     materia_id: int = None,
     page: int = 1,
     page_size: int = 10,
+    after: str = None,
+    limit: int = None,
+    count_strategy: str = None,
+    include_total: bool = True,
     db: Session = Depends(get_db)
 ):
     """
     Endpoint para obtener alumnos filtrados por los parámetros proporcionados utilizando IDs.
+    Con **after** / **limit** pagina por cursor en lugar de por página.
+    **count_strategy** ("exact", "estimated" o "cached") e **include_total** controlan el cálculo de total_records.
     """
     students_service = Student(db)
-    return students_service.get_students_with_filters(
+    students = students_service.get_students_with_filters(
         anio_academico_id=anio_academico_id,
         seccion_id=seccion_id,
         nivel_id=nivel_id,
@@ -60,8 +90,13 @@ async def get_students_by_filters(
         bimestre_id=bimestre_id,
         materia_id=materia_id,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        after=after,
+        limit=limit,
+        count_strategy=count_strategy,
+        include_total=include_total
     )
+    return negotiated_response(request, students)
 
 @router.post("/save-high-school-grades/")
 async def parse_save_data(file: UploadFile = File(...), db: Session = Depends
@@ -77,25 +112,37 @@ async def parse_save_primary_data(file: UploadFile = File(...), db: Session = De
     excel_content = await file.read()
     return processor.process_student_califications(excel_content)
 
-@router.get("/{student_id}")
-async def get_student_by_id(student_id: int, db: Session = Depends(get_db)):
-    student_repo = Student(db)
-    return student_repo.get_student_by_id(student_id)
+@router.post("/replay-uploads/")
+def replay_uploads(kind: Optional[ArtifactKind] = None, content_hash: str = None, db: Session = Depends(get_db)):
+    """
+    Reconstruye las notas desde los artefactos Parquet de cargas anteriores, sin volver a leer los Excel.
+
+    - **kind**: Tipo de plantilla a reprocesar ("secundaria" o "primaria", opcional)
+    - **content_hash**: Hash del archivo original a reprocesar (opcional)
+    """
+    loader = GradesLoader(db)
+    return loader.replay(kind, content_hash)
 
 @router.get("/only-notes")
-def get_students_with_only_notes(db: Session = Depends(get_db)):
+def get_students_with_only_notes(request: Request, db: Session = Depends(get_db)):
     student_service = Student(db)
-    return student_service.get_students_with_only_notes()
+    return negotiated_response(request, student_service.get_students_with_only_notes())
 
 @router.get("/only-surveys")
-def get_students_with_only_surveys(db: Session = Depends(get_db)):
+def get_students_with_only_surveys(request: Request, db: Session = Depends(get_db)):
     student_service = Student(db)
-    return student_service.get_students_with_only_surveys()
+    return negotiated_response(request, student_service.get_students_with_only_surveys())
 
 @router.get("/notes-and-surveys")
-def get_students_with_notes_and_surveys(db: Session = Depends(get_db)):
+def get_students_with_notes_and_surveys(request: Request, db: Session = Depends(get_db)):
     student_service = Student(db)
-    return student_service.get_students_with_notes_and_surveys()
+    return negotiated_response(request, student_service.get_students_with_notes_and_surveys())
+
+# Va después de las rutas fijas de un solo segmento (/only-notes, ...) para no capturarlas como id
+@router.get("/{student_id}")
+async def get_student_by_id(student_id: int, request: Request, db: Session = Depends(get_db)):
+    student_repo = Student(db)
+    return negotiated_response(request, student_repo.get_student_by_id(student_id))
 
 @router.get("/summary/all")
 def get_students_summary(db: Session = Depends(get_db)):
@@ -120,12 +167,17 @@ def get_grades_and_sections(
 
 @router.get("/notes/get-all")
 async def get_student_notes(
+    request: Request,
     alumno_id: int = None,
     materia_id: int = None,
     grado_id: int = None,
     anio_academico_id: int = None,
     page: int = 1,
     page_size: int = 10,
+    after: str = None,
+    limit: int = None,
+    count_strategy: str = None,
+    include_total: bool = True,
     db: Session = Depends(get_db)
 ):
     """
@@ -137,16 +189,25 @@ async def get_student_notes(
     - **anio_academico_id**: ID del año académico (opcional)
     - **page**: Número de página (default: 1)
     - **page_size**: Tamaño de página (default: 10)
+    - **after**: Cursor devuelto como next_cursor en la página anterior (paginación por cursor)
+    - **limit**: Tamaño de página en la paginación por cursor
+    - **count_strategy**: Cómo calcular total_records: "exact", "estimated" o "cached" (por defecto la configurada)
+    - **include_total**: Si es false no se calcula total_records
     """
     student_service = Student(db)
-    return student_service.get_student_notes(
+    notes = student_service.get_student_notes(
         alumno_id=alumno_id,
         materia_id=materia_id,
         grado_id=grado_id,
         anio_academico_id=anio_academico_id,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        after=after,
+        limit=limit,
+        count_strategy=count_strategy,
+        include_total=include_total
     )
+    return negotiated_response(request, notes)
 
 
 
@@ -154,6 +215,7 @@ async def get_student_notes(
 
 @router.get("/analytics/student-performance/")
 async def get_student_performance_data(
+    request: Request,
     include_surveys: bool = False,
     db: Session = Depends(get_db)
 ):
@@ -165,10 +227,11 @@ async def get_student_performance_data(
     """
     student_service = Student(db)
 
-    return student_service.get_student_performance_data(include_surveys)
+    return negotiated_response(request, student_service.get_student_performance_data(include_surveys))
 
 @router.get("/analytics/behavior-patterns/")
 async def get_student_behavior_patterns(
+    request: Request,
     min_survey_responses: int = 1,
     min_academic_periods: int = 1,
     db: Session = Depends(get_db)
@@ -181,13 +244,15 @@ async def get_student_behavior_patterns(
     - min_academic_periods: Número mínimo de períodos académicos con notas
     """
     student_service = Student(db)
-    return student_service.get_student_behavior_patterns(
+    patterns = student_service.get_student_behavior_patterns(
         min_survey_responses,
         min_academic_periods
     )
+    return negotiated_response(request, patterns)
 
 @router.get("/analytics/complete-student-profile/")
 async def get_complete_student_profile(
+    request: Request,
     analysis_type: str = "all",
     db: Session = Depends(get_db)
 ):
@@ -201,4 +266,54 @@ async def get_complete_student_profile(
         - "behavioral": Solo estudiantes con encuestas
     """
     student_service = Student(db)
-    return student_service.get_complete_student_profile(analysis_type)
+    return negotiated_response(request, student_service.get_complete_student_profile(analysis_type))
+
+
+@router.post("/analytics/rebuild-profiles/")
+async def rebuild_student_profiles(only_missing: bool = False, db: Session = Depends(get_db)):
+    """
+    Vuelve a armar los perfiles de análisis precalculados de todos los estudiantes.
+    Las cargas y ediciones ya los actualizan solas; sirve después de cambios hechos directo en la base de datos.
+    Con only_missing=true solo arma los de estudiantes que aún no tienen.
+    """
+    student_service = Student(db)
+    return student_service.rebuild_student_profiles(only_missing)
+
+def _stream_from_new_session(produce):
+    """
+    Genera los elementos de produce(Student) con una sesión propia que se cierra al terminar el envío.
+    La sesión de get_db se cierra al salir del endpoint, antes de que la respuesta termine de enviarse.
+    """
+    db = SessionLocal()
+    try:
+        yield from produce(Student(db))
+    finally:
+        db.close()
+
+@router.get("/analytics/student-performance/stream")
+async def stream_student_performance_data(include_surveys: bool = False):
+    """
+    Igual que /analytics/student-performance/, pero en NDJSON: un estudiante por línea,
+    leído de la base por lotes, para que la memoria no crezca con la cantidad de estudiantes.
+    """
+    return ndjson_response(_stream_from_new_session(
+        lambda student_service: student_service.iter_student_performance_data(include_surveys)
+    ))
+
+@router.get("/analytics/behavior-patterns/stream")
+async def stream_student_behavior_patterns(min_survey_responses: int = 1, min_academic_periods: int = 1):
+    """
+    Igual que /analytics/behavior-patterns/, pero en NDJSON: un estudiante por línea.
+    """
+    return ndjson_response(_stream_from_new_session(
+        lambda student_service: student_service.iter_student_behavior_patterns(min_survey_responses, min_academic_periods)
+    ))
+
+@router.get("/analytics/complete-student-profile/stream")
+async def stream_complete_student_profile(analysis_type: str = "all"):
+    """
+    Igual que /analytics/complete-student-profile/, pero en NDJSON: un perfil por línea.
+    """
+    return ndjson_response(_stream_from_new_session(
+        lambda student_service: student_service.iter_complete_student_profile(analysis_type)
+    ))
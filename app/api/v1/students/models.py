@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, TIMESTAMP, Text
+from sqlalchemy import ARRAY, JSON, Boolean, Column, Integer, SmallInteger, String, ForeignKey, TIMESTAMP, Text, Index, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
+from app.utils.normalize_text import normalize_text
 
 
 class Alumno(Base):
@@ -9,9 +10,21 @@ class Alumno(Base):
     id = Column(Integer, primary_key=True, index=True)
     codigo_alumno = Column(String, unique=True, index=True, nullable=True)
     nombre_completo = Column(String, index=True)
+    # Nombre sin tildes, en minúsculas y sin símbolos; se mantiene al insertar y actualizar
+    nombre_normalizado = Column(String, nullable=True)
     edad = Column(Integer, nullable=True)
     genero = Column(String(10), nullable=False)  # 'masculino', 'femenino'
 
+    __table_args__ = (
+        # Índice de trigramas (pg_trgm) para buscar nombres parecidos
+        Index(
+            "ix_alumnos_nombre_normalizado_trgm",
+            "nombre_normalizado",
+            postgresql_using="gin",
+            postgresql_ops={"nombre_normalizado": "gin_trgm_ops"}
+        ),
+    )
+
     # Relación con HistorialAcademico
     historial_academico = relationship("HistorialAcademico", back_populates="alumno")
 
@@ -19,6 +32,13 @@ class Alumno(Base):
     encuestas = relationship("Encuesta", back_populates="alumno")
 
 
+@event.listens_for(Alumno, "before_insert")
+@event.listens_for(Alumno, "before_update")
+def set_normalized_name(mapper, connection, alumno):
+    """Mantiene nombre_normalizado sincronizado con nombre_completo"""
+    alumno.nombre_normalizado = normalize_text(alumno.nombre_completo)
+
+
 class NivelEducativo(Base):
     __tablename__ = "niveles_educativos"
     id = Column(Integer, primary_key=True, index=True)
@@ -36,7 +56,7 @@ class AnioAcademico(Base):
 class HistorialAcademico(Base):
     __tablename__ = "historial_academico"
     id = Column(Integer, primary_key=True, index=True)
-    alumno_id = Column(Integer, ForeignKey("alumnos.id"), nullable=False)
+    alumno_id = Column(Integer, ForeignKey("alumnos.id"), nullable=False, index=True)
     anio_academico_id = Column(Integer, ForeignKey("anios_academicos.id"), nullable=False)
     nivel_id = Column(Integer, ForeignKey("niveles_educativos.id"), nullable=False)
     grado_id = Column(Integer, ForeignKey("grados.id"), nullable=False)
@@ -99,22 +119,24 @@ class Nota(Base):
     __tablename__ = "notas"
     id = Column(Integer, primary_key=True, index=True)
     historial_id = Column(Integer, ForeignKey(
-        "historial_academico.id"), nullable=False)
-    materia_id = Column(Integer, ForeignKey("materias.id"), nullable=False)
-    bimestre_id = Column(Integer, ForeignKey("bimestres.id"), nullable=False)
+        "historial_academico.id"), nullable=False, index=True)
+    materia_id = Column(Integer, ForeignKey("materias.id"), nullable=False, index=True)
+    bimestre_id = Column(Integer, ForeignKey("bimestres.id"), nullable=False, index=True)
     criterio_evaluacion_id = Column(Integer, ForeignKey(
         "criterios_evaluacion.id", onupdate="CASCADE"), nullable=False)
     valor_criterio_de_evaluacion = Column(String(1000), nullable=False)
     nivel_logro_id = Column(Integer, ForeignKey(
         "niveles_logro.id"), nullable=True)
+    # Hash del archivo que trajo la nota; al volver a cargarlo se reemplazan solo sus notas
+    carga = Column(String(64), nullable=True, index=True)
 
-    # Relaciones
-    historial = relationship("HistorialAcademico", lazy='joined')
-    materia = relationship("Materia", lazy='joined')
-    bimestre = relationship("Bimestre", lazy='joined')
-    criterio_evaluacion = relationship("CriterioEvaluacion", lazy='joined')
-    nivel_logro = relationship("NivelLogro", lazy='joined')
-    historial_academico = relationship("HistorialAcademico", back_populates="notas")
+    # Relaciones; se cargan al acceder a ellas, cada lectura declara con options() lo que necesita
+    historial = relationship("HistorialAcademico", overlaps="historial_academico,notas")
+    materia = relationship("Materia")
+    bimestre = relationship("Bimestre")
+    criterio_evaluacion = relationship("CriterioEvaluacion")
+    nivel_logro = relationship("NivelLogro")
+    historial_academico = relationship("HistorialAcademico", back_populates="notas", overlaps="historial")
 
 class PreguntaEncuesta(Base):
     __tablename__ = "preguntas_encuesta"
@@ -145,6 +167,11 @@ class Encuesta(Base):
     alumno_id = Column(Integer, ForeignKey("alumnos.id"), nullable=False)
     fecha = Column(TIMESTAMP, server_default=func.now())
 
+    __table_args__ = (
+        # Una encuesta por alumno y año: volver a cargar la hoja reemplaza sus respuestas
+        UniqueConstraint("alumno_id", "anio", name="uq_encuestas_alumno_anio"),
+    )
+
     alumno = relationship("Alumno", back_populates="encuestas")
 
     respuestas = relationship("RespuestaEncuesta", back_populates="encuesta", cascade="all, delete-orphan")
@@ -174,6 +201,52 @@ class RespuestaTextoEncuesta(Base):
     encuesta = relationship("Encuesta", back_populates="respuestas_texto")
     pregunta = relationship("PreguntaEncuesta")
 
+
+class RespuestaEncuestaCompacta(Base):
+    """
+    Respuestas cerradas de una encuesta en una sola fila: un código por pregunta, en el orden de SURVEY_LAYOUT.
+    Opción única: posición (desde 1) de la opción marcada, 0 sin respuesta. Opción múltiple: máscara de bits.
+    Se mantiene al cargar encuestas, junto con respuestas_encuesta.
+    """
+    __tablename__ = "respuestas_encuesta_compactas"
+    encuesta_id = Column(Integer, ForeignKey("encuestas.id", ondelete="CASCADE"), primary_key=True)
+    alumno_id = Column(Integer, ForeignKey("alumnos.id"), nullable=False, index=True)
+    anio = Column(Integer)
+    codigos = Column(ARRAY(SmallInteger).with_variant(JSON(), "sqlite"), nullable=False)
+
+
+class AliasAlumno(Base):
+    __tablename__ = "alias_alumnos"
+    id = Column(Integer, primary_key=True, index=True)
+    # Nombre tal como llega en la encuesta, ya normalizado
+    nombre_normalizado = Column(String, unique=True, index=True, nullable=False)
+    alumno_id = Column(Integer, ForeignKey("alumnos.id"), nullable=False)
+    origen = Column(String(20), nullable=False, default="automatico")  # 'automatico' o 'manual'
+    fecha = Column(TIMESTAMP, server_default=func.now())
+
+    alumno = relationship("Alumno")
+
+
+class PerfilAlumno(Base):
+    """
+    Documento de análisis precalculado de un alumno (perfil completo o rendimiento), listo para responder.
+    Se vuelve a armar para los alumnos que toca cada carga, edición o fusión de alumnos.
+    """
+    __tablename__ = "perfiles_alumnos"
+    id = Column(Integer, primary_key=True, index=True)
+    alumno_id = Column(Integer, ForeignKey("alumnos.id"), nullable=False)
+    tipo = Column(String(20), nullable=False)  # 'perfil', 'rendimiento'
+    # Para elegir alumnos por tipo de análisis sin volver a las tablas de notas y encuestas
+    tiene_notas = Column(Boolean, nullable=False, default=False)
+    tiene_encuestas = Column(Boolean, nullable=False, default=False)
+    # JSON y no JSONB: JSONB reordena las llaves y el documento se responde tal como se guardó
+    documento = Column(JSON, nullable=False)
+    fecha = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("tipo", "alumno_id", name="uq_perfiles_alumnos_tipo_alumno"),
+    )
+
 # Crear pregunta de tipo múltiple
 # p1 = PreguntaEncuesta(pregunta="¿Qué recursos utilizas para estudiar?", es_multiple=1)
 
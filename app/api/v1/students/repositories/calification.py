@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from sqlalchemy import insert, tuple_
 from app.api.v1.students.models import Nota
 
 
@@ -35,3 +36,28 @@ class CalificationRepository:
         self.db.refresh(calification)
 
         return calification
+
+    def create_califications(self, califications: list[dict]) -> int:
+        """Inserta varias calificaciones en una sola operación sin confirmar."""
+        if califications:
+            self.db.execute(insert(Nota), califications)
+        return len(califications)
+
+    def delete_califications(self, scopes: set[tuple[int, int, int]], without_upload: bool = False) -> int:
+        """
+        Elimina las calificaciones de los (historial, materia, bimestre) indicados sin confirmar.
+        Con without_upload=True solo elimina las que no tienen registrada su carga.
+        """
+        if not scopes:
+            return 0
+
+        query = self.db.query(Nota).filter(
+            tuple_(Nota.historial_id, Nota.materia_id, Nota.bimestre_id).in_(list(scopes))
+        )
+        if without_upload:
+            query = query.filter(Nota.carga.is_(None))
+        return query.delete(synchronize_session=False)
+
+    def delete_upload_califications(self, content_hash: str) -> int:
+        """Elimina las calificaciones que trajo una carga sin confirmar."""
+        return self.db.query(Nota).filter(Nota.carga == content_hash).delete(synchronize_session=False)
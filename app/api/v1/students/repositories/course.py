@@ -23,6 +23,13 @@ class CourseRepository:
         self.db.refresh(course)
         return course
 
+    def update_course_name(self, course: Materia, course_name: str) -> Materia:
+        """Actualiza el nombre de una materia en la base de datos"""
+        course.nombre = course_name
+        self.db.commit()
+        self.db.refresh(course)
+        return course
+
     def get_or_create_course(self, course_name: str, course_code: str) -> Materia:
         """Obtiene o crea una materia en la base de datos"""
         course = self.get_course_by_name(course_name, course_code)
@@ -1,7 +1,15 @@
+import heapq
+from difflib import SequenceMatcher
 from pydantic import InstanceOf
 from app.api.v1.students.models import Alumno, HistorialAcademico, Encuesta, Nota, RespuestaEncuesta, Materia, Bimestre, AnioAcademico, Seccion, NivelEducativo, Grado
-from sqlalchemy.orm import joinedload
-from sqlalchemy import func
+from app.api.v1.students.models import CriterioEvaluacion, NivelLogro
+from app.api.v1.students.models import AliasAlumno, RespuestaTextoEncuesta, RespuestaEncuestaCompacta, PerfilAlumno
+from app.api.v1.students.serializers import STUDENT_DETAIL, json_array, serialize_note_detail, serialize_student, student_json_sql, to_json_sql
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from sqlalchemy import Integer, String, Text, and_, case, cast, column, delete, exists, func, join, select, update, values
+from app.core.responses import RawJSON
+from app.utils.normalize_text import normalize_text
+from app.utils.pagination import count_total, keyset_page, offset_page
 
 from app.api.v1.students.repositories import achievement_levels
 
@@ -102,7 +110,8 @@ class StudentRepository:
             "grados": [{"id": grado.id, "nombre": grado.nombre, "nivel_id": grado.nivel_id} for grado in grados]
         }
 
-    def get_students_with_filters(self, anio_academico_id=None, seccion_id=None, nivel_id=None, grado_id=None, bimestre_id=None, materia_id=None, page: int = 1, page_size: int = 10):
+    def get_students_with_filters(self, anio_academico_id=None, seccion_id=None, nivel_id=None, grado_id=None, bimestre_id=None, materia_id=None, page: int = 1, page_size: int = 10,
+                                  after: str = None, limit: int = None, count_strategy: str = None, include_total: bool = True):
         """
         Obtiene alumnos filtrados por los parámetros proporcionados utilizando IDs.
 
@@ -115,74 +124,150 @@ class StudentRepository:
             materia_id (int): ID de la materia.
             page (int): Número de página para la paginación.
             page_size (int): Tamaño de la página (cantidad de registros por página).
+            after (str): Cursor de la página anterior; con after o limit se pagina por cursor en lugar de por página.
+            limit (int): Tamaño de la página en la paginación por cursor.
+            count_strategy (str): Cómo calcular total_records: "exact", "estimated" o "cached".
+            include_total (bool): Si es False no se calcula total_records.
 
         Returns:
             dict: Datos paginados de alumnos filtrados.
         """
-        query = self.db.query(Alumno).join(HistorialAcademico).join(Nota).join(Materia).join(Bimestre).join(Grado)
-
-        # Aplicar filtros por ID
+        # Filtros sobre el historial y sobre sus notas; se aplican como semi-joins (EXISTS) sobre llaves indexadas
+        history_filters = []
         if anio_academico_id:
-            query = query.filter(HistorialAcademico.anio_academico_id == anio_academico_id)
+            history_filters.append(HistorialAcademico.anio_academico_id == anio_academico_id)
         if seccion_id:
-            query = query.filter(HistorialAcademico.seccion_id == seccion_id)
+            history_filters.append(HistorialAcademico.seccion_id == seccion_id)
         if nivel_id:
-            query = query.filter(HistorialAcademico.nivel_id == nivel_id)
+            history_filters.append(HistorialAcademico.nivel_id == nivel_id)
         if grado_id:
-            query = query.filter(HistorialAcademico.grado_id == grado_id)
+            history_filters.append(HistorialAcademico.grado_id == grado_id)
+
+        note_filters = []
         if bimestre_id:
-            query = query.filter(Nota.bimestre_id == bimestre_id)
+            note_filters.append(Nota.bimestre_id == bimestre_id)
         if materia_id:
-            query = query.filter(Nota.materia_id == materia_id)
+            note_filters.append(Nota.materia_id == materia_id)
 
-        # Usar distinct para evitar duplicados
-        query = query.distinct(Alumno.id)
+        # Un historial cuenta si cumple sus filtros y tiene al menos una nota que cumple los de notas
+        matching_history = and_(
+            *history_filters,
+            exists().where(Nota.historial_id == HistorialAcademico.id, *note_filters).correlate(HistorialAcademico)
+        )
+        ids_query = self.db.query(Alumno.id).filter(
+            exists().where(HistorialAcademico.alumno_id == Alumno.id, matching_history).correlate(Alumno)
+        )
 
-        # Contar el total de registros para la paginación
-        total_records = query.count()
+        # Paginación por cursor: ordenada por id, sin OFFSET ni conteo
+        if after is not None or limit is not None:
+            rows, next_cursor = keyset_page(ids_query, Alumno.id, after, limit or page_size)
+            return {
+                "limit": limit or page_size,
+                "next_cursor": next_cursor,
+                "students": self._get_students_with_notes([row.id for row in rows], matching_history, note_filters)
+            }
 
-        # Aplicar paginación
-        students = query.offset((page - 1) * page_size).limit(page_size).all()
+        # Contar el total de registros para la paginación
+        filters = (anio_academico_id, seccion_id, nivel_id, grado_id, bimestre_id, materia_id)
+        total_records = count_total(ids_query, count_strategy, ("alumnos_por_filtros", filters)) if include_total else None
 
-        # Formatear los datos para incluir todas las relaciones
-        formatted_students = []
-        for student in students:
-            formatted_students.append({
-                "id": student.id,
-                "codigo_alumno": student.codigo_alumno,
-                "nombre_completo": student.nombre_completo,
-                "edad": student.edad,
-                "genero": student.genero,
-                "historial_academico": [
-                    {
-                        "anio_academico": record.anio_academico.anio,
-                        "nivel_educativo": record.nivel.nombre,
-                        "grado": record.grado.nombre,
-                        "seccion": record.seccion.nombre,
-                        "notas": [
-                            {
-                                "materia": nota.materia.nombre,
-                                "bimestre": nota.bimestre.nombre,
-                                "criterio_evaluacion": nota.criterio_evaluacion.nombre,
-                                "valor_criterio_de_evaluacion": nota.valor_criterio_de_evaluacion,
-                                "nivel_logro": nota.nivel_logro.valor if nota.nivel_logro else None
-                            }
-                            for nota in record.notas
-                        ]
-                    }
-                    for record in student.historial_academico
-                ]
-            })
+        # Aplicar paginación, ordenada por id para que las páginas sean estables
+        rows, next_cursor = offset_page(ids_query, Alumno.id, page, page_size)
 
         return {
             "total_records": total_records,
             "page": page,
             "page_size": page_size,
-            "students": formatted_students
+            "next_cursor": next_cursor,
+            "students": self._get_students_with_notes([row.id for row in rows], matching_history, note_filters)
         }
+
+    def _get_students_with_notes(self, student_ids, history_criteria, note_filters):
+        """
+        Carga los alumnos indicados con solo los historiales y notas que cumplen los filtros,
+        con una consulta IN por relación en lugar de una por alumno e historial.
+        """
+        if not student_ids:
+            return []
+
+        history = selectinload(Alumno.historial_academico.and_(history_criteria))
+        notes = history.selectinload(HistorialAcademico.notas.and_(*note_filters) if note_filters else HistorialAcademico.notas)
+        students = self.db.query(Alumno).filter(Alumno.id.in_(student_ids)).order_by(Alumno.id).options(
+            history.selectinload(HistorialAcademico.anio_academico),
+            history.selectinload(HistorialAcademico.nivel),
+            history.selectinload(HistorialAcademico.grado),
+            history.selectinload(HistorialAcademico.seccion),
+            notes.selectinload(Nota.materia),
+            notes.selectinload(Nota.bimestre),
+            notes.selectinload(Nota.criterio_evaluacion),
+            notes.selectinload(Nota.nivel_logro)
+        ).all()
+        return self._format_students_with_notes(students)
+
+    def _format_students_with_notes(self, students):
+        """Formatea alumnos con su historial académico y notas"""
+        return [serialize_student(student) for student in students]
+
     def get_all_students(self):
         return self.db.query(Alumno).all()
 
+    def get_student_names(self):
+        """Obtiene solo (id, nombre_completo, nombre_normalizado) de todos los alumnos, sin cargar los objetos completos"""
+        return self.db.query(Alumno.id, Alumno.nombre_completo, Alumno.nombre_normalizado).all()
+
+    def get_student_ids_with_grades(self) -> set:
+        """Obtiene los ids de los alumnos que tienen al menos una nota, con un solo SELECT DISTINCT"""
+        rows = (
+            self.db.query(HistorialAcademico.alumno_id)
+            .join(Nota, Nota.historial_id == HistorialAcademico.id)
+            .distinct()
+            .all()
+        )
+        return {student_id for (student_id,) in rows}
+
+    def get_student_name(self, student_id: int):
+        """Obtiene solo el nombre completo de un alumno, o None si no existe"""
+        return self.db.query(Alumno.nombre_completo).filter(Alumno.id == student_id).scalar()
+
+    def find_similar_students(self, student_name: str, limit: int = 10):
+        """
+        Obtiene los alumnos con nombre más parecido, como tuplas (id, nombre_completo, nombre_normalizado, similitud).
+
+        En PostgreSQL usa el índice de trigramas (operador % y similarity() de pg_trgm);
+        en otros motores compara en Python contra la columna nombre_normalizado.
+        """
+        normalized_name = normalize_text(student_name)
+        if not normalized_name:
+            return []
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            similarity = func.similarity(Alumno.nombre_normalizado, normalized_name)
+            rows = self.db.query(
+                Alumno.id,
+                Alumno.nombre_completo,
+                Alumno.nombre_normalizado,
+                similarity.label("similarity")
+            ).filter(
+                Alumno.nombre_normalizado.op("%")(normalized_name)
+            ).order_by(similarity.desc()).limit(limit).all()
+            return [(row.id, row.nombre_completo, row.nombre_normalizado, float(row.similarity)) for row in rows]
+
+        rows = self.db.query(Alumno.id, Alumno.nombre_completo, Alumno.nombre_normalizado).filter(
+            Alumno.nombre_normalizado.isnot(None)
+        ).all()
+        scored = (
+            (row.id, row.nombre_completo, row.nombre_normalizado,
+             SequenceMatcher(None, normalized_name, row.nombre_normalizado).ratio())
+            for row in rows
+        )
+        return heapq.nlargest(limit, scored, key=lambda item: item[3])
+
+    def get_student_degree_names(self):
+        """Obtiene los pares (id de alumno, nombre del grado) de su historial académico"""
+        return self.db.query(HistorialAcademico.alumno_id, Grado.nombre).join(
+            Grado, HistorialAcademico.grado_id == Grado.id
+        ).distinct().all()
+
     def get_students_summary(self):
         """Obtiene un resumen del estado de los alumnos."""
         # Contar el total de estudiantes
@@ -217,7 +302,23 @@ class StudentRepository:
             }
         }
 
-    def get_all_students_with_associated_data(self, page: int = 1, page_size: int = 10, search: str = None):
+    def builds_json_in_database(self) -> bool:
+        """Indica si la base (PostgreSQL) puede armar los documentos JSON con json_build_object y json_agg"""
+        return self.db.get_bind().dialect.name == "postgresql"
+
+    def get_student_detail_json(self, student_id: int):
+        """
+        Detalle de un alumno (mismas columnas y relaciones que STUDENT_DETAIL) armado como JSON en PostgreSQL,
+        sin cargar objetos del ORM. Retorna None si el alumno no existe.
+        """
+        document = self.db.execute(
+            select(cast(to_json_sql(Alumno, STUDENT_DETAIL), Text)).where(Alumno.id == student_id)
+        ).scalar()
+        return RawJSON(document) if document is not None else None
+
+    def get_all_students_with_associated_data(self, page: int = 1, page_size: int = 10, search: str = None,
+                                              after: str = None, limit: int = None, count_strategy: str = None,
+                                              include_total: bool = True):
         """
         Obtiene todos los estudiantes con sus datos asociados, respetando parámetros de calidad como paginación y búsqueda.
 
@@ -225,104 +326,94 @@ class StudentRepository:
             page (int): Número de página para la paginación.
             page_size (int): Tamaño de la página (cantidad de registros por página).
             search (str): Cadena para buscar estudiantes por nombre.
+            after (str): Cursor de la página anterior; con after o limit se pagina por cursor en lugar de por página.
+            limit (int): Tamaño de la página en la paginación por cursor.
+            count_strategy (str): Cómo calcular total_records: "exact", "estimated" o "cached".
+            include_total (bool): Si es False no se calcula total_records.
 
         Returns:
             dict: Datos paginados de estudiantes con todas sus relaciones.
         """
-        query = self.db.query(Alumno).options(
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.anio_academico),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.nivel),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.grado),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.seccion),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.materia),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.bimestre),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.criterio_evaluacion),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.nivel_logro),
-            joinedload(Alumno.encuestas).joinedload(Encuesta.respuestas).joinedload(RespuestaEncuesta.opcion),
-            joinedload(Alumno.encuestas).joinedload(Encuesta.respuestas_texto)
-        )
+        # Primero se pagina sobre los ids de alumnos, sin joins, para que offset/limit y count sean baratos
+        ids_query = self.db.query(Alumno.id)
 
         # Aplicar búsqueda por nombre si se proporciona
         if search:
-            query = query.filter(func.lower(Alumno.nombre_completo).like(f"%{search.lower()}%"))
+            ids_query = ids_query.filter(func.lower(Alumno.nombre_completo).like(f"%{search.lower()}%"))
+
+        # Paginación por cursor: ordenada por id, sin OFFSET ni conteo
+        if after is not None or limit is not None:
+            rows, next_cursor = keyset_page(ids_query, Alumno.id, after, limit or page_size)
+            return {
+                "limit": limit or page_size,
+                "next_cursor": next_cursor,
+                "students": self._get_students_with_associated_data([row.id for row in rows])
+            }
 
         # Contar el total de registros para la paginación
-        total_records = query.count()
+        total_records = count_total(ids_query, count_strategy, ("alumnos", search)) if include_total else None
 
         # Aplicar paginación
-        students = query.offset((page - 1) * page_size).limit(page_size).all()
-
-        # Formatear los datos para incluir todas las relaciones
-        formatted_students = []
-        for student in students:
-            formatted_students.append({
-                "id": student.id,
-                "codigo_alumno": student.codigo_alumno,
-                "nombre_completo": student.nombre_completo,
-                "edad": student.edad,
-                "genero": student.genero,
-                "historial_academico": [
-                    {
-                        "anio_academico": record.anio_academico.anio,
-                        "nivel_educativo": record.nivel.nombre,
-                        "grado": record.grado.nombre,
-                        "seccion": record.seccion.nombre,
-                        "notas": [
-                            {
-                                "materia": nota.materia.nombre,
-                                "bimestre": nota.bimestre.nombre,
-                                "criterio_evaluacion": nota.criterio_evaluacion.nombre,
-                                "valor_criterio_de_evaluacion": nota.valor_criterio_de_evaluacion,
-                                "nivel_logro": nota.nivel_logro.valor if nota.nivel_logro else None
-                            }
-                            for nota in record.notas
-                        ]
-                    }
-                    for record in student.historial_academico
-                ],
-                "encuestas": [
-                    {
-                        "anio": encuesta.anio,
-                        "fecha": encuesta.fecha,
-                        "respuestas": [
-                            {
-                                "pregunta": respuesta.pregunta.pregunta,
-                                "opcion": respuesta.opcion.opcion
-                            }
-                            for respuesta in encuesta.respuestas
-                        ],
-                        "respuestas_texto": [
-                            {
-                                "pregunta": respuesta_texto.pregunta.pregunta,
-                                "texto": respuesta_texto.texto
-                            }
-                            for respuesta_texto in encuesta.respuestas_texto
-                        ]
-                    }
-                    for encuesta in student.encuestas
-                ]
-            })
+        rows, next_cursor = offset_page(ids_query, Alumno.id, page, page_size)
 
         return {
             "total_records": total_records,
             "page": page,
             "page_size": page_size,
-            "students": formatted_students
+            "next_cursor": next_cursor,
+            "students": self._get_students_with_associated_data([row.id for row in rows])
         }
 
+    def _get_students_with_associated_data(self, student_ids):
+        """Carga los alumnos indicados (en orden de id) con historial, notas y encuestas ya formateados"""
+        if not student_ids:
+            return []
+
+        # En PostgreSQL el arreglo JSON se arma en la base y se responde tal cual
+        if self.builds_json_in_database():
+            return RawJSON(self.db.execute(
+                select(cast(json_array(student_json_sql(include_surveys=True), Alumno.id), Text))
+                .where(Alumno.id.in_(student_ids))
+            ).scalar())
+
+        # Los alumnos y sus relaciones se cargan con consultas IN (una por relación)
+        history = selectinload(Alumno.historial_academico)
+        notes = history.selectinload(HistorialAcademico.notas)
+        surveys = selectinload(Alumno.encuestas)
+        students = self.db.query(Alumno).filter(Alumno.id.in_(student_ids)).order_by(Alumno.id).options(
+            history.selectinload(HistorialAcademico.anio_academico),
+            history.selectinload(HistorialAcademico.nivel),
+            history.selectinload(HistorialAcademico.grado),
+            history.selectinload(HistorialAcademico.seccion),
+            notes.selectinload(Nota.materia),
+            notes.selectinload(Nota.bimestre),
+            notes.selectinload(Nota.criterio_evaluacion),
+            notes.selectinload(Nota.nivel_logro),
+            surveys.selectinload(Encuesta.respuestas).selectinload(RespuestaEncuesta.opcion),
+            surveys.selectinload(Encuesta.respuestas).selectinload(RespuestaEncuesta.pregunta),
+            surveys.selectinload(Encuesta.respuestas_texto).selectinload(RespuestaTextoEncuesta.pregunta)
+        ).all()
+
+        # Formatear los datos para incluir todas las relaciones
+        return [serialize_student(student, include_surveys=True) for student in students]
+
     def get_student_by_id(self, student_id: int) -> Alumno:
         """Obtiene el alumno de la base de datos"""
+        # Colecciones con selectinload para no multiplicar notas por respuestas de encuesta en un solo JOIN
+        history = selectinload(Alumno.historial_academico)
+        notes = history.selectinload(HistorialAcademico.notas)
+        surveys = selectinload(Alumno.encuestas)
         student = self.db.query(Alumno).filter(Alumno.id == student_id).options(
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.anio_academico),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.nivel),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.grado),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.seccion),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.materia),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.bimestre),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.criterio_evaluacion),
-            joinedload(Alumno.historial_academico).joinedload(HistorialAcademico.notas).joinedload(Nota.nivel_logro),
-            joinedload(Alumno.encuestas).joinedload(Encuesta.respuestas).joinedload(RespuestaEncuesta.opcion),
-            joinedload(Alumno.encuestas).joinedload(Encuesta.respuestas_texto)
+            history.joinedload(HistorialAcademico.anio_academico),
+            history.joinedload(HistorialAcademico.nivel),
+            history.joinedload(HistorialAcademico.grado),
+            history.joinedload(HistorialAcademico.seccion),
+            notes.joinedload(Nota.materia),
+            notes.joinedload(Nota.bimestre),
+            notes.joinedload(Nota.criterio_evaluacion),
+            notes.joinedload(Nota.nivel_logro),
+            surveys.selectinload(Encuesta.respuestas).joinedload(RespuestaEncuesta.opcion),
+            surveys.selectinload(Encuesta.respuestas_texto)
         ).first()
 
         return student
@@ -332,28 +423,229 @@ class StudentRepository:
         student = self.db.query(Alumno).filter(Alumno.nombre_completo == student_name).first()
         return student
 
-    def create_student(self, student_name: str, student_code="",student_gender='MASCULINO') -> Alumno:
-        """Crea un alumno en la base de datos"""
+    def create_student(self, student_name: str, student_code="",student_gender='MASCULINO', commit: bool = True) -> Alumno:
+        """Crea un alumno en la base de datos; con commit=False solo se envía a la transacción en curso"""
 
         student = Alumno(nombre_completo=student_name, codigo_alumno=student_code, genero=student_gender)
         self.db.add(student)
-        self.db.commit()
+        if commit:
+            self.db.commit()
+        else:
+            self.db.flush()
         return student
 
 
-    def update_student(self, student_id, **kwargs):
+    def update_student(self, student_id, commit: bool = True, **kwargs):
+        """
+        Actualiza la edad y/o el género del alumno con un solo UPDATE.
+        Con commit=False solo se envía a la transacción en curso.
+        """
         age = kwargs.get("age", None)
         gender = kwargs.get("gender", None)
 
+        changes = {}
         if type(age) == int:
-            self.db.query(Alumno).filter(Alumno.id == student_id).update({"edad": age})
-            self.db.commit()
-
+            changes["edad"] = age
         if type(gender) == str:
-            self.db.query(Alumno).filter(Alumno.id == student_id).update({"genero": gender})
+            changes["genero"] = gender
+
+        if changes:
+            self.db.query(Alumno).filter(Alumno.id == student_id).update(changes)
+            if commit:
+                self.db.commit()
+            else:
+                self.db.flush()
+
+        return self.db.get(Alumno, student_id)
+
+    def bulk_update_students(self, updates) -> int:
+        """
+        Actualiza edad y/o género de varios alumnos a la vez. Recibe {id del alumno: {"edad": ..., "genero": ...}}.
+
+        En PostgreSQL es un solo UPDATE ... FROM (VALUES ...); los valores None no cambian la columna.
+        En otros motores se usa el UPDATE en bloque por clave primaria del ORM.
+        No hace commit: los cambios van en la misma transacción que el resto de la carga.
+        """
+        rows = [
+            {"id": student_id, "edad": changes.get("edad"), "genero": changes.get("genero")}
+            for student_id, changes in updates.items()
+            if changes.get("edad") is not None or changes.get("genero") is not None
+        ]
+        if not rows:
+            return 0
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            changes = values(
+                column("id", Integer),
+                column("edad", Integer),
+                column("genero", String),
+                name="cambios"
+            ).data([(row["id"], row["edad"], row["genero"]) for row in rows])
+
+            self.db.execute(
+                update(Alumno)
+                .where(Alumno.id == changes.c.id)
+                .values(
+                    # cast: si una columna solo trae NULL, PostgreSQL la tomaría como texto
+                    edad=func.coalesce(cast(changes.c.edad, Integer), Alumno.edad),
+                    genero=func.coalesce(cast(changes.c.genero, String), Alumno.genero)
+                )
+            )
+        else:
+            self.db.execute(
+                update(Alumno),
+                [{key: value for key, value in row.items() if value is not None} for row in rows]
+            )
+
+        self.db.flush()
+        return len(rows)
+
+    def get_students_for_deduplication(self):
+        """Obtiene (id, nombre_completo, nombre_normalizado, codigo_alumno, cantidad de historiales) de todos los alumnos"""
+        return (
+            self.db.query(
+                Alumno.id,
+                Alumno.nombre_completo,
+                Alumno.nombre_normalizado,
+                Alumno.codigo_alumno,
+                func.count(HistorialAcademico.id)
+            )
+            .outerjoin(HistorialAcademico, HistorialAcademico.alumno_id == Alumno.id)
+            .group_by(Alumno.id)
+            .all()
+        )
+
+    def merge_students(self, merges) -> dict:
+        """
+        Fusiona alumnos repetidos en una sola transacción. Recibe {id del duplicado: id del que se conserva}.
+
+        Los historiales, encuestas, respuestas compactas y alias de los duplicados pasan al alumno que se conserva.
+        Si ambos tienen encuesta del mismo año se mantiene la más reciente. Si ambos tienen historial del mismo
+        año, nivel, grado y sección, las notas pasan al historial del que se conserva (salvo las de una materia
+        y bimestre que ese historial ya tiene) y el otro historial se elimina. Al final se eliminan los duplicados.
+        """
+        if not merges:
+            return {"alumnos_fusionados": 0, "historiales_movidos": 0, "historiales_unidos": 0,
+                    "encuestas_movidas": 0, "encuestas_eliminadas": 0}
+
+        duplicate_ids = list(merges)
+
+        try:
+            # Encuestas: una por alumno y año, se queda la más reciente del grupo
+            surveys = (
+                self.db.query(Encuesta.id, Encuesta.alumno_id, Encuesta.anio)
+                .filter(Encuesta.alumno_id.in_(duplicate_ids + list(set(merges.values()))))
+                .all()
+            )
+            latest = {}
+            for survey_id, student_id, year in surveys:
+                if year is None:
+                    continue
+                key = (merges.get(student_id, student_id), year)
+                latest[key] = max(latest.get(key, survey_id), survey_id)
+            kept = set(latest.values())
+            removed = [survey_id for survey_id, _, year in surveys if year is not None and survey_id not in kept]
+
+            if removed:
+                self.db.execute(delete(RespuestaEncuesta).where(RespuestaEncuesta.encuesta_id.in_(removed)))
+                self.db.execute(delete(RespuestaTextoEncuesta).where(RespuestaTextoEncuesta.encuesta_id.in_(removed)))
+                self.db.execute(delete(RespuestaEncuestaCompacta).where(RespuestaEncuestaCompacta.encuesta_id.in_(removed)))
+                self.db.execute(delete(Encuesta).where(Encuesta.id.in_(removed)))
+
+            history_merges = self._repeated_histories(merges)
+            if history_merges:
+                self._merge_history_notes(history_merges)
+                self.db.execute(delete(HistorialAcademico).where(HistorialAcademico.id.in_(list(history_merges))))
+
+            histories = self.db.execute(
+                update(HistorialAcademico)
+                .where(HistorialAcademico.alumno_id.in_(duplicate_ids))
+                .values(alumno_id=case(merges, value=HistorialAcademico.alumno_id))
+            ).rowcount
+            moved_surveys = self.db.execute(
+                update(Encuesta)
+                .where(Encuesta.alumno_id.in_(duplicate_ids))
+                .values(alumno_id=case(merges, value=Encuesta.alumno_id))
+            ).rowcount
+            self.db.execute(
+                update(RespuestaEncuestaCompacta)
+                .where(RespuestaEncuestaCompacta.alumno_id.in_(duplicate_ids))
+                .values(alumno_id=case(merges, value=RespuestaEncuestaCompacta.alumno_id))
+            )
+            self.db.execute(
+                update(AliasAlumno)
+                .where(AliasAlumno.alumno_id.in_(duplicate_ids))
+                .values(alumno_id=case(merges, value=AliasAlumno.alumno_id))
+            )
+
+            # La edad del duplicado completa la del alumno que se conserva si no la tiene
+            ages = {}
+            for student_id, age in self.db.query(Alumno.id, Alumno.edad).filter(Alumno.id.in_(duplicate_ids), Alumno.edad.isnot(None)):
+                ages.setdefault(merges[student_id], age)
+            for survivor_id, age in ages.items():
+                self.db.execute(
+                    update(Alumno).where(Alumno.id == survivor_id, Alumno.edad.is_(None)).values(edad=age)
+                )
+
+            self.db.execute(delete(PerfilAlumno).where(PerfilAlumno.alumno_id.in_(duplicate_ids)))
+            self.db.execute(delete(Alumno).where(Alumno.id.in_(duplicate_ids)))
             self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
 
-        return self.get_student_by_id(student_id)
+        return {
+            "alumnos_fusionados": len(duplicate_ids),
+            "historiales_movidos": histories,
+            "historiales_unidos": len(history_merges),
+            "encuestas_movidas": moved_surveys,
+            "encuestas_eliminadas": len(removed)
+        }
+
+
+    def _repeated_histories(self, merges) -> dict:
+        """
+        Historiales que quedarían repetidos al fusionar (mismo alumno, año, nivel, grado y sección).
+        Retorna {id del historial que sobra: id del que se conserva}; se conserva el del alumno que
+        se conserva y, entre duplicados, el de menor id.
+        """
+        rows = self.db.query(
+            HistorialAcademico.id, HistorialAcademico.alumno_id, HistorialAcademico.anio_academico_id,
+            HistorialAcademico.nivel_id, HistorialAcademico.grado_id, HistorialAcademico.seccion_id
+        ).filter(HistorialAcademico.alumno_id.in_(list(merges) + list(set(merges.values())))).all()
+
+        kept = {}
+        history_merges = {}
+        for history_id, student_id, *cohort in sorted(rows, key=lambda row: (row.alumno_id in merges, row.id)):
+            key = (merges.get(student_id, student_id), *cohort)
+            if key in kept:
+                history_merges[history_id] = kept[key]
+            else:
+                kept[key] = history_id
+        return history_merges
+
+    def _merge_history_notes(self, history_merges):
+        """Pasa las notas de los historiales que sobran al que se conserva, sin repetir materia y bimestre"""
+        notes = self.db.query(Nota.id, Nota.historial_id, Nota.materia_id, Nota.bimestre_id).filter(
+            Nota.historial_id.in_(list(history_merges) + list(set(history_merges.values())))
+        ).all()
+        # Una materia y bimestre se carga completa en cada archivo, así que cada una queda con las notas de
+        # un solo historial: primero el conservado y luego el que sobra de menor id
+        owners = {}
+        for _, history_id, subject_id, bimester_id in sorted(notes, key=lambda note: (note.historial_id in history_merges, note.historial_id)):
+            owners.setdefault((history_merges.get(history_id, history_id), subject_id, bimester_id), history_id)
+        repeated = [
+            note_id for note_id, history_id, subject_id, bimester_id in notes
+            if owners[(history_merges.get(history_id, history_id), subject_id, bimester_id)] != history_id
+        ]
+        if repeated:
+            self.db.execute(delete(Nota).where(Nota.id.in_(repeated)))
+
+        self.db.execute(
+            update(Nota)
+            .where(Nota.historial_id.in_(list(history_merges)))
+            .values(historial_id=case(history_merges, value=Nota.historial_id))
+        )
 
     def get_or_create_student(self, student_name: str, student_code="", student_gender="MASCULINO") -> Alumno:
         """Crea alumno si no puede obtenerlo"""
@@ -372,7 +664,11 @@ class StudentRepository:
         grado_id: int = None,
         anio_academico_id: int = None,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        after: str = None,
+        limit: int = None,
+        count_strategy: str = None,
+        include_total: bool = True
     ):
         """
         Obtiene todas las notas de los alumnos con filtros opcionales.
@@ -384,11 +680,24 @@ class StudentRepository:
             anio_academico_id (int): ID del año académico
             page (int): Número de página
             page_size (int): Tamaño de página
+            after (str): Cursor de la página anterior; con after o limit se pagina por cursor en lugar de por página
+            limit (int): Tamaño de página en la paginación por cursor
+            count_strategy (str): Cómo calcular total_records: "exact", "estimated" o "cached"
+            include_total (bool): Si es False no se calcula total_records
 
         Returns:
             dict: Diccionario con las notas y metadata de paginación
         """
-        query = self.db.query(Nota).join(HistorialAcademico).join(Alumno).join(Materia)
+        # Historial, alumno y materia salen del mismo JOIN del filtro; el resto son catálogos pequeños
+        query = self.db.query(Nota).join(Nota.historial).join(HistorialAcademico.alumno).join(Nota.materia).options(
+            contains_eager(Nota.historial).contains_eager(HistorialAcademico.alumno),
+            contains_eager(Nota.historial).joinedload(HistorialAcademico.grado),
+            contains_eager(Nota.historial).joinedload(HistorialAcademico.anio_academico),
+            contains_eager(Nota.materia),
+            joinedload(Nota.bimestre),
+            joinedload(Nota.criterio_evaluacion),
+            joinedload(Nota.nivel_logro)
+        )
 
         # Aplicar filtros
         if alumno_id:
@@ -400,298 +709,339 @@ class StudentRepository:
         if anio_academico_id:
             query = query.filter(HistorialAcademico.anio_academico_id == anio_academico_id)
 
+        # Paginación por cursor: ordenada por id de nota, sin OFFSET ni conteo
+        if after is not None or limit is not None:
+            notes, next_cursor = keyset_page(query, Nota.id, after, limit or page_size)
+            return {
+                "limit": limit or page_size,
+                "next_cursor": next_cursor,
+                "notes": self._format_notes(notes)
+            }
+
         # Contar total de registros
-        total_records = query.count()
+        filters = (alumno_id, materia_id, grado_id, anio_academico_id)
+        total_records = count_total(query, count_strategy, ("notas", filters)) if include_total else None
 
-        # Aplicar paginación
-        notes = query.offset((page - 1) * page_size).limit(page_size).all()
-
-        # Formatear resultados
-        formatted_notes = []
-        for note in notes:
-            formatted_notes.append({
-                "nota_id": note.id,
-                "alumno": {
-                    "id": note.historial.alumno.id,
-                    "nombre": note.historial.alumno.nombre_completo,
-                    "codigo": note.historial.alumno.codigo_alumno
-                },
-                "materia": {
-                    "id": note.materia.id,
-                    "nombre": note.materia.nombre
-                },
-                "grado": {
-                    "id": note.historial.grado.id,
-                    "nombre": note.historial.grado.nombre
-                },
-                "anio_academico": {
-                    "id": note.historial.anio_academico.id,
-                    "anio": note.historial.anio_academico.anio
-                },
-                "bimestre": {
-                    "id": note.bimestre.id,
-                    "nombre": note.bimestre.nombre
-                },
-                "criterio_evaluacion": {
-                    "id": note.criterio_evaluacion.id,
-                    "nombre": note.criterio_evaluacion.nombre
-                },
-                "valor_criterio": note.valor_criterio_de_evaluacion,
-                "nivel_logro": note.nivel_logro.valor if note.nivel_logro else None
-            })
+        # Aplicar paginación, ordenada por id para que las páginas sean estables
+        notes, next_cursor = offset_page(query, Nota.id, page, page_size)
 
         return {
             "total_records": total_records,
             "page": page,
             "page_size": page_size,
-            "notes": formatted_notes
+            "next_cursor": next_cursor,
+            "notes": self._format_notes(notes)
         }
 
+    def _format_notes(self, notes):
+        """Formatea notas con su alumno, materia, grado, año, bimestre y criterio"""
+        return [serialize_note_detail(note) for note in notes]
 
-# ANALISIS DE DATOS DE ESTUDIANTES
-
-    def get_student_performance_data(self, include_surveys: bool = False):
-        """
-        Obtiene datos estructurados para análisis de rendimiento académico.
-        """
-        query = self.db.query(Alumno)
-
-        if include_surveys:
-            query = query.join(HistorialAcademico).join(Nota).join(Encuesta)
-        else:
-            query = query.join(HistorialAcademico).join(Nota)
 
-        students = query.distinct(Alumno.id).all()
+# ANALISIS DE DATOS DE ESTUDIANTES
 
-        performance_data = []
-        for student in students:
-            student_data = {
-                "student_id": student.id,
-                "demographic_features": {
-                    "gender": student.genero,
-                    "age": student.edad
-                },
-                "academic_performance": [],
-                "risk_indicators": {
-                    "failed_subjects_count": 0,
-                    "low_performance_count": 0,
-                    "missing_assignments": 0
-                }
+    def _performance_record(self, student):
+        """Datos de rendimiento de un alumno"""
+        student_data = {
+            "student_id": student.id,
+            "demographic_features": {
+                "gender": student.genero,
+                "age": student.edad
+            },
+            "academic_performance": [],
+            "risk_indicators": {
+                "failed_subjects_count": 0,
+                "low_performance_count": 0,
+                "missing_assignments": 0
             }
+        }
 
-            for record in student.historial_academico:
-                period_data = {
-                    "academic_year": record.anio_academico.anio,
-                    "grade": record.grado.nombre,
-                    "subjects": []
-                }
-
-                for nota in record.notas:
-                    if nota.nivel_logro.valor == "No calificado" or nota.nivel_logro.valor is None:
-                        continue
+        for record in student.historial_academico:
+            period_data = {
+                "academic_year": record.anio_academico.anio,
+                "grade": record.grado.nombre,
+                "subjects": []
+            }
 
-                    subject_data = {
-                        "subject": nota.materia.nombre,
-                        "achievement_level": nota.nivel_logro.valor if nota.nivel_logro else None,
-                        "evaluation_criteria": nota.valor_criterio_de_evaluacion
-                    }
-                    period_data["subjects"].append(subject_data)
+            for nota in record.notas:
+                if nota.nivel_logro.valor == "No calificado" or nota.nivel_logro.valor is None:
+                    continue
 
-                    # Actualizar indicadores de riesgo
-                    if nota.nivel_logro and nota.nivel_logro.valor in ['C', 'D']:
-                        student_data["risk_indicators"]["low_performance_count"] += 1
+                subject_data = {
+                    "subject": nota.materia.nombre,
+                    "achievement_level": nota.nivel_logro.valor if nota.nivel_logro else None,
+                    "evaluation_criteria": nota.valor_criterio_de_evaluacion
+                }
+                period_data["subjects"].append(subject_data)
 
-                student_data["academic_performance"].append(period_data)
+                # Actualizar indicadores de riesgo
+                if nota.nivel_logro and nota.nivel_logro.valor in ['C', 'D']:
+                    student_data["risk_indicators"]["low_performance_count"] += 1
 
-            performance_data.append(student_data)
+            student_data["academic_performance"].append(period_data)
 
-        return {
-            "total_records": len(performance_data),
-            "performance_data": performance_data
-        }
+        return student_data
 
     def get_student_behavior_patterns(self, min_survey_responses: int, min_academic_periods: int):
         """
         Obtiene datos estructurados para análisis de patrones de comportamiento.
         """
-        students = self.db.query(Alumno).join(Encuesta).join(HistorialAcademico).distinct(Alumno.id).all()
-
-        behavior_data = []
-        for student in students:
-            if len(student.encuestas) >= min_survey_responses and \
-            len(student.historial_academico) >= min_academic_periods:
-
-                student_data = {
-                    "student_id": student.id,
-                    "survey_responses": [],
-                    # TODO: Implementar
-                    # "academic_indicators": {
-                    #     "attendance": [],
-                    #     "participation": [],
-                    #     "homework_completion": []
-                    # }
-                }
-
-                # Procesar encuestas
-                for encuesta in student.encuestas:
-                    survey_data = {
-                        "year": encuesta.anio,
-                        "responses": [
-                            {
-                                "question": resp.pregunta.pregunta,
-                                "answer": resp.opcion.opcion
-                            }
-                            for resp in encuesta.respuestas
-                        ]
-                    }
-                    student_data["survey_responses"].append(survey_data)
-
-                behavior_data.append(student_data)
+        students = self._behavior_students_query().all()
+        behavior_data = [
+            record for record in
+            (self._behavior_record(student, min_survey_responses, min_academic_periods) for student in students)
+            if record is not None
+        ]
 
         return {
             "total_records": len(behavior_data),
             "behavior_data": behavior_data
         }
+
+    def iter_student_behavior_patterns(self, min_survey_responses: int, min_academic_periods: int, batch_size: int = 500):
+        """Igual que get_student_behavior_patterns, pero genera un alumno a la vez leyendo por lotes"""
+        for student in self._behavior_students_query().yield_per(batch_size):
+            record = self._behavior_record(student, min_survey_responses, min_academic_periods)
+            if record is not None:
+                yield record
+
+    def _behavior_students_query(self):
+        """Alumnos con encuestas e historial, con las respuestas que usa el análisis de comportamiento"""
+        responses = selectinload(Alumno.encuestas).selectinload(Encuesta.respuestas)
+        return self.db.query(Alumno).join(Encuesta).join(HistorialAcademico).distinct(Alumno.id).options(
+            selectinload(Alumno.historial_academico),
+            responses.joinedload(RespuestaEncuesta.pregunta),
+            responses.joinedload(RespuestaEncuesta.opcion)
+        )
+
+    def _behavior_record(self, student, min_survey_responses: int, min_academic_periods: int):
+        """Respuestas de encuesta de un alumno; None si no llega a los mínimos pedidos"""
+        if len(student.encuestas) < min_survey_responses or \
+        len(student.historial_academico) < min_academic_periods:
+            return None
+
+        student_data = {
+            "student_id": student.id,
+            "survey_responses": [],
+            # TODO: Implementar
+            # "academic_indicators": {
+            #     "attendance": [],
+            #     "participation": [],
+            #     "homework_completion": []
+            # }
+        }
+
+        # Procesar encuestas
+        for encuesta in student.encuestas:
+            survey_data = {
+                "year": encuesta.anio,
+                "responses": [
+                    {
+                        "question": resp.pregunta.pregunta,
+                        "answer": resp.opcion.opcion
+                    }
+                    for resp in encuesta.respuestas
+                ]
+            }
+            student_data["survey_responses"].append(survey_data)
+
+        return student_data
     
-    def materia_exist(self, materia_list: list, current_materia_id: int) -> int: 
-        value: int = -1
-        for index, materia in enumerate(materia_list):
-            if materia.get("materia_id") == current_materia_id:
-                value = index
-        print(f"VALUEEEERRRRR: {value}")
-        return value
-
-    def get_complete_student_profile(self, analysis_type: str = "all"):
+    def _profile_records(self, students):
+        """Perfiles de un lote de alumnos, con el historial de todo el lote armado en una sola consulta"""
+        histories = self._academic_histories([student.id for student in students])
+        for student in students:
+            yield self._profile_record(student, histories.get(student.id, []))
+
+    def _academic_histories(self, student_ids):
         """
-        Obtiene el perfil completo de estudiantes con diferentes niveles de detalle,
-        organizando el historial académico por año, grado y bimestre.
+        Historial académico de varios alumnos a partir de una consulta plana ordenada
+        (alumno, año, grado, sección, bimestre, materia, criterio, nivel, valor), agrupada en una sola pasada.
+        Los bimestres salen de todas las notas del historial, pero solo se unen las notas calificadas:
+        un bimestre con solo notas "No calificado" o sin nivel queda con la lista de materias vacía.
         """
-        query = self.db.query(Alumno)
+        # Bimestres de cada historial, en el orden de su primera nota
+        history_bimesters = select(
+            Nota.historial_id,
+            Nota.bimestre_id,
+            func.min(Nota.id).label("primera_nota")
+        ).join(HistorialAcademico, HistorialAcademico.id == Nota.historial_id) \
+         .where(HistorialAcademico.alumno_id.in_(student_ids)) \
+         .group_by(Nota.historial_id, Nota.bimestre_id) \
+         .subquery()
+        graded_notes = join(
+            Nota, NivelLogro,
+            and_(NivelLogro.id == Nota.nivel_logro_id, NivelLogro.valor != "No calificado")
+        )
 
-        if analysis_type == "complete":
-            query = query.join(HistorialAcademico).join(Nota).join(Encuesta)
-        elif analysis_type == "academic":
-            query = query.join(HistorialAcademico).join(Nota)
-        elif analysis_type == "behavioral":
-            query = query.join(Encuesta)
+        rows = self.db.query(
+            HistorialAcademico.alumno_id,
+            HistorialAcademico.id.label("historial_id"),
+            AnioAcademico.anio,
+            HistorialAcademico.anio_academico_id,
+            Grado.nombre.label("grado"),
+            HistorialAcademico.grado_id,
+            Seccion.nombre.label("seccion"),
+            HistorialAcademico.seccion_id,
+            Bimestre.id.label("bimestre_id"),
+            Bimestre.nombre.label("bimestre"),
+            Materia.id.label("materia_id"),
+            Materia.nombre.label("materia"),
+            CriterioEvaluacion.nombre.label("criterio"),
+            NivelLogro.valor.label("nivel_logro"),
+            Nota.valor_criterio_de_evaluacion
+        ).join(AnioAcademico, AnioAcademico.id == HistorialAcademico.anio_academico_id) \
+         .join(Grado, Grado.id == HistorialAcademico.grado_id) \
+         .join(Seccion, Seccion.id == HistorialAcademico.seccion_id) \
+         .outerjoin(history_bimesters, history_bimesters.c.historial_id == HistorialAcademico.id) \
+         .outerjoin(Bimestre, Bimestre.id == history_bimesters.c.bimestre_id) \
+         .outerjoin(graded_notes, and_(
+             Nota.historial_id == history_bimesters.c.historial_id,
+             Nota.bimestre_id == history_bimesters.c.bimestre_id
+         )) \
+         .outerjoin(Materia, Materia.id == Nota.materia_id) \
+         .outerjoin(CriterioEvaluacion, CriterioEvaluacion.id == Nota.criterio_evaluacion_id) \
+         .filter(HistorialAcademico.alumno_id.in_(student_ids)) \
+         .order_by(HistorialAcademico.alumno_id, HistorialAcademico.id, history_bimesters.c.primera_nota, Nota.id)
+
+        histories = {}
+        periods = {}
+        bimestres = {}
+        materias = {}
+        for row in rows:
+            period = periods.get(row.historial_id)
+            if period is None:
+                period = periods[row.historial_id] = {
+                    "year": row.anio,
+                    "anio_academico_id": row.anio_academico_id,
+                    "grade": row.grado,
+                    "grado_id": row.grado_id,
+                    "section": row.seccion,
+                    "seccion_id": row.seccion_id,
+                    "bimestres": []
+                }
+                histories.setdefault(row.alumno_id, []).append(period)
+
+            if row.bimestre_id is None:  # historial sin notas
+                continue
+
+            bimestre_key = (row.historial_id, row.bimestre_id)
+            bimestre = bimestres.get(bimestre_key)
+            if bimestre is None:
+                bimestre = bimestres[bimestre_key] = {
+                    "bimestre_id": row.bimestre_id,
+                    "bimestre_nombre": row.bimestre,
+                    "materias": []
+                }
+                period["bimestres"].append(bimestre)
+
+            if row.materia_id is None:  # bimestre sin notas calificadas
+                continue
+
+            materia_key = (row.historial_id, row.bimestre_id, row.materia_id)
+            materia = materias.get(materia_key)
+            if materia is None:
+                materia = materias[materia_key] = {
+                    "name": row.materia,
+                    "materia_id": row.materia_id,
+                    "grades": []
+                }
+                bimestre["materias"].append(materia)
 
-        students = query.distinct(Alumno.id).all()
+            materia["grades"].append({
+                "achievement": row.nivel_logro,
+                "evaluation_criteria": row.criterio,
+                "valor_criterio": row.valor_criterio_de_evaluacion
+            })
 
-        profiles = []
-        for student in students:
-            profile = {
-                "student_info": {
-                    "id": student.id,
-                    "code": student.codigo_alumno,
-                    "name": student.nombre_completo,
-                    "age": student.edad,
-                    "gender": student.genero
-                },
-                "academic_history": [],
-                "survey_data": [],
-                # "performance_metrics": {
-                #     "average_achievement": None,
-                #     "risk_level": None,
-                #     "improvement_areas": []
-                # }
-            }
+        return histories
 
-            # Procesar historial académico
-            if hasattr(student, 'historial_academico'):
-                for record in student.historial_academico:
-                    # Organizar notas por bimestre
-                    bimestres = {}
-                    for nota in record.notas:
-                        bimestre_id = nota.bimestre.id
-                        if bimestre_id not in bimestres:
-                            bimestres[bimestre_id] = {
-                                "bimestre_id": bimestre_id,
-                                "bimestre_nombre": nota.bimestre.nombre,
-                                "materias": []
-                            }
-                        if nota.nivel_logro.valor == "No calificado" or nota.nivel_logro.valor is None:
-                            # TODO: Limpiar base de datos si alumno no cuenta con notas de algún curso
-                            continue
-
-                        materia_index = self.materia_exist(bimestres[bimestre_id]["materias"], nota.materia.id)
-                        if materia_index >=0:
-                            bimestres[bimestre_id]["materias"][materia_index]["grades"].append({        
-                                "achievement": nota.nivel_logro.valor if nota.nivel_logro else None,
-                                "evaluation_criteria": nota.criterio_evaluacion.nombre,
-                                "valor_criterio": nota.valor_criterio_de_evaluacion})  
-                            # })
-                        else:
-                            bimestres[bimestre_id]["materias"].append({
-                                "name": nota.materia.nombre,
-                                "materia_id": nota.materia.id,
-                                "grades": [{        
-                                    "achievement": nota.nivel_logro.valor if nota.nivel_logro else None,
-                                    "evaluation_criteria": nota.criterio_evaluacion.nombre,
-                                    "valor_criterio": nota.valor_criterio_de_evaluacion}]
-                            })
-
-
-                    academic_period = {
-                        "year": record.anio_academico.anio,
-                        "anio_academico_id": record.anio_academico_id,
-                        "grade": record.grado.nombre,
-                        "grado_id": record.grado_id,
-                        "section": record.seccion.nombre,
-                        "seccion_id": record.seccion_id,
-                        "bimestres": list(bimestres.values())
-                    }
-                    profile["academic_history"].append(academic_period)
-
-                # Calcular métricas de rendimiento
-                # total_grades = 0
-                # count_grades = 0
-                # risk_count = 0
-                # improvement_areas = set()
-
-                # for period in profile["academic_history"]:
-                #     for bimestre in period["bimestres"]:
-                #         for materia in bimestre["materias"]:
-                #             if materia["achievement"]:
-                #                 if materia["achievement"] in ['C', 'D']:
-                #                     risk_count += 1
-                #                     improvement_areas.add(materia["name"])
-                #                 # Convertir nivel de logro a valor numérico
-                #                 grade_value = {
-                #                     'AD': 4,
-                #                     'A': 3,
-                #                     'B': 2,
-                #                     'C': 1,
-                #                     'D': 0
-                #                 }.get(materia["achievement"], 0)
-                #                 total_grades += grade_value
-                #                 count_grades += 1
-
-                # Actualizar métricas de rendimiento
-                # if count_grades > 0:
-                #     profile["performance_metrics"]["average_achievement"] = round(total_grades / count_grades, 2)
-                #     profile["performance_metrics"]["risk_level"] = "Alto" if risk_count > count_grades * 0.3 else "Medio" if risk_count > 0 else "Bajo"
-                #     profile["performance_metrics"]["improvement_areas"] = list(improvement_areas)
-
-            # Procesar encuestas
-            if hasattr(student, 'encuestas'):
-                for encuesta in student.encuestas:
-                    survey_data = {
-                        "year": encuesta.anio,
-                        "date": encuesta.fecha,
-                        "responses": [
-                            {
-                                "question": resp.pregunta.pregunta,
-                                "answer": resp.opcion.opcion
-                            }
-                            for resp in encuesta.respuestas
-                        ]
-                    }
-                    profile["survey_data"].append(survey_data)
+    def _profile_record(self, student, academic_history):
+        """Perfil completo de un alumno, con su historial académico ya armado"""
+        profile = {
+            "student_info": {
+                "id": student.id,
+                "code": student.codigo_alumno,
+                "name": student.nombre_completo,
+                "age": student.edad,
+                "gender": student.genero
+            },
+            "academic_history": academic_history,
+            "survey_data": [],
+            # "performance_metrics": {
+            #     "average_achievement": None,
+            #     "risk_level": None,
+            #     "improvement_areas": []
+            # }
+        }
 
-            profiles.append(profile)
+        # Calcular métricas de rendimiento
+        # total_grades = 0
+        # count_grades = 0
+        # risk_count = 0
+        # improvement_areas = set()
+
+        # for period in profile["academic_history"]:
+        #     for bimestre in period["bimestres"]:
+        #         for materia in bimestre["materias"]:
+        #             if materia["achievement"]:
+        #                 if materia["achievement"] in ['C', 'D']:
+        #                     risk_count += 1
+        #                     improvement_areas.add(materia["name"])
+        #                 # Convertir nivel de logro a valor numérico
+        #                 grade_value = {
+        #                     'AD': 4,
+        #                     'A': 3,
+        #                     'B': 2,
+        #                     'C': 1,
+        #                     'D': 0
+        #                 }.get(materia["achievement"], 0)
+        #                 total_grades += grade_value
+        #                 count_grades += 1
+
+        # Actualizar métricas de rendimiento
+        # if count_grades > 0:
+        #     profile["performance_metrics"]["average_achievement"] = round(total_grades / count_grades, 2)
+        #     profile["performance_metrics"]["risk_level"] = "Alto" if risk_count > count_grades * 0.3 else "Medio" if risk_count > 0 else "Bajo"
+        #     profile["performance_metrics"]["improvement_areas"] = list(improvement_areas)
+
+        # Procesar encuestas
+        if hasattr(student, 'encuestas'):
+            for encuesta in student.encuestas:
+                survey_data = {
+                    "year": encuesta.anio,
+                    "date": encuesta.fecha,
+                    "responses": [
+                        {
+                            "question": resp.pregunta.pregunta,
+                            "answer": resp.opcion.opcion
+                        }
+                        for resp in encuesta.respuestas
+                    ]
+                }
+                profile["survey_data"].append(survey_data)
 
-        return {
-            "total_records": len(profiles),
-            "analysis_type": analysis_type,
-            "profiles": profiles
-        }
+        return profile
+
+    def build_analytics_documents(self, student_ids):
+        """
+        Arma los documentos de análisis (perfil completo y rendimiento) de un lote de alumnos.
+        Genera (alumno, tiene_notas, tiene_encuestas, {tipo: documento}) por cada alumno encontrado.
+        """
+        history = selectinload(Alumno.historial_academico)
+        notes = history.selectinload(HistorialAcademico.notas)
+        responses = selectinload(Alumno.encuestas).selectinload(Encuesta.respuestas)
+        students = self.db.query(Alumno).filter(Alumno.id.in_(student_ids)).order_by(Alumno.id).options(
+            history.joinedload(HistorialAcademico.anio_academico),
+            history.joinedload(HistorialAcademico.grado),
+            notes.joinedload(Nota.materia),
+            notes.joinedload(Nota.nivel_logro),
+            responses.joinedload(RespuestaEncuesta.pregunta),
+            responses.joinedload(RespuestaEncuesta.opcion)
+        ).all()
+
+        profiles = self._profile_records(students)
+        for student, profile in zip(students, profiles):
+            has_notes = any(record.notas for record in student.historial_academico)
+            documents = {"perfil": profile, "rendimiento": self._performance_record(student)}
+            yield student, has_notes, bool(student.encuestas), documents
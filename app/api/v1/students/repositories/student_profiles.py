@@ -0,0 +1,131 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, exists, insert, or_
+from app.api.v1.students.models import Alumno, PerfilAlumno
+from app.api.v1.students.repositories.student import StudentRepository
+
+PROFILE = "perfil"
+PERFORMANCE = "rendimiento"
+
+# Alumnos que entran en cada analysis_type del perfil completo; cualquier otro valor equivale a "all"
+PROFILE_ANALYSIS_FILTERS = {
+    "complete": {"tiene_notas": True, "tiene_encuestas": True},
+    "academic": {"tiene_notas": True},
+    "behavioral": {"tiene_encuestas": True},
+}
+
+
+class StudentProfileRepository:
+    """
+    Repositorio de los documentos de análisis precalculados por alumno (perfiles_alumnos).
+
+    Los endpoints de análisis leen de aquí con una sola consulta por índice en lugar de recalcular
+    los perfiles en cada llamada. Las cargas y las ediciones llaman a refresh con los alumnos que tocaron;
+    las lecturas no escriben.
+    """
+    def __init__(self, db, batch_size: int = 500):
+        self.db = db
+        self.batch_size = batch_size
+
+    def refresh(self, student_ids: Iterable[int], commit: bool = True) -> int:
+        """
+        Vuelve a armar los documentos de los alumnos indicados; retorna cuántos alumnos se armaron.
+        Con commit=False solo hace flush, para ir en la misma transacción que el cambio que los originó.
+        """
+        student_ids = sorted(set(student_ids))
+        built = 0
+        for start in range(0, len(student_ids), self.batch_size):
+            batch = student_ids[start:start + self.batch_size]
+            rows = []
+            for student, has_notes, has_surveys, documents in StudentRepository(self.db).build_analytics_documents(batch):
+                for kind, document in documents.items():
+                    rows.append({
+                        "alumno_id": student.id,
+                        "tipo": kind,
+                        "tiene_notas": has_notes,
+                        "tiene_encuestas": has_surveys,
+                        # Se guarda ya en tipos JSON (fechas como texto), tal como se responde
+                        "documento": jsonable_encoder(document)
+                    })
+                built += 1
+
+            self.db.execute(delete(PerfilAlumno).where(PerfilAlumno.alumno_id.in_(batch)))
+            if rows:
+                self.db.execute(insert(PerfilAlumno), rows)
+            if commit:
+                self.db.commit()
+            else:
+                self.db.flush()
+        return built
+
+    def refresh_all(self) -> Dict:
+        """Vuelve a armar los documentos de todos los alumnos y descarta los de alumnos que ya no existen"""
+        self.db.execute(delete(PerfilAlumno).where(~exists().where(Alumno.id == PerfilAlumno.alumno_id)))
+        self.db.commit()
+        student_ids = [student_id for student_id, in self.db.query(Alumno.id)]
+        return {"alumnos_actualizados": self.refresh(student_ids)}
+
+    def delete(self, student_ids: Iterable[int]):
+        """Elimina los documentos de los alumnos indicados (sin confirmar la transacción)"""
+        self.db.execute(delete(PerfilAlumno).where(PerfilAlumno.alumno_id.in_(list(student_ids))))
+
+    def refresh_missing(self) -> Dict:
+        """
+        Arma los documentos de los alumnos a los que les falta alguno (base recién migrada o alumnos
+        creados por otra vía). Se ejecuta con app.commands.rebuild_profiles o desde /analytics/rebuild-profiles/.
+        """
+        missing = self.db.query(Alumno.id).filter(or_(*(
+            ~exists().where(PerfilAlumno.alumno_id == Alumno.id, PerfilAlumno.tipo == kind)
+            for kind in (PROFILE, PERFORMANCE)
+        )))
+        return {"alumnos_actualizados": self.refresh(student_id for student_id, in missing)}
+
+    def documents_query(self, kind: str, tiene_notas: Optional[bool] = None, tiene_encuestas: Optional[bool] = None):
+        """Documentos de un tipo, ordenados por alumno, filtrados por lo que tiene cada alumno"""
+        query = self.db.query(PerfilAlumno.documento).filter(PerfilAlumno.tipo == kind)
+        if tiene_notas is not None:
+            query = query.filter(PerfilAlumno.tiene_notas == tiene_notas)
+        if tiene_encuestas is not None:
+            query = query.filter(PerfilAlumno.tiene_encuestas == tiene_encuestas)
+        return query.order_by(PerfilAlumno.alumno_id)
+
+    def iter_documents(self, kind: str, batch_size: int = 500, **filters) -> Iterator[Dict]:
+        """Genera los documentos de un tipo leyendo por lotes"""
+        for document, in self.documents_query(kind, **filters).yield_per(batch_size):
+            yield document
+
+    def get_documents(self, kind: str, **filters) -> List[Dict]:
+        """Todos los documentos de un tipo"""
+        return [document for document, in self.documents_query(kind, **filters)]
+
+    def performance_filters(self, include_surveys: bool = False) -> Dict:
+        """Filtros equivalentes a la consulta en vivo de rendimiento: alumnos con notas (y encuestas si se pide)"""
+        filters = {"tiene_notas": True}
+        if include_surveys:
+            filters["tiene_encuestas"] = True
+        return filters
+
+    def get_student_performance_data(self, include_surveys: bool = False):
+        """Datos de rendimiento académico desde los documentos precalculados"""
+        performance_data = self.get_documents(PERFORMANCE, **self.performance_filters(include_surveys))
+        return {
+            "total_records": len(performance_data),
+            "performance_data": performance_data
+        }
+
+    def iter_student_performance_data(self, include_surveys: bool = False):
+        """Igual que get_student_performance_data, un documento a la vez"""
+        return self.iter_documents(PERFORMANCE, **self.performance_filters(include_surveys))
+
+    def get_complete_student_profile(self, analysis_type: str = "all"):
+        """Perfiles completos desde los documentos precalculados"""
+        profiles = self.get_documents(PROFILE, **PROFILE_ANALYSIS_FILTERS.get(analysis_type, {}))
+        return {
+            "total_records": len(profiles),
+            "analysis_type": analysis_type,
+            "profiles": profiles
+        }
+
+    def iter_complete_student_profile(self, analysis_type: str = "all"):
+        """Igual que get_complete_student_profile, un perfil a la vez"""
+        return self.iter_documents(PROFILE, **PROFILE_ANALYSIS_FILTERS.get(analysis_type, {}))
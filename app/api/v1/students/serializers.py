@@ -0,0 +1,244 @@
+from functools import lru_cache
+from typing import Dict, Optional
+from sqlalchemy import func, inspect, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from app.api.v1.students.models import (
+    Alumno, AnioAcademico, Bimestre, CriterioEvaluacion, Encuesta, Grado, HistorialAcademico, Materia,
+    NivelEducativo, NivelLogro, Nota, OpcionEncuesta, PreguntaEncuesta, RespuestaEncuesta, RespuestaTextoEncuesta,
+    Seccion
+)
+
+
+@lru_cache(maxsize=None)
+def column_keys(model) -> tuple:
+    """Columnas de un modelo, calculadas una sola vez por clase"""
+    return tuple(attribute.key for attribute in inspect(model).column_attrs)
+
+
+def to_dict(instance, relationships: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Convierte una instancia del ORM en dict con sus columnas y las relaciones indicadas.
+    relationships es {relación: relaciones anidadas o None}; solo se leen las relaciones pedidas.
+    """
+    if instance is None:
+        return None
+
+    data = {key: getattr(instance, key) for key in column_keys(type(instance))}
+    for name, nested in (relationships or {}).items():
+        value = getattr(instance, name)
+        if isinstance(value, list):
+            data[name] = [to_dict(item, nested) for item in value]
+        else:
+            data[name] = to_dict(value, nested)
+    return data
+
+
+def json_object(**fields):
+    """json_build_object de PostgreSQL con los campos en el orden dado"""
+    arguments = []
+    for key, value in fields.items():
+        arguments += [literal_column(f"'{key}'"), value]
+    return func.json_build_object(*arguments)
+
+
+def json_array(expression, *order_by):
+    """json_agg ordenado que devuelve [] en lugar de NULL cuando no hay filas"""
+    return func.coalesce(func.json_agg(aggregate_order_by(expression, *order_by)), literal_column("'[]'::json"))
+
+
+def to_json_sql(model, relationships: Optional[Dict] = None):
+    """
+    Equivalente en SQL de to_dict: arma en PostgreSQL el documento JSON de una fila del modelo.
+    Cada relación pedida es una subconsulta correlacionada con la fila de su modelo.
+    """
+    fields = {key: getattr(model, key) for key in column_keys(model)}
+    for name, nested in (relationships or {}).items():
+        relationship = inspect(model).relationships[name]
+        target = relationship.mapper.class_
+        document = to_json_sql(target, nested)
+        if relationship.uselist:
+            document = json_array(document, *inspect(target).primary_key)
+        fields[name] = select(document).where(relationship.primaryjoin).correlate(model).scalar_subquery()
+    return json_object(**fields)
+
+
+# Relaciones del detalle de un alumno (/students/{id})
+STUDENT_DETAIL = {
+    "historial_academico": {
+        "anio_academico": None,
+        "nivel": None,
+        "grado": None,
+        "seccion": None,
+        "notas": {"materia": None, "bimestre": None, "criterio_evaluacion": None, "nivel_logro": None}
+    },
+    "encuestas": {
+        "respuestas": {"opcion": None},
+        "respuestas_texto": None
+    }
+}
+
+
+def serialize_note(nota) -> Dict:
+    """Nota dentro del historial de un alumno"""
+    return {
+        "materia": nota.materia.nombre,
+        "bimestre": nota.bimestre.nombre,
+        "criterio_evaluacion": nota.criterio_evaluacion.nombre,
+        "valor_criterio_de_evaluacion": nota.valor_criterio_de_evaluacion,
+        "nivel_logro": nota.nivel_logro.valor if nota.nivel_logro else None
+    }
+
+
+def serialize_history(record) -> Dict:
+    """Historial académico con sus notas"""
+    return {
+        "anio_academico": record.anio_academico.anio,
+        "nivel_educativo": record.nivel.nombre,
+        "grado": record.grado.nombre,
+        "seccion": record.seccion.nombre,
+        "notas": [serialize_note(nota) for nota in record.notas]
+    }
+
+
+def serialize_survey(encuesta) -> Dict:
+    """Encuesta con sus respuestas cerradas y de texto"""
+    return {
+        "anio": encuesta.anio,
+        "fecha": encuesta.fecha,
+        "respuestas": [
+            {
+                "pregunta": respuesta.pregunta.pregunta,
+                "opcion": respuesta.opcion.opcion
+            }
+            for respuesta in encuesta.respuestas
+        ],
+        "respuestas_texto": [
+            {
+                "pregunta": respuesta_texto.pregunta.pregunta,
+                "texto": respuesta_texto.texto
+            }
+            for respuesta_texto in encuesta.respuestas_texto
+        ]
+    }
+
+
+def serialize_student(student, include_surveys: bool = False) -> Dict:
+    """Alumno con su historial académico y, si se pide, sus encuestas"""
+    data = {
+        "id": student.id,
+        "codigo_alumno": student.codigo_alumno,
+        "nombre_completo": student.nombre_completo,
+        "edad": student.edad,
+        "genero": student.genero,
+        "historial_academico": [serialize_history(record) for record in student.historial_academico]
+    }
+    if include_surveys:
+        data["encuestas"] = [serialize_survey(encuesta) for encuesta in student.encuestas]
+    return data
+
+
+def student_json_sql(include_surveys: bool = False):
+    """Equivalente en SQL de serialize_student, para armar el documento del alumno en PostgreSQL"""
+    notes = select(json_array(
+        json_object(
+            materia=Materia.nombre,
+            bimestre=Bimestre.nombre,
+            criterio_evaluacion=CriterioEvaluacion.nombre,
+            valor_criterio_de_evaluacion=Nota.valor_criterio_de_evaluacion,
+            nivel_logro=NivelLogro.valor
+        ),
+        Nota.id
+    )).select_from(Nota) \
+        .join(Materia, Materia.id == Nota.materia_id) \
+        .join(Bimestre, Bimestre.id == Nota.bimestre_id) \
+        .join(CriterioEvaluacion, CriterioEvaluacion.id == Nota.criterio_evaluacion_id) \
+        .outerjoin(NivelLogro, NivelLogro.id == Nota.nivel_logro_id) \
+        .where(Nota.historial_id == HistorialAcademico.id) \
+        .correlate(HistorialAcademico)
+
+    histories = select(json_array(
+        json_object(
+            anio_academico=AnioAcademico.anio,
+            nivel_educativo=NivelEducativo.nombre,
+            grado=Grado.nombre,
+            seccion=Seccion.nombre,
+            notas=notes.scalar_subquery()
+        ),
+        HistorialAcademico.id
+    )).select_from(HistorialAcademico) \
+        .join(AnioAcademico, AnioAcademico.id == HistorialAcademico.anio_academico_id) \
+        .join(NivelEducativo, NivelEducativo.id == HistorialAcademico.nivel_id) \
+        .join(Grado, Grado.id == HistorialAcademico.grado_id) \
+        .join(Seccion, Seccion.id == HistorialAcademico.seccion_id) \
+        .where(HistorialAcademico.alumno_id == Alumno.id) \
+        .correlate(Alumno)
+
+    fields = {
+        "id": Alumno.id,
+        "codigo_alumno": Alumno.codigo_alumno,
+        "nombre_completo": Alumno.nombre_completo,
+        "edad": Alumno.edad,
+        "genero": Alumno.genero,
+        "historial_academico": histories.scalar_subquery()
+    }
+    if include_surveys:
+        answers = select(json_array(
+            json_object(pregunta=PreguntaEncuesta.pregunta, opcion=OpcionEncuesta.opcion),
+            RespuestaEncuesta.id
+        )).select_from(RespuestaEncuesta) \
+            .join(PreguntaEncuesta, PreguntaEncuesta.id == RespuestaEncuesta.pregunta_id) \
+            .join(OpcionEncuesta, OpcionEncuesta.id == RespuestaEncuesta.opcion_id) \
+            .where(RespuestaEncuesta.encuesta_id == Encuesta.id) \
+            .correlate(Encuesta)
+        text_answers = select(json_array(
+            json_object(pregunta=PreguntaEncuesta.pregunta, texto=RespuestaTextoEncuesta.texto),
+            RespuestaTextoEncuesta.id
+        )).select_from(RespuestaTextoEncuesta) \
+            .join(PreguntaEncuesta, PreguntaEncuesta.id == RespuestaTextoEncuesta.pregunta_id) \
+            .where(RespuestaTextoEncuesta.encuesta_id == Encuesta.id) \
+            .correlate(Encuesta)
+        fields["encuestas"] = select(json_array(
+            json_object(
+                anio=Encuesta.anio,
+                fecha=Encuesta.fecha,
+                respuestas=answers.scalar_subquery(),
+                respuestas_texto=text_answers.scalar_subquery()
+            ),
+            Encuesta.id
+        )).where(Encuesta.alumno_id == Alumno.id).correlate(Alumno).scalar_subquery()
+    return json_object(**fields)
+
+
+def serialize_note_detail(note) -> Dict:
+    """Nota del listado de notas, con su alumno, materia, grado, año, bimestre y criterio"""
+    history = note.historial
+    return {
+        "nota_id": note.id,
+        "alumno": {
+            "id": history.alumno.id,
+            "nombre": history.alumno.nombre_completo,
+            "codigo": history.alumno.codigo_alumno
+        },
+        "materia": {
+            "id": note.materia.id,
+            "nombre": note.materia.nombre
+        },
+        "grado": {
+            "id": history.grado.id,
+            "nombre": history.grado.nombre
+        },
+        "anio_academico": {
+            "id": history.anio_academico.id,
+            "anio": history.anio_academico.anio
+        },
+        "bimestre": {
+            "id": note.bimestre.id,
+            "nombre": note.bimestre.nombre
+        },
+        "criterio_evaluacion": {
+            "id": note.criterio_evaluacion.id,
+            "nombre": note.criterio_evaluacion.nombre
+        },
+        "valor_criterio": note.valor_criterio_de_evaluacion,
+        "nivel_logro": note.nivel_logro.valor if note.nivel_logro else None
+    }
@@ -1,12 +1,13 @@
 import io
 import pandas as pd
-import json
-import os
 import string
 from dataclasses import dataclass
 from typing import Dict, List
-from app.api.v1.students.models import Alumno
 from app.api.v1.students.services.base_grades_excel_processor import BaseExcelProcessor
+from app.api.v1.students.services.grades_loader import GradesLoader, LONG_FORMAT_COLUMNS
+from app.api.v1.students.services.upload_artifacts import UploadArtifactStore
+
+ARTIFACT_KIND = "secundaria"
 
 @dataclass
 class GenericData:
@@ -52,23 +53,31 @@ class ExcelProcessor(BaseExcelProcessor):
 
         return {"structure": structured_data}
 
-    def get_course_name(self, course_code):
-        json_route = os.path.join(os.path.dirname(__file__), '.',  'courses.json')
-        with open(json_route, 'r', encoding='utf-8') as file:
-            courses_dic = json.load(file)
-            course_name = courses_dic.get(course_code)
-            return course_name
+    def extract_generic_values(self, excel_data) -> Dict:
+        """Extrae los valores generales del Excel (nivel, bimestre, grado, sección, año académico)"""
+        generalities = excel_data.parse("Generalidades", header=None).fillna("No Definido")
+        parameters = excel_data.parse("Parametros", header=None).fillna("No Definido")
+
+        return {
+            "level": generalities.iloc[4, 7],
+            "bimester": generalities.iloc[9, 3],
+            "degree": generalities.iloc[9, 7],
+            "section": generalities.iloc[9, 9],
+            "school": parameters.iloc[0, 2],
+            "academic_year": int(parameters.iloc[3, 1]),
+            "modular_code": parameters.iloc[0, 1]
+        }
 
     def extract_generic_data(self, excel_data) -> GenericData:
         """Extrae datos generales del Excel (grado, sección, año académico)"""
-        data_structured = self.organize_data(excel_data)["structure"]
+        generic_values = self.extract_generic_values(excel_data)
 
-        level_obj = self.level_repo.get_or_create_academic_level(data_structured["Generalidades"]["sample_data"][4]["H5"])
-        bimester_obj = self.bimester_repo.get_or_create_bimester(data_structured["Generalidades"]["sample_data"][9]["D10"])
-        degree_obj = self.grade_repo.get_or_create_degree(data_structured["Generalidades"]["sample_data"][9]["H10"], level_obj.id)
-        section_obj = self.section_repo.get_or_create_section(data_structured["Generalidades"]["sample_data"][9]["J10"])
+        level_obj = self.level_repo.get_or_create_academic_level(generic_values["level"])
+        bimester_obj = self.bimester_repo.get_or_create_bimester(generic_values["bimester"])
+        degree_obj = self.grade_repo.get_or_create_degree(generic_values["degree"], level_obj.id)
+        section_obj = self.section_repo.get_or_create_section(generic_values["section"])
         # TODO: add for colegio
-        academic_year_obj = self.year_repo.get_or_create_academic_year(int(data_structured["Parametros"]["sample_data"][3]["B4"]))
+        academic_year_obj = self.year_repo.get_or_create_academic_year(generic_values["academic_year"])
         # TODO: add for modular code
 
         return {
@@ -76,9 +85,9 @@ class ExcelProcessor(BaseExcelProcessor):
             "bimester": bimester_obj,
             "degree": degree_obj,
             "section": section_obj,
-            "school": data_structured["Parametros"]["sample_data"][0]["C1"],
+            "school": generic_values["school"],
             "academic_year": academic_year_obj,
-            "modular_code": data_structured["Parametros"]["sample_data"][0]["B1"]
+            "modular_code": generic_values["modular_code"]
         }
 
     def sheet_validator(self, sheet_data: pd.DataFrame) -> bool:
@@ -101,67 +110,29 @@ class ExcelProcessor(BaseExcelProcessor):
     def should_skip_row(self, row_data: pd.Series) -> bool:
         return row_data.iloc[1] == "LEYENDA" or str(row_data.iloc[1]).startswith(("01 =", "02 =", "03 =", "04 ="))
 
-    def process_student_califications(self, row_data, generic_data: GenericData, critera_list: List[int], course_id: int) -> Alumno:
-        """Procesa el archivo completo de excel y lo guarda en la base de datos de forma organizada"""
-        student = self.student_repo.get_or_create_student(str(row_data.iloc[2]), str(row_data.iloc[1]))
-
-        academic_year_id = generic_data.get("academic_year").id
-        level_id = generic_data.get("level").id
-        degree_id = generic_data.get("degree").id
-        section_id = generic_data.get("section").id
-
-        academic_historic = self.academic_repo.get_or_create_academic_history(
-            student.id, academic_year_id, level_id, degree_id, section_id)
-
-        index_criteria = 4
-        index_calification = 3
-
-        for i in critera_list:
-            try:
-                criteria_value = str(row_data.iloc[index_criteria])
-                if(criteria_value == "No Definido"):
-                    criteria_value = None
-                calification_value = str(row_data.iloc[index_calification])
-                if(calification_value == "No Definido" or calification_value == "EXO"):
-                    calification_value = "No calificado"
-                achievement_level_id = self.achievement_repo.get_or_create_achievement_level(calification_value).id
-                calification_list = []
-
-                calification_params = {
-                    "history_id": academic_historic.id,
-                    "course_id": course_id,
-                    "bimester_id": generic_data.get('bimester').id,
-                    "evaluation_criteria_id": i,
-                    "criteria_value": criteria_value,
-                    "achievement_level_id": achievement_level_id
-                }
-
-                print(f"LLEGA: {calification_params}")
-
-                calification = self.calification_repo.create_calification(calification_params)
-                print(f"CALIFICATION CREADA: {calification}")
-                calification_list.append(calification)
-
-                index_criteria += 2
-                index_calification += 2
-            except Exception as e:
-                return {"error": f"Error al procesar fila {row_data}: {str(e)}"}
-
-        return student
-
-    def process_excel(self, file_content: bytes):
-        """Procesa el archivo completo de excel y lo guarda en la base de datos de forma organizada para alumnos de secundaria"""
-        excel_data = pd.ExcelFile(io.BytesIO(file_content))
-        base_data = self.extract_generic_data(excel_data)
+    def get_criteria_labels(self, df: pd.DataFrame) -> List[str]:
+        """Obtiene las descripciones de los criterios de evaluación de la hoja ("01 = ...")"""
+        criteria_labels = []
+        for _, row in df.iterrows():
+            criteria_description_with_order = str(row.iloc[1])
+            if criteria_description_with_order.startswith(("01 =", "02 =", "03 =", "04 =")):
+                criteria_labels.append(criteria_description_with_order)
+        return criteria_labels
+
+    def build_long_format(self, excel_data) -> pd.DataFrame:
+        """Convierte el Excel de secundaria al formato largo (una fila por alumno, materia y criterio)"""
+        generic_values = self.extract_generic_values(excel_data)
         sheet_names = excel_data.sheet_names[1:]
-        student_list = []
-        student_ids = []
+        records = []
 
         for sheet_name in sheet_names:
+            if sheet_name == "Parametros" or sheet_name == "Generalidades":
+                continue
+
             df = excel_data.parse(sheet_name, header=None)
 
             if df.shape[0] < 3:
-                return {"error": f"La hoja '{sheet_name}' tiene menos de 3 filas, no se puede procesar."}
+                raise ValueError(f"La hoja '{sheet_name}' tiene menos de 3 filas, no se puede procesar.")
 
             df.fillna("No Definido", inplace=True)
 
@@ -173,43 +144,73 @@ class ExcelProcessor(BaseExcelProcessor):
                 print(f"Error en hoja {sheet_name}, {str(e)}")
                 continue
 
-            course = self.course_repo.get_course_by_code(sheet_name)
-
-            if sheet_name == "Parametros" or sheet_name == "Generalidades":
-                continue
-
-            if not course:
-                course_name = self.get_course_name(sheet_name)
-                course = self.course_repo.create_course(course_name=course_name, course_code=sheet_name)
-
-            evaluation_criteria_list = self.criteria_repo.get_evaluation_criteria_list(df, course.id)
+            criteria_labels = self.get_criteria_labels(df)
 
             for _, row in df.iterrows():
-                try:
-                    if self.should_skip_row(row) or row[1] == "Cód. Estudiante":
-                        continue
-
-                    if row.iloc[1] == "LEYENDA":
-                        continue
+                if self.should_skip_row(row) or row.iloc[1] == "Cód. Estudiante":
+                    continue
+
+                index_criteria = 4
+                index_calification = 3
+
+                for criteria_label in criteria_labels:
+                    if index_criteria >= len(row):
+                        raise ValueError(f"Error al procesar fila {row.iloc[1]}: faltan columnas para el criterio '{criteria_label}'")
+
+                    criteria_value = str(row.iloc[index_criteria])
+                    if criteria_value == "No Definido":
+                        criteria_value = None
+                    calification_value = str(row.iloc[index_calification])
+                    if calification_value == "No Definido" or calification_value == "EXO":
+                        calification_value = "No calificado"
+
+                    records.append({
+                        "nivel": generic_values["level"],
+                        "anio": generic_values["academic_year"],
+                        "grado": generic_values["degree"],
+                        "seccion": generic_values["section"],
+                        "bimestre": generic_values["bimester"],
+                        "codigo_alumno": str(row.iloc[1]),
+                        "nombre_alumno": str(row.iloc[2]),
+                        "genero": None,
+                        "codigo_materia": sheet_name,
+                        "nombre_materia": None,
+                        "criterio": criteria_label,
+                        "valor_criterio": criteria_value,
+                        "nivel_logro": calification_value
+                    })
 
-                    if (row.iloc[1].startswith("01 =") or
-                        row.iloc[1].startswith("02 =") or
-                        row.iloc[1].startswith("04 =") or
-                            row.iloc[1].startswith("03 =")):
-                        continue
+                    index_criteria += 2
+                    index_calification += 2
 
-                    student = self.process_student_califications(row, base_data, evaluation_criteria_list, course.id)
+        return pd.DataFrame(records, columns=LONG_FORMAT_COLUMNS)
 
-                    if student.id in student_ids:
-                        continue
+    def prepare_long_format(self, file_content: bytes):
+        """
+        Formato largo del archivo, tomado del artefacto si el mismo archivo ya se cargó (sin escribir en la base).
 
-                    student_ids.append(student.id)
-                    student_list.append({
-                        "id": student.id,
-                        "name": student.nombre_completo
-                    })
+        Returns:
+            tuple: (formato largo, True si el archivo ya se había cargado)
+        """
+        artifact_store = UploadArtifactStore()
+        content_hash = artifact_store.content_hash(file_content)
 
-                except Exception as e:
-                    return {"error": f"Error al procesar fila {row[1]}: {str(e)}"}
+        already_loaded = artifact_store.exists(ARTIFACT_KIND, content_hash)
+        if already_loaded:
+            long_df = artifact_store.load(ARTIFACT_KIND, content_hash)
+        else:
+            long_df = self.build_long_format(pd.ExcelFile(io.BytesIO(file_content)))
+            artifact_store.save(ARTIFACT_KIND, content_hash, long_df)
+        return long_df, already_loaded
 
-        return {"notas_de_alumnos_actualizados": student_list, "total_notas_insertadas": len(student_list) }
+    def process_excel(self, file_content: bytes):
+        """Procesa el archivo completo de excel y lo guarda en la base de datos de forma organizada para alumnos de secundaria"""
+        try:
+            long_df, already_loaded = self.prepare_long_format(file_content)
+        except ValueError as e:
+            return {"error": str(e)}
+
+        # Si el mismo archivo ya se cargó, sus notas se reemplazan en lugar de insertarse otra vez
+        return GradesLoader(self.db).load(
+            long_df, replace=already_loaded, content_hash=UploadArtifactStore.content_hash(file_content)
+        )
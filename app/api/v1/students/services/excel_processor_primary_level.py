@@ -2,9 +2,13 @@ import io
 from dataclasses import dataclass
 import pandas as pd
 from app.api.v1.students.services.base_grades_excel_processor import BaseExcelProcessor
+from app.api.v1.students.services.grades_loader import GradesLoader, LONG_FORMAT_COLUMNS, BIMESTER_NOT_APPLICABLE
+from app.api.v1.students.services.upload_artifacts import UploadArtifactStore
 from app.utils.retrieve_dregree import get_degree_by_number
 import re
 
+ARTIFACT_KIND = "primaria"
+
 @dataclass
 class GenericData:
     """Clase para tipar almacenar datos generales"""
@@ -51,22 +55,14 @@ class ExcelProcessor(BaseExcelProcessor):
         base_data["school"]["name"] = generic_data.iloc[1, 2]
         base_data["modular_code"] = generic_data.iloc[1, 3]
 
-        degree=get_degree_by_number(generic_data.iloc[1, 4])
-        section=generic_data.iloc[1, 5]
-
-        level_obj = self.level_repo.get_or_create_academic_level("PRIMARIA")
-        bimester_obj = self.bimester_repo.get_or_create_bimester("NO APLICA")
-        degree_obj = self.grade_repo.get_or_create_degree(degree, level_obj.id)
-        section_obj = self.section_repo.get_or_create_section(section)
-        academic_year_obj = self.year_repo.get_or_create_academic_year(2024)
         return {
-            "level":level_obj,
-            "bimester":bimester_obj,
-            "degree":degree_obj,
-            "section":section_obj,
-            "school":base_data["school"]["name"],
-            "academic_year":academic_year_obj,
-            "modular_code":base_data["modular_code"]
+            "level": "PRIMARIA",
+            "bimester": BIMESTER_NOT_APPLICABLE,
+            "degree": get_degree_by_number(generic_data.iloc[1, 4]),
+            "section": generic_data.iloc[1, 5],
+            "school": base_data["school"]["name"],
+            "academic_year": 2024,
+            "modular_code": base_data["modular_code"]
         }
 
 
@@ -209,40 +205,22 @@ class ExcelProcessor(BaseExcelProcessor):
         return educacion_religiosa_califications
 
 
-    def save_student_califications(self, academic_histori_id, course_id, bimester_id, califications_per_criteria: list[dict[str, str]]):
-        """Guarda las calificaciones de un alumno en la base de datos."""
-        for criteria_and_calification in califications_per_criteria:
-            criteria = criteria_and_calification.get("criteria")
-            achievement_level = criteria_and_calification.get("calification")
-
-            criteria_obj = self.criteria_repo.get_or_create_evaluation_criteria(criteria, course_id)
-            achievement_level_obj = self.achievement_repo.get_or_create_achievement_level(achievement_level)
-
-            calification_params = {
-                "history_id": academic_histori_id,
-                "course_id": course_id,
-                "bimester_id": bimester_id,
-                "evaluation_criteria_id": criteria_obj.id,
-                "criteria_value": "",
-                "achievement_level_id": achievement_level_obj.id
-            }
-
-            self.calification_repo.create_calification(calification_params)
-
-
-
-    def process_student_califications(self, csv_content: bytes):
-        """Procesa las calificaciones de los estudiantes de Primaria."""
-        csv_df = pd.ExcelFile(io.BytesIO(csv_content))
-
-        # csv_df = self.load_excel(csv_content)
-        generic_data = self.get_generic_data(csv_df)
-        bimesters = ["PRIMER BIMESTRE", "SEGUNDO BIMESTRE", "TERCER BIMESTRE", "CUARTO BIMESTRE"]
-
-        sheet_names = csv_df.sheet_names
+    def build_long_format(self, excel_data: pd.ExcelFile) -> pd.DataFrame:
+        """Convierte el Excel de primaria al formato largo (una fila por alumno, materia y criterio)."""
+        generic_data = self.get_generic_data(excel_data)
+        courses = [
+            ("PERSONAL SOCIAL", self.pesonal_social_calification),
+            ("EDUCACIÓN FÍSICA", self.educacion_fisica_calification),
+            ("COMUNICACIÓN", self.comunicacion_calification),
+            ("ARTE Y CULTURA", self.arte_y_cultura_calification),
+            ("MATEMÁTICA", self.matematica_calification),
+            ("CIENCIA Y TECNOLOGÍA", self.ciencia_y_tecnologia_calification),
+            ("EDUCACIÓN RELIGIOSA", self.educacion_religiosa_calification),
+        ]
+        records = []
 
-        for sheet_name in sheet_names:
-            current_sheet_df = csv_df.parse(sheet_name, header=None)
+        for sheet_name in excel_data.sheet_names:
+            current_sheet_df = excel_data.parse(sheet_name, header=None)
             students_grades = current_sheet_df.iloc[9:, 1:]
             students_grade_df = pd.DataFrame(students_grades)
 
@@ -263,86 +241,53 @@ class ExcelProcessor(BaseExcelProcessor):
                     print(f"Skipping row {index} due to missing student code. - {row.iloc[1]}")
                     continue
 
-                student = self.student_repo.get_or_create_student(
-                    student_code=student_code,
-                    student_name=student_name,
-                    student_gender=student_gender
-                )
-
-                academic_history = self.academic_repo.get_or_create_academic_history(
-                    academic_year_id= generic_data.get("academic_year").id,
-                    level_id=generic_data.get("level").id,
-                    degree_id=generic_data.get("degree").id,
-                    section_id=generic_data.get("section").id,
-                    student_id=student.id
-                )
-
-
-                # """Al no tener bimestres en primaria, se replica las notas para todos los bimestres"""
-
-                ## Curso PERSONAL SOCIAL
-                course = self.course_repo.get_or_create_course("PERSONAL SOCIAL", self.generate_slug("PERSONAL SOCIAL"))
-                personal_social_califications_per_criteria = self.pesonal_social_calification(row)
-
-                for bimester in bimesters:
-                    current_bimester_obj = self.bimester_repo.get_or_create_bimester(bimester)
-
-                    self.save_student_califications(academic_history.id, course.id, current_bimester_obj.id, personal_social_califications_per_criteria)
-
-
-                ## Curso EDUCACIÓN FÍSICA
-                course = self.course_repo.get_or_create_course("EDUCACIÓN FÍSICA", self.generate_slug("EDUCACIÓN FÍSICA"))
-                fisica_califications_per_criteria = self.educacion_fisica_calification(row)
-
-                for bimester in bimesters:
-                    current_bimester_obj = self.bimester_repo.get_or_create_bimester(bimester)
-
-                    self.save_student_califications(academic_history.id, course.id, current_bimester_obj.id, fisica_califications_per_criteria)
-
-                ## Curso COMUNICACIÓN
-                course = self.course_repo.get_or_create_course("COMUNICACIÓN", self.generate_slug("COMUNICACIÓN"))
-                comunicacion_califications_per_criteria = self.comunicacion_calification(row)
-
-                for bimester in bimesters:
-                    current_bimester_obj = self.bimester_repo.get_or_create_bimester(bimester)
-
-                    self.save_student_califications(academic_history.id, course.id, current_bimester_obj.id, comunicacion_califications_per_criteria)
-
-                ### ARTE Y CULTURA
-                course = self.course_repo.get_or_create_course("ARTE Y CULTURA", self.generate_slug("ARTE Y CULTURA"))
-                arte_y_cultura_califications_per_criteria = self.arte_y_cultura_calification(row)
-
-                for bimester in bimesters:
-                    current_bimester_obj = self.bimester_repo.get_or_create_bimester(bimester)
-
-                    self.save_student_califications(academic_history.id, course.id, current_bimester_obj.id, arte_y_cultura_califications_per_criteria)
-
-                ### MATEMÁTICA
-                course = self.course_repo.get_or_create_course("MATEMÁTICA", self.generate_slug("MATEMÁTICA"))
-                matematica_califications_per_criteria = self.matematica_calification(row)
-
-                for bimester in bimesters:
-                    current_bimester_obj = self.bimester_repo.get_or_create_bimester(bimester)
-
-                    self.save_student_califications(academic_history.id, course.id, current_bimester_obj.id, matematica_califications_per_criteria)
-
-                ### CIENCIA Y TECNOLOGÍA
-                course = self.course_repo.get_or_create_course("CIENCIA Y TECNOLOGÍA", self.generate_slug("CIENCIA Y TECNOLOGÍA"))
-                ciencia_y_tecnologia_califications_per_criteria = self.ciencia_y_tecnologia_calification(row)
-
-                for bimester in bimesters:
-                    current_bimester_obj = self.bimester_repo.get_or_create_bimester(bimester)
+                # """Al no tener bimestres en primaria, el cargador replica las notas para todos los bimestres"""
+                for course_name, califications_per_course in courses:
+                    for criteria_and_calification in califications_per_course(row):
+                        records.append({
+                            "nivel": generic_data["level"],
+                            "anio": generic_data["academic_year"],
+                            "grado": generic_data["degree"],
+                            "seccion": generic_data["section"],
+                            "bimestre": generic_data["bimester"],
+                            "codigo_alumno": student_code,
+                            "nombre_alumno": student_name,
+                            "genero": student_gender,
+                            "codigo_materia": self.generate_slug(course_name),
+                            "nombre_materia": course_name,
+                            "criterio": criteria_and_calification.get("criteria"),
+                            "valor_criterio": "",
+                            "nivel_logro": criteria_and_calification.get("calification")
+                        })
+
+        return pd.DataFrame(records, columns=LONG_FORMAT_COLUMNS)
+
+    def prepare_long_format(self, csv_content: bytes):
+        """
+        Formato largo del archivo, tomado del artefacto si el mismo archivo ya se cargó (sin escribir en la base).
 
-                    self.save_student_califications(academic_history.id, course.id, current_bimester_obj.id, ciencia_y_tecnologia_califications_per_criteria)
+        Returns:
+            tuple: (formato largo, True si el archivo ya se había cargado)
+        """
+        artifact_store = UploadArtifactStore()
+        content_hash = artifact_store.content_hash(csv_content)
 
-                ### EDUCACIÓN RELIGIOSA
-                course = self.course_repo.get_or_create_course("EDUCACIÓN RELIGIOSA", self.generate_slug("EDUCACIÓN RELIGIOSA"))
-                educacion_religiosa_califications_per_criteria = self.educacion_religiosa_calification(row)
+        already_loaded = artifact_store.exists(ARTIFACT_KIND, content_hash)
+        if already_loaded:
+            long_df = artifact_store.load(ARTIFACT_KIND, content_hash)
+        else:
+            long_df = self.build_long_format(self.load_excel(csv_content))
+            artifact_store.save(ARTIFACT_KIND, content_hash, long_df)
+        return long_df, already_loaded
 
-                for bimester in bimesters:
-                    current_bimester_obj = self.bimester_repo.get_or_create_bimester(bimester)
+    def process_student_califications(self, csv_content: bytes):
+        """Procesa las calificaciones de los estudiantes de Primaria."""
+        long_df, already_loaded = self.prepare_long_format(csv_content)
 
-                    self.save_student_califications(academic_history.id, course.id, current_bimester_obj.id, educacion_religiosa_califications_per_criteria)
+        # Si el mismo archivo ya se cargó, sus notas se reemplazan en lugar de insertarse otra vez
+        return GradesLoader(self.db).load(
+            long_df, replace=already_loaded, content_hash=UploadArtifactStore.content_hash(csv_content)
+        )
 
     def generate_slug(self, course_name: str) -> str:
         """
@@ -0,0 +1,230 @@
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+import pandas as pd
+from app.api.v1.students.services.base_grades_excel_processor import BaseExcelProcessor
+from app.api.v1.students.services.upload_artifacts import UploadArtifactStore
+from app.api.v1.students.repositories.student_profiles import StudentProfileRepository
+from app.utils.pagination import invalidate_cached_counts
+
+# Columnas del formato largo: una fila por alumno, materia, bimestre y criterio
+LONG_FORMAT_COLUMNS = [
+    "nivel",
+    "anio",
+    "grado",
+    "seccion",
+    "bimestre",
+    "codigo_alumno",
+    "nombre_alumno",
+    "genero",
+    "codigo_materia",
+    "nombre_materia",
+    "criterio",
+    "valor_criterio",
+    "nivel_logro",
+]
+
+BIMESTERS = ["PRIMER BIMESTRE", "SEGUNDO BIMESTRE", "TERCER BIMESTRE", "CUARTO BIMESTRE"]
+
+# Primaria no tiene bimestres, sus notas se replican en todos los bimestres al cargarlas
+BIMESTER_NOT_APPLICABLE = "NO APLICA"
+
+CRITERIA_LABEL_PATTERN = re.compile(r"^\d{2}\s*=")
+
+
+class GradesLoader(BaseExcelProcessor):
+    """Guarda en la base de datos las notas en formato largo, ya sea de una carga o de un artefacto"""
+    def __init__(self, db):
+        super().__init__(db)
+        self._courses_names = None
+
+    def get_course_name(self, course_code: str) -> Optional[str]:
+        """Obtiene el nombre de la materia a partir de su código usando courses.json"""
+        if self._courses_names is None:
+            json_route = os.path.join(os.path.dirname(__file__), '.', 'courses.json')
+            with open(json_route, 'r', encoding='utf-8') as file:
+                self._courses_names = json.load(file)
+        return self._courses_names.get(course_code)
+
+    def parse_criteria_label(self, criteria_label: str) -> str:
+        """Quita el prefijo de orden ("01 = ...") de la descripción del criterio"""
+        if CRITERIA_LABEL_PATTERN.match(criteria_label):
+            return criteria_label.split("=", 1)[1].strip()
+        return criteria_label
+
+    def resolve_bimesters(self, bimester_name: str) -> List[str]:
+        """Retorna los bimestres en los que se guarda una nota"""
+        if bimester_name == BIMESTER_NOT_APPLICABLE:
+            return BIMESTERS
+        return [bimester_name]
+
+    def resolve_course(self, course_code: str, course_name: Optional[str]):
+        """Obtiene o crea la materia de una fila"""
+        if course_name:
+            return self.course_repo.get_or_create_course(course_name, course_code)
+
+        course = self.course_repo.get_course_by_code(course_code)
+        course_name = self.get_course_name(course_code)
+        if not course:
+            course = self.course_repo.create_course(course_name=course_name, course_code=course_code)
+        elif course_name and course.nombre != course_name:
+            # courses.json manda sobre el nombre guardado, así una corrección del archivo llega a la base
+            course = self.course_repo.update_course_name(course, course_name)
+        return course
+
+    def resolve(self, long_df: pd.DataFrame, content_hash: Optional[str] = None):
+        """
+        Obtiene o crea los catálogos, alumnos e historiales de las filas del formato largo,
+        resolviendo cada valor distinto una sola vez, y arma las notas listas para insertar
+        marcadas con el hash del archivo del que vienen.
+
+        Returns:
+            tuple: (notas, llaves (historial, materia, bimestre) de las notas, alumnos de la carga)
+        """
+        # Se trabaja siempre con texto, igual que en el artefacto, para que cargar y reprocesar den lo mismo
+        long_df = long_df.astype("string")
+        records = long_df.astype(object).where(long_df.notna(), None).to_dict("records")
+
+        levels, years, degrees, sections, bimesters = {}, {}, {}, {}, {}
+        courses, criteria, achievement_levels = {}, {}, {}
+        students, histories = {}, {}
+        student_ids = set()
+        student_list = []
+        califications = []
+        scopes = set()
+
+        for record in records:
+            level_name = record["nivel"]
+            if level_name not in levels:
+                levels[level_name] = self.level_repo.get_or_create_academic_level(level_name).id
+            level_id = levels[level_name]
+
+            year = int(record["anio"])
+            if year not in years:
+                years[year] = self.year_repo.get_or_create_academic_year(year).id
+
+            degree_key = (record["grado"], level_id)
+            if degree_key not in degrees:
+                degrees[degree_key] = self.grade_repo.get_or_create_degree(record["grado"], level_id).id
+
+            section_name = record["seccion"]
+            if section_name not in sections:
+                sections[section_name] = self.section_repo.get_or_create_section(section_name).id
+
+            student_key = (record["codigo_alumno"], record["nombre_alumno"])
+            if student_key not in students:
+                student = self.student_repo.get_or_create_student(
+                    student_name=record["nombre_alumno"],
+                    student_code=record["codigo_alumno"],
+                    student_gender=record["genero"] or "MASCULINO"
+                )
+                students[student_key] = student.id
+                if student.id not in student_ids:
+                    student_ids.add(student.id)
+                    student_list.append({"id": student.id, "name": student.nombre_completo})
+            student_id = students[student_key]
+
+            history_key = (student_id, years[year], level_id, degrees[degree_key], sections[section_name])
+            if history_key not in histories:
+                histories[history_key] = self.academic_repo.get_or_create_academic_history(*history_key).id
+            history_id = histories[history_key]
+
+            course_key = (record["codigo_materia"], record["nombre_materia"])
+            if course_key not in courses:
+                courses[course_key] = self.resolve_course(*course_key).id
+            course_id = courses[course_key]
+
+            criteria_key = (self.parse_criteria_label(record["criterio"]), course_id)
+            if criteria_key not in criteria:
+                criteria[criteria_key] = self.criteria_repo.get_or_create_evaluation_criteria(*criteria_key).id
+
+            achievement_value = record["nivel_logro"]
+            if achievement_value not in achievement_levels:
+                achievement_levels[achievement_value] = self.achievement_repo.get_or_create_achievement_level(achievement_value).id
+
+            for bimester_name in self.resolve_bimesters(record["bimestre"]):
+                if bimester_name not in bimesters:
+                    bimesters[bimester_name] = self.bimester_repo.get_or_create_bimester(bimester_name).id
+                bimester_id = bimesters[bimester_name]
+
+                scopes.add((history_id, course_id, bimester_id))
+                califications.append({
+                    "historial_id": history_id,
+                    "materia_id": course_id,
+                    "bimestre_id": bimester_id,
+                    "criterio_evaluacion_id": criteria[criteria_key],
+                    "valor_criterio_de_evaluacion": record["valor_criterio"] or "",
+                    "nivel_logro_id": achievement_levels[achievement_value],
+                    "carga": content_hash,
+                })
+
+        return califications, scopes, student_list
+
+    def seed(self, long_df: pd.DataFrame) -> int:
+        """
+        Crea los catálogos, alumnos e historiales de las filas sin guardar notas; retorna cuántos alumnos tiene.
+        El importador masivo lo llama en el proceso principal antes de repartir las cargas entre procesos,
+        así los procesos solo encuentran esas filas y nunca compiten por crearlas.
+        """
+        _, _, student_list = self.resolve(long_df)
+        return len(student_list)
+
+    def load(
+        self,
+        long_df: pd.DataFrame,
+        replace: bool = False,
+        refresh_profiles: bool = True,
+        content_hash: Optional[str] = None
+    ) -> Dict:
+        """
+        Guarda las notas del formato largo en la base de datos.
+
+        Los catálogos se resuelven una sola vez por valor distinto y las notas se insertan en bloque.
+        Con replace=True se eliminan antes las notas que trajo la misma carga (content_hash), de modo que
+        volver a cargar un archivo no duplica notas aunque haya cambiado la forma de leerlo; las notas sin
+        carga registrada se eliminan por historial, materia y bimestre.
+        Las notas y los perfiles de sus alumnos se confirman en la misma transacción; con
+        refresh_profiles=False los perfiles quedan a cargo de quien llama (el importador masivo).
+        """
+        califications, scopes, student_list = self.resolve(long_df, content_hash)
+        student_ids = {student["id"] for student in student_list}
+
+        if replace:
+            if content_hash:
+                self.calification_repo.delete_upload_califications(content_hash)
+            self.calification_repo.delete_califications(scopes, without_upload=bool(content_hash))
+        inserted = self.calification_repo.create_califications(califications)
+        if refresh_profiles:
+            StudentProfileRepository(self.db).refresh(student_ids, commit=False)
+        self.db.commit()
+        invalidate_cached_counts()
+
+        return {
+            "notas_de_alumnos_actualizados": student_list,
+            "total_notas_insertadas": len(student_list),
+            "notas_insertadas": inserted
+        }
+
+    def replay(self, kind: Optional[str] = None, content_hash: Optional[str] = None) -> Dict:
+        """Reconstruye las notas a partir de los artefactos guardados, sin volver a leer los Excel"""
+        store = UploadArtifactStore()
+        artifacts = store.list_artifacts(kind)
+        if content_hash:
+            artifacts = [artifact for artifact in artifacts if artifact["content_hash"] == content_hash]
+
+        results = []
+        for artifact in artifacts:
+            started_at = time.perf_counter()
+            long_df = store.load(artifact["kind"], artifact["content_hash"])
+            result = self.load(long_df, replace=True, content_hash=artifact["content_hash"])
+            results.append({
+                "kind": artifact["kind"],
+                "content_hash": artifact["content_hash"],
+                "alumnos": result["total_notas_insertadas"],
+                "notas_insertadas": result["notas_insertadas"],
+                "segundos": round(time.perf_counter() - started_at, 3)
+            })
+
+        return {"total_artefactos": len(results), "artefactos": results}
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from app.utils.normalize_text import normalize_text
+from app.api.v1.survey.services.name_matching import match_score
+from app.utils.pagination import invalidate_cached_counts
+from app.api.v1.students.repositories.student_profiles import StudentProfileRepository
+
+
+def surname_tokens(full_name: str) -> Set[str]:
+    """
+    Palabras de los apellidos normalizadas, usadas como llaves de bloque.
+    Los nombres vienen como "APELLIDOS, NOMBRES"; sin coma se usan todas las palabras.
+    """
+    surnames = full_name.split(",", 1)[0] if full_name and "," in full_name else full_name
+    return {token for token in normalize_text(surnames).split() if len(token) > 2}
+
+
+def given_name_initial(full_name: str) -> str:
+    """Inicial normalizada del primer nombre ("APELLIDOS, NOMBRES"); vacía si el nombre no tiene coma"""
+    given_names = normalize_text(full_name.split(",", 1)[1]) if full_name and "," in full_name else ""
+    return given_names[:1]
+
+
+def _score_pairs(task) -> List[Tuple[int, int, float]]:
+    """Puntúa un bloque de pares (id, nombre normalizado, id, nombre normalizado) y deja los que pasan el umbral"""
+    pairs, threshold = task
+    scored = []
+    for first_id, first_name, second_id, second_name in pairs:
+        score = match_score(first_name, second_name)
+        if score >= threshold:
+            scored.append((first_id, second_id, score))
+    return scored
+
+
+class StudentDeduplicator:
+    """
+    Busca alumnos repetidos (mismo alumno creado con nombres escritos distinto) y los fusiona.
+
+    1. Bloques: solo se comparan alumnos que comparten alguna palabra de sus apellidos (los apellidos muy
+       comunes, además la inicial del primer nombre).
+    2. Puntuación: los pares de cada bloque se puntúan en paralelo con la misma similitud del emparejamiento de encuestas.
+    3. Grupos: los pares sobre el umbral se unen en grupos; sobrevive el alumno con código, luego el de más
+       historiales y luego el de menor id. Dos alumnos con códigos distintos nunca se agrupan.
+    """
+    def __init__(self, student_repo, threshold: float = 0.92, max_block_size: int = 300,
+                 workers: Optional[int] = None, chunk_size: int = 5000):
+        self.student_repo = student_repo
+        self.threshold = threshold
+        self.max_block_size = max_block_size
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def candidate_pairs(self, students: Dict[int, Dict]) -> Tuple[Set[Tuple[int, int]], List[Dict]]:
+        """
+        Pares de alumnos que comparten al menos una palabra de sus apellidos.
+        Un apellido muy común (bloque mayor a max_block_size) se divide por la inicial del primer nombre;
+        si aun así queda un bloque muy grande, se omite y se retorna en la lista de bloques omitidos.
+        """
+        blocks = defaultdict(list)
+        for student_id, student in students.items():
+            for token in surname_tokens(student["nombre_completo"]):
+                blocks[token].append(student_id)
+
+        pairs = set()
+        skipped = []
+        for token, block in blocks.items():
+            sub_blocks = {"": block}
+            if len(block) > self.max_block_size:
+                sub_blocks = defaultdict(list)
+                for student_id in block:
+                    sub_blocks[given_name_initial(students[student_id]["nombre_completo"])].append(student_id)
+
+            for initial, sub_block in sorted(sub_blocks.items()):
+                if len(sub_block) > self.max_block_size:
+                    skipped.append({"apellido": token, "inicial": initial, "alumnos": len(sub_block)})
+                    continue
+                sub_block = sorted(sub_block)
+                for i, first_id in enumerate(sub_block):
+                    for second_id in sub_block[i + 1:]:
+                        pairs.add((first_id, second_id))
+        return pairs, sorted(skipped, key=lambda block: (-block["alumnos"], block["apellido"], block["inicial"]))
+
+    def score_pairs(self, students: Dict[int, Dict], pairs: Set[Tuple[int, int]]) -> List[Tuple[int, int, float]]:
+        """Puntúa los pares candidatos, en varios procesos si son muchos"""
+        rows = [
+            (first_id, students[first_id]["nombre_normalizado"], second_id, students[second_id]["nombre_normalizado"])
+            for first_id, second_id in sorted(pairs)
+        ]
+        chunks = [(rows[i:i + self.chunk_size], self.threshold) for i in range(0, len(rows), self.chunk_size)]
+
+        if self.workers <= 1 or len(chunks) <= 1:
+            return [pair for chunk in chunks for pair in _score_pairs(chunk)]
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            return [pair for scored in executor.map(_score_pairs, chunks) for pair in scored]
+
+    def survivor_rank(self, student: Dict) -> tuple:
+        """Orden para elegir el alumno que se conserva en un grupo"""
+        return (0 if student["codigo_alumno"] else 1, -student["historiales"], student["id"])
+
+    def build_groups(self, students: Dict[int, Dict], scored_pairs: List[Tuple[int, int, float]]) -> List[Dict]:
+        """Une los pares en grupos sin mezclar alumnos con códigos distintos"""
+        parent = {}
+        codes = {}
+
+        def find(student_id):
+            parent.setdefault(student_id, student_id)
+            while parent[student_id] != student_id:
+                parent[student_id] = parent[parent[student_id]]
+                student_id = parent[student_id]
+            return student_id
+
+        # Los pares más parecidos se unen primero
+        for first_id, second_id, _ in sorted(scored_pairs, key=lambda pair: -pair[2]):
+            first_root, second_root = find(first_id), find(second_id)
+            if first_root == second_root:
+                continue
+
+            first_codes = codes.get(first_root, {students[first_id]["codigo_alumno"]} - {None})
+            second_codes = codes.get(second_root, {students[second_id]["codigo_alumno"]} - {None})
+            if first_codes and second_codes and first_codes != second_codes:
+                continue
+
+            parent[second_root] = first_root
+            codes[first_root] = first_codes | second_codes
+
+        best_scores = defaultdict(float)
+        for first_id, second_id, score in scored_pairs:
+            if find(first_id) == find(second_id):
+                best_scores[first_id] = max(best_scores[first_id], score)
+                best_scores[second_id] = max(best_scores[second_id], score)
+
+        members = defaultdict(list)
+        for student_id in parent:
+            members[find(student_id)].append(students[student_id])
+
+        groups = []
+        for group in members.values():
+            if len(group) < 2:
+                continue
+            group.sort(key=self.survivor_rank)
+            survivor, duplicates = group[0], group[1:]
+            groups.append({
+                "sobreviviente": {
+                    "id": survivor["id"],
+                    "nombre": survivor["nombre_completo"],
+                    "codigo": survivor["codigo_alumno"]
+                },
+                "duplicados": [
+                    {
+                        "id": duplicate["id"],
+                        "nombre": duplicate["nombre_completo"],
+                        "codigo": duplicate["codigo_alumno"],
+                        "similitud": round(best_scores[duplicate["id"]], 4)
+                    }
+                    for duplicate in duplicates
+                ]
+            })
+
+        return sorted(groups, key=lambda group: group["sobreviviente"]["id"])
+
+    def find_duplicates(self) -> Dict:
+        """Arma el reporte de revisión con los grupos de alumnos repetidos"""
+        students = {}
+        for student_id, full_name, normalized_name, code, histories in self.student_repo.get_students_for_deduplication():
+            students[student_id] = {
+                "id": student_id,
+                "nombre_completo": full_name,
+                "nombre_normalizado": normalized_name or normalize_text(full_name),
+                "codigo_alumno": code or None,
+                "historiales": histories
+            }
+
+        pairs, skipped_blocks = self.candidate_pairs(students)
+        scored_pairs = self.score_pairs(students, pairs)
+        groups = self.build_groups(students, scored_pairs)
+
+        return {
+            "umbral": self.threshold,
+            "total_alumnos": len(students),
+            "pares_comparados": len(pairs),
+            # Alumnos de estos bloques solo se compararon por sus otros apellidos
+            "bloques_omitidos": skipped_blocks,
+            "total_grupos": len(groups),
+            "total_duplicados": sum(len(group["duplicados"]) for group in groups),
+            "grupos": groups
+        }
+
+    def merge(self, report: Dict) -> Dict:
+        """Fusiona los grupos de un reporte (revisado o no) en una sola transacción"""
+        merges = {
+            duplicate["id"]: group["sobreviviente"]["id"]
+            for group in report.get("grupos", [])
+            for duplicate in group["duplicados"]
+        }
+        result = self.student_repo.merge_students(merges)
+        invalidate_cached_counts()
+        StudentProfileRepository(self.student_repo.db).refresh(set(merges.values()))
+        return result
@@ -1,4 +1,7 @@
 from ..repositories.student import StudentRepository
+from ..repositories.student_profiles import StudentProfileRepository
+from ..serializers import STUDENT_DETAIL, to_dict
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from .base_grades_excel_processor import BaseExcelProcessor as BaseStudent
 class Student(BaseStudent):
@@ -15,13 +18,30 @@ class Student(BaseStudent):
         student_repo = StudentRepository(self.db)
         return student_repo.get_available_filters()
 
-    def get_students(self, page: int, page_size: int):
+    def get_students(self, page: int, page_size: int, after: str = None, limit: int = None,
+                     count_strategy: str = None, include_total: bool = True):
         student_repo = StudentRepository(self.db)
-        return student_repo.get_all_students_with_associated_data(page, page_size)
+        try:
+            return student_repo.get_all_students_with_associated_data(
+                page, page_size, after=after, limit=limit, count_strategy=count_strategy, include_total=include_total
+            )
+        except ValueError as e:
+            # Cursor o estrategia de conteo inválidos: es un error de la petición
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def update_student(self, student_id: int, age: int = None, gender: str = None):
+        """Actualiza la edad y/o el género del alumno y su perfil de análisis en la misma transacción"""
+        student_repo = StudentRepository(self.db)
+        student = student_repo.update_student(student_id, commit=False, age=age, gender=gender)
+        StudentProfileRepository(self.db).refresh([student_id], commit=False)
+        self.db.commit()
+        return student
 
     def get_student_by_id(self, student_id: int):
         student_repo = StudentRepository(self.db)
-        return student_repo.get_student_by_id(student_id)
+        if student_repo.builds_json_in_database():
+            return student_repo.get_student_detail_json(student_id)
+        return to_dict(student_repo.get_student_by_id(student_id), STUDENT_DETAIL)
 
     def get_students_with_filters(self,
         anio_academico_id: int = None,
@@ -31,34 +51,45 @@ class Student(BaseStudent):
         materia_id: int = None,
         grado_id: int = None,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        after: str = None,
+        limit: int = None,
+        count_strategy: str = None,
+        include_total: bool = True
     ):
         student_repo = StudentRepository(self.db)
-        return student_repo.get_students_with_filters(
-        anio_academico_id=anio_academico_id,
-        seccion_id=seccion_id,
-        grado_id=grado_id,
-        nivel_id=nivel_id,
-        bimestre_id=bimestre_id,
-        materia_id=materia_id,
-        page=page,
-        page_size=page_size
-        )
+        try:
+            return student_repo.get_students_with_filters(
+            anio_academico_id=anio_academico_id,
+            seccion_id=seccion_id,
+            grado_id=grado_id,
+            nivel_id=nivel_id,
+            bimestre_id=bimestre_id,
+            materia_id=materia_id,
+            page=page,
+            page_size=page_size,
+            after=after,
+            limit=limit,
+            count_strategy=count_strategy,
+            include_total=include_total
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     def get_students_with_only_notes(self):
         """Obtiene alumnos que tienen solo notas."""
         student_repo = StudentRepository(self.db)
-        return student_repo.get_students_with_only_notes()
+        return [to_dict(student) for student in student_repo.get_students_with_only_notes()]
 
     def get_students_with_only_surveys(self):
         """Obtiene alumnos que tienen solo encuestas."""
         student_repo = StudentRepository(self.db)
-        return student_repo.get_students_with_only_surveys()
+        return [to_dict(student) for student in student_repo.get_students_with_only_surveys()]
 
     def get_students_with_notes_and_surveys(self):
         """Obtiene alumnos que tienen tanto notas como encuestas."""
         student_repo = StudentRepository(self.db)
-        return student_repo.get_students_with_notes_and_surveys()
+        return [to_dict(student) for student in student_repo.get_students_with_notes_and_surveys()]
 
     def get_students_summary(self):
         """Obtiene un resumen del estado de los alumnos."""
@@ -76,30 +107,59 @@ class Student(BaseStudent):
         grado_id: int = None,
         anio_academico_id: int = None,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        after: str = None,
+        limit: int = None,
+        count_strategy: str = None,
+        include_total: bool = True
     ):
         student_repo = StudentRepository(self.db)
-        return student_repo.get_student_notes(
-            alumno_id=alumno_id,
-            materia_id=materia_id,
-            grado_id=grado_id,
-            anio_academico_id=anio_academico_id,
-            page=page,
-            page_size=page_size
-    )
+        try:
+            return student_repo.get_student_notes(
+                alumno_id=alumno_id,
+                materia_id=materia_id,
+                grado_id=grado_id,
+                anio_academico_id=anio_academico_id,
+                page=page,
+                page_size=page_size,
+                after=after,
+                limit=limit,
+                count_strategy=count_strategy,
+                include_total=include_total
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 
     def get_student_performance_data(self, include_surveys: bool = False):
-        student_repo = StudentRepository(self.db)
-        return student_repo.get_student_performance_data(include_surveys)
+        profile_repo = StudentProfileRepository(self.db)
+        return profile_repo.get_student_performance_data(include_surveys)
+
+    def iter_student_performance_data(self, include_surveys: bool = False):
+        profile_repo = StudentProfileRepository(self.db)
+        return profile_repo.iter_student_performance_data(include_surveys)
 
 
     def get_student_behavior_patterns(self, min_survey_responses: int, min_academic_periods: int):
         student_repo = StudentRepository(self.db)
         return student_repo.get_student_behavior_patterns(min_survey_responses, min_academic_periods)
 
-    def get_complete_student_profile(self, analysis_type: str = "all"):
+    def iter_student_behavior_patterns(self, min_survey_responses: int, min_academic_periods: int):
         student_repo = StudentRepository(self.db)
-        return student_repo.get_complete_student_profile(analysis_type)
+        return student_repo.iter_student_behavior_patterns(min_survey_responses, min_academic_periods)
+
+    def get_complete_student_profile(self, analysis_type: str = "all"):
+        profile_repo = StudentProfileRepository(self.db)
+        return profile_repo.get_complete_student_profile(analysis_type)
+
+    def iter_complete_student_profile(self, analysis_type: str = "all"):
+        profile_repo = StudentProfileRepository(self.db)
+        return profile_repo.iter_complete_student_profile(analysis_type)
+
+    def rebuild_student_profiles(self, only_missing: bool = False):
+        profile_repo = StudentProfileRepository(self.db)
+        if only_missing:
+            return profile_repo.refresh_missing()
+        return profile_repo.refresh_all()
 
 
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional
+import pandas as pd
+from app.core.config import settings
+
+# Tipos de plantilla con artefactos; son también los nombres de las carpetas dentro de base_dir
+ARTIFACT_KINDS = ("secundaria", "primaria")
+
+CONTENT_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def validate_kind(kind: str) -> str:
+    """Acepta solo los tipos conocidos, para que nunca se arme una ruta fuera de base_dir"""
+    if kind not in ARTIFACT_KINDS:
+        raise ValueError(f"Tipo de artefacto no válido: {kind} (opciones: {', '.join(ARTIFACT_KINDS)})")
+    return kind
+
+
+class UploadArtifactStore:
+    """Guarda la salida normalizada (formato largo) de cada carga como Parquet comprimido"""
+    def __init__(self, base_dir: Optional[str] = None):
+        self.base_dir = base_dir or settings.upload_artifacts_dir
+
+    @staticmethod
+    def content_hash(file_content: bytes) -> str:
+        """Calcula la llave del artefacto a partir del contenido del archivo subido"""
+        return hashlib.sha256(file_content).hexdigest()
+
+    def path_for(self, kind: str, content_hash: str) -> str:
+        """Ruta del artefacto para el tipo de plantilla y hash indicados"""
+        if not CONTENT_HASH_PATTERN.match(content_hash or ""):
+            raise ValueError("El hash del artefacto no es válido")
+        return os.path.join(self.base_dir, validate_kind(kind), f"{content_hash}.parquet")
+
+    def exists(self, kind: str, content_hash: str) -> bool:
+        """Indica si ya existe un artefacto para el contenido"""
+        return os.path.isfile(self.path_for(kind, content_hash))
+
+    def save(self, kind: str, content_hash: str, long_df: pd.DataFrame) -> str:
+        """Escribe el artefacto de forma atómica y retorna su ruta"""
+        path = self.path_for(kind, content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.tmp"
+        long_df.astype("string").to_parquet(tmp_path, compression="zstd", index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, kind: str, content_hash: str) -> pd.DataFrame:
+        """Lee un artefacto guardado"""
+        return pd.read_parquet(self.path_for(kind, content_hash))
+
+    def list_artifacts(self, kind: Optional[str] = None) -> List[Dict[str, str]]:
+        """Lista los artefactos guardados, opcionalmente filtrando por tipo de plantilla"""
+        if not os.path.isdir(self.base_dir):
+            return []
+
+        kinds = [validate_kind(kind)] if kind else ARTIFACT_KINDS
+        artifacts = []
+        for current_kind in kinds:
+            kind_dir = os.path.join(self.base_dir, current_kind)
+            if not os.path.isdir(kind_dir):
+                continue
+
+            for file_name in sorted(os.listdir(kind_dir)):
+                if not file_name.endswith(".parquet"):
+                    continue
+                artifacts.append({
+                    "kind": current_kind,
+                    "content_hash": file_name[:-len(".parquet")],
+                    "path": os.path.join(kind_dir, file_name)
+                })
+
+        return artifacts
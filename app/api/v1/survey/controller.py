@@ -1,6 +1,7 @@
-from fastapi import APIRouter, UploadFile, File, Depends
+from fastapi import APIRouter, UploadFile, File, Depends, Request
 from sqlalchemy.orm import Session
 from app.db.database import get_db
+from app.core.responses import negotiated_response
 
 from app.api.v1.survey.services.survey_processor import SurveyProcessor
 
@@ -16,3 +17,43 @@ async def upload_excel(file: UploadFile = File(...), db: Session = Depends(get_d
     excel_content = await file.read()
     return processor.process_student_survey(excel_content)
 
+
+@router.get("/aliases/")
+def get_student_aliases(db: Session = Depends(get_db)):
+    """Lista los alias de nombres de encuesta ya confirmados"""
+    processor = SurveyProcessor(db)
+    return processor.alias_repo.get_aliases()
+
+@router.post("/aliases/")
+def save_student_alias(survey_name: str, student_id: int, db: Session = Depends(get_db)):
+    """
+    Registra o corrige a mano el alumno de un nombre de encuesta.
+    Los alias manuales no se reemplazan en las cargas siguientes.
+
+    - **survey_name**: Nombre tal como aparece en la encuesta
+    - **student_id**: Alumno al que corresponde
+    """
+    processor = SurveyProcessor(db)
+    return processor.save_manual_alias(survey_name, student_id)
+
+@router.delete("/aliases/")
+def delete_student_alias(survey_name: str, db: Session = Depends(get_db)):
+    """Elimina el alias de un nombre de encuesta, que vuelve a emparejarse de forma aproximada"""
+    processor = SurveyProcessor(db)
+    return {"deleted": processor.alias_repo.delete_alias(processor.normalize_text(survey_name))}
+
+@router.get("/answer-matrix/")
+def get_answer_matrix(request: Request, anio: int = None, db: Session = Depends(get_db)):
+    """
+    Retorna las respuestas cerradas de todas las encuestas como matriz de códigos, una fila por encuesta.
+
+    - **anio**: Filtra por el año académico de la encuesta, p. ej. 2024 (opcional)
+    """
+    processor = SurveyProcessor(db)
+    return negotiated_response(request, processor.get_answer_matrix(anio))
+
+@router.post("/answer-matrix/rebuild/")
+def rebuild_answer_matrix(db: Session = Depends(get_db)):
+    """Vuelve a generar las respuestas compactas de todas las encuestas, p. ej. para encuestas cargadas antes"""
+    processor = SurveyProcessor(db)
+    return processor.rebuild_compact_answers()
@@ -0,0 +1,81 @@
+from typing import Dict, Tuple
+from sqlalchemy import insert
+from app.api.v1.students.models import AliasAlumno, Alumno
+
+ALIAS_ORIGIN_AUTOMATIC = "automatico"
+ALIAS_ORIGIN_MANUAL = "manual"
+
+
+class StudentAliasRepository:
+    def __init__(self, db):
+        self.db = db
+
+    def get_alias_map(self) -> Dict[str, Tuple[int, str]]:
+        """Obtiene los alias como {nombre normalizado: (id del alumno, nombre completo)} en una sola consulta"""
+        rows = (
+            self.db.query(AliasAlumno.nombre_normalizado, AliasAlumno.alumno_id, Alumno.nombre_completo)
+            .join(Alumno, Alumno.id == AliasAlumno.alumno_id)
+            .all()
+        )
+        return {normalized_name: (student_id, full_name) for normalized_name, student_id, full_name in rows}
+
+    def get_aliases(self):
+        """Obtiene todos los alias registrados"""
+        aliases = self.db.query(AliasAlumno).order_by(AliasAlumno.nombre_normalizado).all()
+        return [
+            {
+                "nombre_normalizado": alias.nombre_normalizado,
+                "alumno_id": alias.alumno_id,
+                "origen": alias.origen,
+                "fecha": alias.fecha
+            }
+            for alias in aliases
+        ]
+
+    def create_aliases(self, aliases: Dict[str, int]) -> int:
+        """
+        Guarda en bloque los alias confirmados automáticamente por el emparejamiento.
+        Los nombres que ya tienen alias se dejan como están, así nunca se pisa un alias manual.
+        """
+        if not aliases:
+            return 0
+
+        existing = {
+            normalized_name for (normalized_name,) in
+            self.db.query(AliasAlumno.nombre_normalizado)
+            .filter(AliasAlumno.nombre_normalizado.in_(list(aliases)))
+            .all()
+        }
+        rows = [
+            {"nombre_normalizado": normalized_name, "alumno_id": student_id, "origen": ALIAS_ORIGIN_AUTOMATIC}
+            for normalized_name, student_id in aliases.items()
+            if normalized_name not in existing
+        ]
+        if rows:
+            self.db.execute(insert(AliasAlumno), rows)
+        self.db.commit()
+        return len(rows)
+
+    def set_manual_alias(self, normalized_name: str, student_id: int):
+        """Crea o corrige un alias a mano; reemplaza al alias automático si lo había"""
+        alias = self.db.query(AliasAlumno).filter_by(nombre_normalizado=normalized_name).first()
+        if alias:
+            alias.alumno_id = student_id
+            alias.origen = ALIAS_ORIGIN_MANUAL
+        else:
+            alias = AliasAlumno(
+                nombre_normalizado=normalized_name,
+                alumno_id=student_id,
+                origen=ALIAS_ORIGIN_MANUAL
+            )
+            self.db.add(alias)
+
+        self.db.commit()
+        self.db.refresh(alias)
+        return alias
+
+    def delete_alias(self, normalized_name: str) -> bool:
+        """Elimina un alias; retorna False si no existía"""
+        deleted = self.db.query(AliasAlumno).filter_by(nombre_normalizado=normalized_name).delete()
+        self.db.commit()
+        return deleted > 0
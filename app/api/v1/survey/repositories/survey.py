@@ -3,15 +3,15 @@ from app.api.v1.students.models import OpcionEncuesta
 from app.api.v1.students.models import Encuesta
 from app.api.v1.students.models import RespuestaEncuesta
 from app.api.v1.students.models import RespuestaTextoEncuesta
-from sqlalchemy.orm import class_mapper
+from app.api.v1.students.models import RespuestaEncuestaCompacta
+from app.api.v1.students.models import AnioAcademico
+from sqlalchemy import delete, func, insert, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 class SurveyRepository:
     def __init__(self, db):
         self.db = db
 
-    def as_dict(self, obj):
-        return {c.key: getattr(obj, c.key) for c in class_mapper(obj.__class__).columns}
-
     def create_question(self, question_text, is_multiple_choice, question_type):
         """Crea una pregunta en la base de datos"""
 
@@ -32,16 +32,6 @@ class SurveyRepository:
 
         return question
 
-    def get_question_by_text(self, question_text):
-        """Obtiene pregunta de la base de datos"""
-        question = self.db.query(PreguntaEncuesta).filter_by(pregunta=question_text).first()
-
-        if not question:
-            return
-
-        dictionary = {**self.as_dict(question), "id": question.id}
-        return dictionary
-
     def create_options(self, option_text, question_id):
         """Crea opciones en la base de datos"""
         option = self.db.query(OpcionEncuesta).filter_by(opcion=option_text,
@@ -59,55 +49,113 @@ class SurveyRepository:
         self.db.refresh(option)
         return option
 
-    def get_options_by_question_id(self, question_id):
-        """Obtiene opciones de la base de datos"""
-        options_list = self.db.query(OpcionEncuesta).filter_by(pregunta_id=question_id).all()
-        options = [{**self.as_dict(option), "id": option.id} for option in options_list]
+    def get_question_catalog(self):
+        """
+        Obtiene todas las preguntas con sus opciones en una sola consulta,
+        como {texto de la pregunta: (id de la pregunta, {texto de la opción: id de la opción})}
+        """
+        rows = (
+            self.db.query(PreguntaEncuesta.id, PreguntaEncuesta.pregunta, OpcionEncuesta.id, OpcionEncuesta.opcion)
+            .outerjoin(OpcionEncuesta, OpcionEncuesta.pregunta_id == PreguntaEncuesta.id)
+            .all()
+        )
 
-        return options
+        catalog = {}
+        for question_id, question_text, option_id, option_text in rows:
+            _, options = catalog.setdefault(question_text, (question_id, {}))
+            if option_id is not None:
+                options[option_text] = option_id
+        return catalog
 
     def get_option_by_id_and_question_id(self, option_id, question_id):
         """Obtiene opciones de la base de datos"""
         option = self.db.query(OpcionEncuesta).filter_by(id=option_id, pregunta_id=question_id).first()
         return option
 
-    def create_survey(self,  academic_year_id, student_id):
-        """Crea una encuesta en la base de datos"""
-        survey = Encuesta(
-          anio=academic_year_id,
-          alumno_id=student_id
-        )
-        self.db.add(survey)
-        self.db.commit()
-        self.db.refresh(survey)
-
-        return survey
-
-
-    def create_answer_choice(self, survey_id, question_id, option_id):
-        """Crea una respuesta en la base de datos"""
-
-        answer = RespuestaEncuesta(
-          encuesta_id=survey_id,
-          pregunta_id=question_id,
-          opcion_id=option_id
+    def upsert_surveys(self, surveys):
+        """
+        Obtiene o crea la encuesta de cada (alumno, año) y retorna sus ids en el mismo orden.
+        En PostgreSQL es un solo INSERT ... ON CONFLICT DO UPDATE ... RETURNING. No hace commit:
+        las respuestas se reemplazan en la misma transacción.
+        """
+        if not surveys:
+            return []
+
+        keys = [(survey["alumno_id"], survey["anio"]) for survey in surveys]
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            statement = pg_insert(Encuesta).values([{"alumno_id": student_id, "anio": year} for student_id, year in keys])
+            statement = statement.on_conflict_do_update(
+                index_elements=[Encuesta.alumno_id, Encuesta.anio],
+                set_={"fecha": func.now()}
+            ).returning(Encuesta.alumno_id, Encuesta.anio, Encuesta.id)
+            survey_ids = {(student_id, year): survey_id for student_id, year, survey_id in self.db.execute(statement)}
+            return [survey_ids[key] for key in keys]
+
+        survey_ids = {
+            (student_id, year): survey_id for survey_id, student_id, year in
+            self.db.query(Encuesta.id, Encuesta.alumno_id, Encuesta.anio)
+            .filter(tuple_(Encuesta.alumno_id, Encuesta.anio).in_(keys))
+            .all()
+        }
+        missing = [key for key in dict.fromkeys(keys) if key not in survey_ids]
+        if missing:
+            result = self.db.execute(
+                insert(Encuesta).returning(Encuesta.id, sort_by_parameter_order=True),
+                [{"alumno_id": student_id, "anio": year} for student_id, year in missing]
+            )
+            survey_ids.update(zip(missing, result.scalars()))
+        return [survey_ids[key] for key in keys]
+
+    def delete_answers(self, survey_ids):
+        """Elimina las respuestas (cerradas y abiertas) de las encuestas indicadas, sin hacer commit"""
+        if not survey_ids:
+            return
+        self.db.execute(delete(RespuestaEncuesta).where(RespuestaEncuesta.encuesta_id.in_(survey_ids)))
+        self.db.execute(delete(RespuestaTextoEncuesta).where(RespuestaTextoEncuesta.encuesta_id.in_(survey_ids)))
+
+    def create_answers(self, choice_answers, text_answers):
+        """Inserta en bloque las respuestas cerradas y abiertas, sin hacer commit"""
+        if choice_answers:
+            self.db.execute(insert(RespuestaEncuesta), choice_answers)
+        if text_answers:
+            self.db.execute(insert(RespuestaTextoEncuesta), text_answers)
+
+    def replace_compact_answers(self, compact_answers):
+        """Reemplaza la fila compacta de cada encuesta indicada, sin hacer commit"""
+        if not compact_answers:
+            return
+        survey_ids = [answer["encuesta_id"] for answer in compact_answers]
+        self.db.execute(delete(RespuestaEncuestaCompacta).where(RespuestaEncuestaCompacta.encuesta_id.in_(survey_ids)))
+        self.db.execute(insert(RespuestaEncuestaCompacta), compact_answers)
+
+    def get_compact_answers(self, year=None):
+        """
+        Obtiene las respuestas compactas como tuplas (encuesta_id, alumno_id, anio, codigos) con una sola lectura.
+        La encuesta guarda el id de anios_academicos; el año (p. ej. 2024) se toma de esa tabla.
+        """
+        query = self.db.query(
+            RespuestaEncuestaCompacta.encuesta_id,
+            RespuestaEncuestaCompacta.alumno_id,
+            AnioAcademico.anio,
+            RespuestaEncuestaCompacta.codigos
+        ).outerjoin(AnioAcademico, AnioAcademico.id == RespuestaEncuestaCompacta.anio)
+        if year is not None:
+            query = query.filter(AnioAcademico.anio == year)
+        return query.order_by(RespuestaEncuestaCompacta.encuesta_id).all()
+
+    def get_surveys_with_choice_answers(self):
+        """Obtiene (encuesta_id, alumno_id, anio, opcion_id) de todas las encuestas; opcion_id es None si no tiene respuestas"""
+        return (
+            self.db.query(Encuesta.id, Encuesta.alumno_id, Encuesta.anio, RespuestaEncuesta.opcion_id)
+            .outerjoin(RespuestaEncuesta, RespuestaEncuesta.encuesta_id == Encuesta.id)
+            .order_by(Encuesta.id, RespuestaEncuesta.id)
+            .all()
         )
-        self.db.add(answer)
-        self.db.commit()
-        self.db.refresh(answer)
-        return answer
-
-
-    def create_answer_text(self, survey_id, question_id, answer):
-        """Crea una respuesta en la base de datos"""
 
-        answer = RespuestaTextoEncuesta(
-          encuesta_id=survey_id,
-          pregunta_id=question_id,
-          texto=answer
-        )
-        self.db.add(answer)
+    def rebuild_compact_answers(self, compact_answers):
+        """Reemplaza todas las respuestas compactas y hace commit"""
+        self.db.execute(delete(RespuestaEncuestaCompacta))
+        if compact_answers:
+            self.db.execute(insert(RespuestaEncuestaCompacta), compact_answers)
         self.db.commit()
-        self.db.refresh(answer)
-
-        return answer
@@ -0,0 +1,417 @@
+import atexit
+import multiprocessing
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from app.utils.normalize_text import normalize_text
+from app.utils.retrieve_dregree import get_degree_by_number
+
+try:
+    from rapidfuzz import fuzz
+    from rapidfuzz.process import cdist
+except ImportError:  # rapidfuzz es opcional, sin él se compara con difflib repartiendo las filas entre procesos
+    fuzz = None
+    cdist = None
+
+# Pool de procesos de la comparación con difflib: se crea la primera vez que una hoja lo necesita
+# y se reutiliza en las cargas siguientes, en lugar de abrir uno por hoja dentro de la petición
+_difflib_pool = None
+_difflib_pool_lock = threading.Lock()
+
+
+def match_score(normalized_name: str, normalized_existing: str) -> float:
+    """Calcula la similitud entre dos nombres ya normalizados"""
+    score = SequenceMatcher(None, normalized_name, normalized_existing).ratio()
+
+    # También verificar si uno contiene al otro
+    if normalized_name in normalized_existing or normalized_existing in normalized_name:
+        score = max(score, 0.9)
+
+    # Si comparten al menos 2 palabras (probablemente apellidos)
+    common_words = set(normalized_name.split()).intersection(normalized_existing.split())
+    if len(common_words) >= 2:
+        score = max(score, 0.85)
+
+    return score
+
+
+def linear_best_match(normalized_name: str, candidates: Iterable[Tuple[int, str]]) -> Tuple[Optional[int], float]:
+    """Compara el nombre contra todos los candidatos (id, nombre normalizado) y retorna el mejor"""
+    best_match = None
+    best_score = 0.0
+
+    if not normalized_name:
+        return best_match, best_score
+
+    for student_id, normalized_existing in candidates:
+        if not normalized_existing:
+            continue
+
+        score = match_score(normalized_name, normalized_existing)
+        if score > best_score:
+            best_score = score
+            best_match = student_id
+
+    return best_match, best_score
+
+
+def name_trigrams(normalized_name: str) -> Set[str]:
+    """Obtiene los trigramas de caracteres de un nombre normalizado"""
+    padded = f" {normalized_name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def degree_scope(degree_value) -> Optional[str]:
+    """Normaliza el grado (3, "3ro", "TERCERO") para usarlo como ámbito de búsqueda"""
+    if degree_value is None:
+        return None
+
+    text = str(degree_value).strip()
+    digits = re.search(r"\d", text)
+    if digits:
+        text = get_degree_by_number(int(digits.group()))
+
+    return normalize_text(text) or None
+
+
+class StudentNameIndex:
+    """
+    Índice invertido de nombres de alumnos para reducir los candidatos del emparejamiento difuso.
+
+    Se construye una vez por carga a partir de tuplas (id, nombre). Cada nombre se indexa por sus
+    palabras (apellidos y nombres) y por sus trigramas; al buscar solo se puntúan los candidatos que
+    comparten más palabras y trigramas, con la misma fórmula de similitud que la búsqueda lineal.
+    """
+    def __init__(self, max_candidates: int = 50, max_trigram_ratio: float = 0.1):
+        self.max_candidates = max_candidates
+        self.max_trigram_ratio = max_trigram_ratio
+        self.names: Dict[int, str] = {}
+        self.normalized_names: Dict[int, str] = {}
+        self.exact_index: Dict[str, int] = {}
+        self.token_index: Dict[str, Set[int]] = defaultdict(set)
+        self.trigram_index: Dict[str, Set[int]] = defaultdict(set)
+        self.scope_index: Dict[str, Set[int]] = defaultdict(set)
+
+    @classmethod
+    def from_tuples(cls, students: Iterable[tuple], scopes: Iterable[Tuple[int, str]] = (), **kwargs) -> "StudentNameIndex":
+        """
+        Construye el índice a partir de (id, nombre) o (id, nombre, nombre normalizado) y,
+        opcionalmente, de (id, grado). Si el nombre normalizado ya viene de la base de datos no se recalcula.
+        """
+        index = cls(**kwargs)
+        for student in students:
+            index.add(*student)
+        for student_id, scope in scopes:
+            index.add_scope(student_id, scope)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.normalized_names)
+
+    def add(self, student_id: int, full_name: str, normalized_name: Optional[str] = None, scope: Optional[str] = None):
+        """Agrega un alumno al índice"""
+        normalized_name = normalized_name if normalized_name is not None else normalize_text(full_name)
+        if not normalized_name:
+            return
+
+        self.names[student_id] = full_name
+        self.normalized_names[student_id] = normalized_name
+        self.exact_index.setdefault(normalized_name, student_id)
+
+        for token in normalized_name.split():
+            self.token_index[token].add(student_id)
+        for trigram in name_trigrams(normalized_name):
+            self.trigram_index[trigram].add(student_id)
+
+        if scope:
+            self.add_scope(student_id, scope)
+
+    def remove(self, student_id: int):
+        """Quita un alumno del índice, por ejemplo si su creación no llegó a confirmarse"""
+        normalized_name = self.normalized_names.pop(student_id, None)
+        self.names.pop(student_id, None)
+        if normalized_name is None:
+            return
+
+        if self.exact_index.get(normalized_name) == student_id:
+            del self.exact_index[normalized_name]
+        for token in normalized_name.split():
+            self.token_index[token].discard(student_id)
+        for trigram in name_trigrams(normalized_name):
+            self.trigram_index[trigram].discard(student_id)
+        for students in self.scope_index.values():
+            students.discard(student_id)
+
+    def add_scope(self, student_id: int, scope: Optional[str]):
+        """Asocia el alumno a un ámbito de búsqueda (por ejemplo, su grado)"""
+        scope = degree_scope(scope)
+        if scope:
+            self.scope_index[scope].add(student_id)
+
+    def candidates(self, normalized_name: str, scope: Optional[str] = None) -> List[int]:
+        """Retorna los alumnos que más palabras y trigramas comparten con el nombre"""
+        allowed = self.scope_index.get(scope) if scope else None
+        if scope and not allowed:
+            return []
+
+        counts = Counter()
+        for token in set(normalized_name.split()):
+            for student_id in self.token_index.get(token, ()):
+                counts[student_id] += 3
+
+        # Los trigramas muy frecuentes no discriminan y solo encarecen la búsqueda
+        max_postings = max(50, int(len(self.normalized_names) * self.max_trigram_ratio))
+        for trigram in name_trigrams(normalized_name):
+            postings = self.trigram_index.get(trigram, ())
+            if len(postings) > max_postings:
+                continue
+            for student_id in postings:
+                counts[student_id] += 1
+
+        if allowed is not None:
+            for student_id in list(counts):
+                if student_id not in allowed:
+                    del counts[student_id]
+
+        return [student_id for student_id, _ in counts.most_common(self.max_candidates)]
+
+    def _best_among(self, normalized_name: str, candidate_ids: List[int]) -> Tuple[Optional[int], float]:
+        return linear_best_match(
+            normalized_name,
+            ((student_id, self.normalized_names[student_id]) for student_id in sorted(candidate_ids))
+        )
+
+    def best_match(self, name: str, scope: Optional[str] = None, threshold: float = 0.0) -> Tuple[Optional[int], float]:
+        """
+        Encuentra el alumno más parecido al nombre.
+
+        Si se indica un ámbito se busca primero dentro de él y, si no se llega al umbral, en todo el índice.
+        """
+        normalized_name = normalize_text(name)
+        if not normalized_name:
+            return None, 0.0
+
+        exact_match = self.exact_index.get(normalized_name)
+        if exact_match is not None:
+            return exact_match, 1.0
+
+        scope = degree_scope(scope)
+        if scope:
+            student_id, score = self._best_among(normalized_name, self.candidates(normalized_name, scope))
+            if student_id is not None and score >= threshold:
+                return student_id, score
+
+        return self._best_among(normalized_name, self.candidates(normalized_name))
+
+
+class DatabaseNameMatcher:
+    """
+    Emparejamiento que pide los candidatos a la base de datos (índice de trigramas de pg_trgm)
+    en lugar de mantener un índice en memoria. Tiene la misma interfaz que StudentNameIndex.
+    """
+    def __init__(self, student_repo, max_candidates: int = 50):
+        self.student_repo = student_repo
+        self.max_candidates = max_candidates
+        self.names: Dict[int, str] = {}
+
+    def add(self, student_id: int, full_name: str, normalized_name: Optional[str] = None, scope: Optional[str] = None):
+        """Los alumnos nuevos ya están en la base de datos, solo se guarda su nombre"""
+        self.names[student_id] = full_name
+
+    def remove(self, student_id: int):
+        """Los alumnos que no llegaron a confirmarse ya no están en la base de datos, solo se olvida su nombre"""
+        self.names.pop(student_id, None)
+
+    def best_match(self, name: str, scope: Optional[str] = None, threshold: float = 0.0) -> Tuple[Optional[int], float]:
+        """Encuentra el alumno más parecido al nombre entre los candidatos de la base de datos"""
+        normalized_name = normalize_text(name)
+        if not normalized_name:
+            return None, 0.0
+
+        candidates = self.student_repo.find_similar_students(normalized_name, self.max_candidates)
+        for student_id, full_name, _, _ in candidates:
+            self.names[student_id] = full_name
+
+        return linear_best_match(
+            normalized_name,
+            sorted((student_id, normalized_existing) for student_id, _, normalized_existing, _ in candidates)
+        )
+
+
+def _best_scoped_match(task) -> Tuple[Optional[int], float]:
+    """Puntúa una fila: primero sus candidatos del ámbito y, si no llegan al umbral, todos sus candidatos"""
+    normalized_name, scoped_candidates, candidates, threshold = task
+    if scoped_candidates:
+        student_id, score = linear_best_match(normalized_name, scoped_candidates)
+        if student_id is not None and score >= threshold:
+            return student_id, score
+    return linear_best_match(normalized_name, candidates)
+
+
+def _best_scoped_matches(tasks) -> List[Tuple[Optional[int], float]]:
+    return [_best_scoped_match(task) for task in tasks]
+
+
+def _shutdown_difflib_pool():
+    global _difflib_pool
+    if _difflib_pool is not None:
+        _difflib_pool.shutdown(cancel_futures=True)
+        _difflib_pool = None
+
+
+def difflib_pool(workers: int) -> ProcessPoolExecutor:
+    """Retorna el pool compartido de la comparación con difflib, creándolo la primera vez"""
+    global _difflib_pool
+    with _difflib_pool_lock:
+        if _difflib_pool is None:
+            # spawn: el proceso de la API tiene hilos y conexiones abiertas que no deben copiarse
+            context = multiprocessing.get_context("spawn")
+            _difflib_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            atexit.register(_shutdown_difflib_pool)
+        return _difflib_pool
+
+
+class BatchNameMatcher:
+    """
+    Empareja todos los nombres de una hoja en una sola llamada.
+
+    Los candidatos de cada fila salen del StudentNameIndex y la similitud es la de match_score
+    (SequenceMatcher con las mismas bonificaciones), así que el umbral es el mismo del emparejamiento
+    uno a uno. fuzz.ratio de rapidfuzz no es SequenceMatcher.ratio: usa la distancia Indel
+    (subsecuencia común más larga), que nunca es menor. Por eso, con rapidfuzz instalado, se calcula
+    como matriz (filas x candidatos) con cdist y se usa solo como cota superior: los candidatos se
+    recorren de mayor a menor cota y SequenceMatcher se calcula hasta que la cota no alcanza al mejor.
+    Sin rapidfuzz, las hojas grandes reparten sus filas por bloques en un pool de procesos compartido.
+    """
+    def __init__(self, name_index: StudentNameIndex, workers: Optional[int] = None, chunk_size: int = 256,
+                 min_parallel_comparisons: int = 20000, use_rapidfuzz: bool = True):
+        self.name_index = name_index
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.min_parallel_comparisons = min_parallel_comparisons
+        self.use_rapidfuzz = use_rapidfuzz and cdist is not None
+
+    def _row_candidates(self, normalized_name: str, scope: Optional[str]) -> Tuple[List[int], List[int]]:
+        scope = degree_scope(scope)
+        scoped = sorted(self.name_index.candidates(normalized_name, scope)) if scope else []
+        return scoped, sorted(set(scoped).union(self.name_index.candidates(normalized_name)))
+
+    def match(self, names: List[str], scopes: Optional[List[Optional[str]]] = None, threshold: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna dos arreglos alineados con los nombres: id del mejor alumno (-1 si no hay) y su similitud.
+        """
+        scopes = scopes or [None] * len(names)
+        best_ids = np.full(len(names), -1, dtype=np.int64)
+        best_scores = np.zeros(len(names), dtype=np.float64)
+
+        pending = []
+        for position, name in enumerate(names):
+            normalized_name = normalize_text(name)
+            if not normalized_name:
+                continue
+
+            exact_match = self.name_index.exact_index.get(normalized_name)
+            if exact_match is not None:
+                best_ids[position] = exact_match
+                best_scores[position] = 1.0
+                continue
+
+            scoped, candidates = self._row_candidates(normalized_name, scopes[position])
+            if candidates:
+                pending.append((position, normalized_name, scoped, candidates))
+
+        if self.use_rapidfuzz:
+            results = self._match_with_rapidfuzz(pending, threshold)
+        else:
+            results = self._match_with_difflib(pending, threshold)
+
+        for (position, _, _, _), (student_id, score) in zip(pending, results):
+            if student_id is not None:
+                best_ids[position] = student_id
+                best_scores[position] = score
+
+        return best_ids, best_scores
+
+    def _bonus_score(self, normalized_name: str, normalized_existing: str, ratio: float) -> float:
+        score = ratio
+        if normalized_name in normalized_existing or normalized_existing in normalized_name:
+            score = max(score, 0.9)
+        if len(set(normalized_name.split()).intersection(normalized_existing.split())) >= 2:
+            score = max(score, 0.85)
+        return score
+
+    def _best_bounded(self, normalized_name: str, candidates: List[int], bounds: Dict[int, float]) -> Tuple[Optional[int], float]:
+        """
+        Mismo resultado que linear_best_match (empates para el id menor), pero calculando
+        SequenceMatcher solo para los candidatos cuya cota todavía puede alcanzar al mejor.
+        """
+        normalized_names = self.name_index.normalized_names
+        best_match = None
+        best_score = 0.0
+        for student_id in sorted(candidates, key=lambda candidate: (-bounds[candidate], candidate)):
+            # Margen por redondeo: la cota viene de rapidfuzz en punto flotante
+            if best_match is not None and bounds[student_id] + 1e-9 < best_score:
+                break
+            if not normalized_names[student_id]:
+                continue
+            score = match_score(normalized_name, normalized_names[student_id])
+            if score > best_score or (score == best_score and best_match is not None and student_id < best_match):
+                best_score = score
+                best_match = student_id
+        return best_match, best_score
+
+    def _match_with_rapidfuzz(self, pending, threshold: float) -> List[Tuple[Optional[int], float]]:
+        normalized_names = self.name_index.normalized_names
+        results = []
+
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            pool = sorted({student_id for _, _, _, candidates in chunk for student_id in candidates})
+            columns = {student_id: column for column, student_id in enumerate(pool)}
+            ratios = cdist(
+                [normalized_name for _, normalized_name, _, _ in chunk],
+                [normalized_names[student_id] for student_id in pool],
+                scorer=fuzz.ratio,
+                dtype=np.float64,
+                workers=-1
+            ) / 100.0
+
+            for row, (_, normalized_name, scoped, candidates) in enumerate(chunk):
+                bounds = {
+                    student_id: self._bonus_score(normalized_name, normalized_names[student_id], float(ratios[row, columns[student_id]]))
+                    for student_id in candidates
+                }
+                if scoped:
+                    student_id, score = self._best_bounded(normalized_name, scoped, bounds)
+                    if student_id is not None and score >= threshold:
+                        results.append((student_id, score))
+                        continue
+                results.append(self._best_bounded(normalized_name, candidates, bounds))
+
+        return results
+
+    def _match_with_difflib(self, pending, threshold: float) -> List[Tuple[Optional[int], float]]:
+        normalized_names = self.name_index.normalized_names
+        tasks = [
+            (
+                normalized_name,
+                [(student_id, normalized_names[student_id]) for student_id in scoped],
+                [(student_id, normalized_names[student_id]) for student_id in candidates],
+                threshold
+            )
+            for _, normalized_name, scoped, candidates in pending
+        ]
+
+        # En hojas chicas el costo de enviar las filas a otros procesos supera al de compararlas aquí
+        comparisons = sum(len(task[2]) for task in tasks)
+        if self.workers <= 1 or comparisons < self.min_parallel_comparisons:
+            return _best_scoped_matches(tasks)
+
+        chunks = [tasks[start:start + self.chunk_size] for start in range(0, len(tasks), self.chunk_size)]
+        executor = difflib_pool(self.workers)
+        return [result for chunk_results in executor.map(_best_scoped_matches, chunks) for result in chunk_results]
@@ -0,0 +1,153 @@
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+FREQUENCY_OPTIONS = ["Nunca", "A veces", "Casi siempre", "Siempre"]
+
+# Ubicación de cada pregunta cerrada en la hoja de encuestas (posición de columna después de quitar
+# la columna de índice). Las opciones van en el orden de sus columnas, una columna por opción.
+SURVEY_LAYOUT = [
+    {
+        "pregunta": "¿Cuánto tiempo dedicas al estudio fuera del horario escolar?",
+        "columna": 7,
+        "opciones": ["Menos de 1 hora al día", "Entre 1 y 2 horas al día", "Más de 2 horas al día"],
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Sueles participar en clase respondiendo preguntas o haciendo comentarios?",
+        "columna": 10,
+        "opciones": FREQUENCY_OPTIONS,
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Pides ayuda cuando no entiendes un tema?",
+        "columna": 14,
+        "opciones": FREQUENCY_OPTIONS,
+        "multiple": False
+    },
+    {
+        "pregunta": "En general, ¿te gustan las clases?",
+        "columna": 18,
+        "opciones": ["Sí, mucho", "A veces", "No mucho", "No me gustan"],
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Cómo calificas la dificultad de las materias en general?",
+        "columna": 22,
+        "opciones": ["Muy fáciles", "Normales", "Difíciles", "Muy difíciles"],
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Cuánto te esfuerzas en las tareas y exámenes?",
+        "columna": 26,
+        "opciones": ["Mucho", "Lo necesario", "Poco", "Casi nada"],
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Qué recursos utilizas para estudiar?",
+        "columna": 30,
+        "opciones": [
+            "Aplicaciones o plataformas digitales",
+            "Videos educativos",
+            "Libros físicos",
+            "Apuntes de clase",
+            "Tutorías o asesorías"
+        ],
+        "multiple": True
+    },
+    {
+        "pregunta": "¿Tienes acceso a internet en casa?",
+        "columna": 35,
+        "opciones": ["Sí", "No"],
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Cuánto utilizas la tecnología para aprender?",
+        "columna": 37,
+        "opciones": FREQUENCY_OPTIONS,
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Participas en actividades extracurriculares (deporte, arte, clubes)?",
+        "columna": 41,
+        "opciones": ["Sí", "No"],
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Cuántas horas duermes en promedio por noche?",
+        "columna": 43,
+        "opciones": ["Menos de 5 horas", "Entre 5 y 7 horas", "Más de 7 horas"],
+        "multiple": False
+    },
+    {
+        "pregunta": "¿Sientes estrés o ansiedad cuando tienes exámenes o tareas importantes?",
+        "columna": 46,
+        "opciones": FREQUENCY_OPTIONS,
+        "multiple": False
+    },
+]
+
+# Preguntas abiertas: una columna de texto libre cada una
+SURVEY_TEXT_LAYOUT = [
+    {"pregunta": "¿Qué mejorarías en las clases para aprender mejor?", "columna": 50},
+    {"pregunta": "¿Qué tipo de apoyo adicional te gustaría recibir para mejorar tu aprendizaje?", "columna": 51},
+]
+
+
+class SurveyDecoder:
+    """
+    Convierte una hoja de encuestas completa en una matriz de códigos de respuesta (filas x preguntas).
+
+    - Pregunta de opción única: código = posición (desde 1) de la primera opción marcada, 0 si no hay.
+    - Pregunta de opción múltiple: código = máscara de bits de las opciones marcadas (bit i = opción i).
+    """
+    def __init__(self, layout: List[Dict] = None, text_layout: List[Dict] = None):
+        self.layout = layout or SURVEY_LAYOUT
+        self.text_layout = text_layout or SURVEY_TEXT_LAYOUT
+        self.width = max(
+            [question["columna"] + len(question["opciones"]) for question in self.layout] +
+            [question["columna"] + 1 for question in self.text_layout]
+        )
+
+    def decode(self, df: pd.DataFrame) -> np.ndarray:
+        """Retorna la matriz de códigos de la hoja (int32, una columna por pregunta de SURVEY_LAYOUT)"""
+        values = self._values(df)
+        # Una celda cuenta como marcada si su texto es "x" (sin importar mayúsculas)
+        marks = np.char.lower(values.astype(str)) == "x"
+
+        codes = np.zeros((len(values), len(self.layout)), dtype=np.int32)
+        for position, question in enumerate(self.layout):
+            start = question["columna"]
+            block = marks[:, start:start + len(question["opciones"])]
+            if question["multiple"]:
+                codes[:, position] = block @ (1 << np.arange(block.shape[1], dtype=np.int32))
+            else:
+                codes[:, position] = np.where(block.any(axis=1), block.argmax(axis=1) + 1, 0)
+        return codes
+
+    def decode_texts(self, df: pd.DataFrame) -> List[List[Optional[str]]]:
+        """Retorna, por fila, las respuestas de texto de SURVEY_TEXT_LAYOUT (None si está vacía)"""
+        values = self._values(df)
+        columns = [question["columna"] for question in self.text_layout]
+        texts = values[:, columns]
+        return [
+            [str(value) if pd.notna(value) else None for value in row]
+            for row in texts
+        ]
+
+    def option_labels(self, position: int, code: int) -> List[str]:
+        """Opciones que representa un código de la pregunta en la posición indicada"""
+        question = self.layout[position]
+        if code <= 0:
+            return []
+        if question["multiple"]:
+            return [option for bit, option in enumerate(question["opciones"]) if code & (1 << bit)]
+        return [question["opciones"][code - 1]]
+
+    def _values(self, df: pd.DataFrame) -> np.ndarray:
+        """Valores de la hoja como matriz de objetos, con columnas vacías si la hoja tiene menos columnas"""
+        values = df.to_numpy(dtype=object)
+        if values.shape[1] < self.width:
+            padding = np.full((values.shape[0], self.width - values.shape[1]), np.nan, dtype=object)
+            values = np.hstack([values, padding])
+        return values
@@ -1,14 +1,17 @@
 import pandas as pd
 import io
-import unicodedata
-import re
 from typing import Optional, List, Dict, Tuple
-from difflib import SequenceMatcher
 import logging
-from app.api.v1.students.models import Alumno
+from app.utils.normalize_text import normalize_text
+from app.utils.pagination import invalidate_cached_counts
+from app.api.v1.students.repositories.student_profiles import StudentProfileRepository
 
 
 from app.api.v1.students.services.base_grades_excel_processor import BaseExcelProcessor
+from app.api.v1.survey.services.name_matching import BatchNameMatcher, DatabaseNameMatcher, StudentNameIndex, linear_best_match
+from app.api.v1.survey.repositories.student_alias import StudentAliasRepository
+from app.api.v1.survey.services.survey_layout import SurveyDecoder
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,9 @@ class SurveyProcessor(BaseExcelProcessor):
         self.matching_threshold = 0.85  # Umbral de similitud para matching
         self.unmatched_students = []
         self.matched_students = []
+        self.alias_repo = StudentAliasRepository(db)
+        self._question_catalog = None
+        self.survey_decoder = SurveyDecoder()
 
     def get_questions(self):
         return  [
@@ -202,256 +208,101 @@ class SurveyProcessor(BaseExcelProcessor):
             pass
         return "NO_ESPECIFICADO"
 
-    def _student_has_grades(self, student_id: int) -> bool:
-        """Verifica si el estudiante tiene notas registradas"""
-        from app.api.v1.students.models import HistorialAcademico, Nota
-
-        historial = self.db.query(HistorialAcademico).filter(
-            HistorialAcademico.alumno_id == student_id
-        ).first()
-
-        if historial:
-            notas = self.db.query(Nota).filter(
-                Nota.historial_id == historial.id
-            ).first()
-            return notas is not None
-
-        return False
-
-    def _process_study_hours(self, row, survey):
-        """Procesa pregunta de horas de estudio"""
-        study_hours = next(
-            (i + 1 for i in range(3) if pd.notna(row[7 + i]) and str(row[7 + i]).lower() == "x"),
-            0
-        )
-
-        if study_hours > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Cuánto tiempo dedicas al estudio fuera del horario escolar?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                option_map = {
-                    1: "Menos de 1 hora al día",
-                    2: "Entre 1 y 2 horas al día",
-                    3: "Más de 2 horas al día"
-                }
-
-                target_option = option_map.get(study_hours)
-                for option in options:
-                    if option.get("opcion") == target_option:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-    def _process_class_participation(self, row, survey):
-        """Procesa pregunta de participación en clase"""
-        participation = next(
-            (i + 1 for i in range(4) if pd.notna(row[10 + i]) and str(row[10 + i]).lower() == "x"),
-            0
-        )
-
-        if participation > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Sueles participar en clase respondiendo preguntas o haciendo comentarios?"
-            )
-            if question:
-                self._save_frequency_answer(survey, question, participation)
-
-    def _process_help_seeking(self, row, survey):
-        """Procesa pregunta sobre pedir ayuda"""
-        help_seeking = next(
-            (i + 1 for i in range(4) if pd.notna(row[14 + i]) and str(row[14 + i]).lower() == "x"),
-            0
-        )
-
-        if help_seeking > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Pides ayuda cuando no entiendes un tema?"
-            )
-            if question:
-                self._save_frequency_answer(survey, question, help_seeking)
-
-    def _save_frequency_answer(self, survey, question, level):
-        """Guarda respuestas de tipo frecuencia (Nunca, A veces, etc.)"""
-        options = self.survey_repo.get_options_by_question_id(question.get("id"))
-        frequency_map = {
-            1: "Nunca",
-            2: "A veces",
-            3: "Casi siempre",
-            4: "Siempre"
-        }
-
-        target_option = frequency_map.get(level)
-        for option in options:
-            if option.get("opcion") == target_option:
-                self.create_answer_choice(
-                    survey.id,
-                    question.get("id"),
-                    option.get("id")
-                )
-                break
-
-    def _process_text_responses(self, row, survey):
-        """Procesa respuestas de texto"""
-        # Pregunta 13: Mejoras en clases
-        if pd.notna(row[50]):
-            question = self.survey_repo.get_question_by_text(
-                "¿Qué mejorarías en las clases para aprender mejor?"
-            )
-            if question:
-                self.create_answer_text(
-                    survey.id,
-                    question.get("id"),
-                    str(row[50])
-                )
-
-        # Pregunta 14: Apoyo adicional
-        if pd.notna(row[51]):
-            question = self.survey_repo.get_question_by_text(
-                "¿Qué tipo de apoyo adicional te gustaría recibir para mejorar tu aprendizaje?"
-            )
-            if question:
-                self.create_answer_text(
-                    survey.id,
-                    question.get("id"),
-                    str(row[51])
-                )
-
-    def _generate_matching_report(self, stats: Dict) -> str:
-        """Genera un reporte detallado del proceso de matching"""
-        report = []
-        report.append("=== REPORTE DE PROCESAMIENTO DE ENCUESTAS ===\n")
-        report.append(f"Total de registros procesados: {stats['total_processed']}")
-        report.append(f"Estudiantes emparejados con notas: {stats['matched_with_grades']}")
-        report.append(f"Estudiantes emparejados sin notas: {stats['matched_without_grades']}")
-        report.append(f"Nuevos estudiantes creados: {stats['created_new']}")
-        report.append(f"Errores encontrados: {stats['errors']}\n")
-
-        if stats['matching_details']:
-            report.append("=== DETALLES DE EMPAREJAMIENTO ===")
-            for detail in stats['matching_details'][:10]:  # Mostrar primeros 10
-                report.append(
-                    f"- '{detail['survey_name']}' → '{detail['matched_to']}' "
-                    f"(similitud: {detail['score']:.2%}, tiene notas: {'Sí' if detail['has_grades'] else 'No'})"
-                )
-
-        return "\n".join(report)
-
-    # Métodos restantes para procesar otras preguntas...
-    def _process_class_enjoyment(self, row, survey):
-        """Procesa pregunta sobre gusto por las clases"""
-        enjoyment = next(
-            (i + 1 for i in range(4) if pd.notna(row[18 + i]) and str(row[18 + i]).lower() == "x"),
-            0
-        )
-
-        if enjoyment > 0:
-            question = self.survey_repo.get_question_by_text(
-                "En general, ¿te gustan las clases?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                enjoyment_map = {
-                    1: "Sí, mucho",
-                    2: "A veces",
-                    3: "No mucho",
-                    4: "No me gustan"
-                }
-
-                target_option = enjoyment_map.get(enjoyment)
-                for option in options:
-                    if option.get("opcion") == target_option:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-
     def normalize_text(self, texto: str) -> str:
         """Normaliza texto para comparación mejorada"""
-        if not texto:
-            return ""
-
-        # Convertir a string si no lo es
-        texto = str(texto).strip()
-
-        # Normalizar unicode
-        texto = unicodedata.normalize('NFD', texto)
-        texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
-
-        # Convertir a minúsculas
-        texto = texto.lower()
-
-        # Eliminar caracteres especiales pero mantener espacios
-        texto = re.sub(r'[^\w\s]', '', texto)
-
-        # Normalizar espacios múltiples
-        texto = re.sub(r'\s+', ' ', texto).strip()
-
-        return texto
+        return normalize_text(texto)
 
 
     def find_best_match(self, name: str, existing_students: List) -> Tuple[Optional[object], float]:
-        """Encuentra el mejor match para un nombre usando similitud difusa"""
-        if not name:
-            return None, 0.0
-
-        normalized_name = self.normalize_text(name)
-        best_match = None
-        best_score = 0.0
-
-        for student in existing_students:
-            if not student.nombre_completo:
-                continue
-
-            normalized_existing = self.normalize_text(student.nombre_completo)
-
-            # Calcular similitud
-            score = SequenceMatcher(None, normalized_name, normalized_existing).ratio()
+        """Encuentra el mejor match para un nombre comparándolo contra todos los estudiantes (búsqueda lineal)"""
+        students_by_id = {student.id: student for student in existing_students}
+        best_match_id, best_score = linear_best_match(
+            self.normalize_text(name),
+            ((student.id, self.normalize_text(student.nombre_completo)) for student in existing_students)
+        )
+        return students_by_id.get(best_match_id), best_score
 
-            # También verificar si uno contiene al otro
-            if normalized_name in normalized_existing or normalized_existing in normalized_name:
-                score = max(score, 0.9)
+    def build_name_index(self):
+        """Construye el índice de nombres de alumnos usado para emparejar una carga de encuestas"""
+        if settings.survey_name_matching == "database":
+            return DatabaseNameMatcher(self.student_repo)
 
-            # Verificar coincidencia de palabras clave (apellidos)
-            words_name = set(normalized_name.split())
-            words_existing = set(normalized_existing.split())
+        return StudentNameIndex.from_tuples(
+            self.student_repo.get_student_names(),
+            self.student_repo.get_student_degree_names()
+        )
 
-            # Si comparten al menos 2 palabras (probablemente apellidos)
-            common_words = words_name.intersection(words_existing)
-            if len(common_words) >= 2:
-                score = max(score, 0.85)
+    def match_sheet_names(self, name_index, student_names: List[str], degrees: List[Optional[str]]) -> List[Tuple[Optional[int], float]]:
+        """Empareja todos los nombres de una hoja y retorna (id del alumno o None, similitud) por fila"""
+        if not isinstance(name_index, StudentNameIndex):
+            return [
+                name_index.best_match(name, scope=degree, threshold=self.matching_threshold) if name else (None, 0.0)
+                for name, degree in zip(student_names, degrees)
+            ]
+
+        best_ids, best_scores = BatchNameMatcher(name_index).match(student_names, degrees, self.matching_threshold)
+        return [
+            (int(student_id) if student_id >= 0 else None, float(score))
+            for student_id, score in zip(best_ids, best_scores)
+        ]
 
-            if score > best_score:
-                best_score = score
-                best_match = student
+    def save_manual_alias(self, survey_name: str, student_id: int) -> Dict:
+        """Registra a mano a qué alumno corresponde un nombre de encuesta"""
+        normalized_name = self.normalize_text(survey_name)
+        if not normalized_name:
+            return {'status': 'error', 'message': 'El nombre de la encuesta está vacío'}
+
+        student = self.student_repo.get_student_name(student_id)
+        if not student:
+            return {'status': 'error', 'message': f'No existe el alumno {student_id}'}
+
+        alias = self.alias_repo.set_manual_alias(normalized_name, student_id)
+        return {
+            'nombre_normalizado': alias.nombre_normalizado,
+            'alumno_id': alias.alumno_id,
+            'nombre_completo': student,
+            'origen': alias.origen
+        }
 
-        return best_match, best_score
+    def _extract_degree(self, row) -> Optional[str]:
+        """Extrae el grado del estudiante, usado para acotar la búsqueda de su nombre"""
+        try:
+            if pd.notna(row[2]):
+                return str(row[2])
+        except:
+            pass
+        return None
 
     def create_question_and_options(self):
         """Crea las preguntas en la base de datos"""
         questions_list = self.get_questions()
+        catalog = self.get_question_catalog()
+        changed = False
 
         for question_data in questions_list:
             question_text = question_data["pregunta"]
             is_multiple_choice = True if question_data["tipo"] == "selección múltiple" else False
             question_type = "abierta" if question_data["tipo"] == "texto" else "cerrada"
 
-
-            question = self.survey_repo.create_question(question_text, is_multiple_choice, question_type)
+            # Solo se escribe lo que falta en el catálogo
+            if question_text in catalog:
+                question_id, existing_options = catalog[question_text]
+            else:
+                question_id = self.survey_repo.create_question(question_text, is_multiple_choice, question_type).id
+                existing_options = {}
+                changed = True
 
             if question_type == "cerrada":
                 options = question_data["opciones"]
                 for option in options:
-                    self.survey_repo.create_options(option, question.id)
+                    if option not in existing_options:
+                        self.survey_repo.create_options(option, question_id)
+                        changed = True
 
-        print("preguntas creadas")
+        if changed:
+            # Se vuelve a leer en la siguiente consulta para incluir los ids nuevos
+            self._question_catalog = None
+            print("preguntas creadas")
 
 
     def process_student_survey(self, file_content: bytes) -> Dict:
@@ -460,8 +311,13 @@ class SurveyProcessor(BaseExcelProcessor):
             # Crear preguntas si no existen
             self.create_question_and_options()
 
-            # Obtener todos los estudiantes existentes
-            all_students = self.student_repo.get_all_students()
+            # Índice de nombres de los estudiantes existentes (id y nombre, sin cargar objetos)
+            name_index = self.build_name_index()
+            # Nombres de encuesta ya confirmados en cargas anteriores (búsqueda exacta antes del emparejamiento)
+            alias_map = self.alias_repo.get_alias_map()
+            new_aliases = {}
+            # Alumnos con al menos una nota, consultados una sola vez para toda la carga
+            students_with_grades = self.student_repo.get_student_ids_with_grades()
             # Estadísticas de procesamiento
             stats = {
                 'total_processed': 0,
@@ -474,44 +330,89 @@ class SurveyProcessor(BaseExcelProcessor):
 
             excel_file = pd.ExcelFile(io.BytesIO(file_content))
 
+            # Alumnos creados durante esta carga, para no duplicarlos si aparecen otra vez en la misma hoja
+            created_index = StudentNameIndex()
+
+            current_year = 2025
+            academic_year_id = self.year_repo.get_or_create_academic_year(current_year).id
+
             for sheet in excel_file.sheet_names:
                 df = excel_file.parse(sheet_name=sheet)
                 df = df.iloc[3:, 1:]  # Saltar headers
 
-                for index, row in df.iterrows():
+                rows = list(df.iterrows())
+                # Respuestas de toda la hoja decodificadas de una vez
+                sheet_codes = self.survey_decoder.decode(df)
+                sheet_texts = self.survey_decoder.decode_texts(df)
+                student_names = [self._extract_student_name(row) for _, row in rows]
+                normalized_names = [self.normalize_text(name) for name in student_names]
+                degrees = [self._extract_degree(row) for _, row in rows]
+
+                # Los nombres con alias se resuelven directo; el resto se empareja en una sola llamada
+                pending = [position for position, name in enumerate(normalized_names) if name not in alias_map]
+                pending_matches = self.match_sheet_names(
+                    name_index,
+                    [student_names[position] for position in pending],
+                    [degrees[position] for position in pending]
+                )
+                sheet_matches = [
+                    (alias_map[name][0], 1.0) if name in alias_map else (None, 0.0)
+                    for name in normalized_names
+                ]
+                for position, match in zip(pending, pending_matches):
+                    sheet_matches[position] = match
+
+                # Encuestas, alumnos nuevos y alias de la hoja: se confirman juntos al terminarla
+                sheet_surveys = []
+                student_updates = {}
+                sheet_created = []
+                sheet_aliases = {}
+
+                for position, (index, row) in enumerate(rows):
                     try:
                         stats['total_processed'] += 1
 
                         # Procesar nombre
-                        student_name = self._extract_student_name(row)
+                        student_name = student_names[position]
                         if not student_name:
                             logger.warning(f"Fila {index}: Nombre vacío, saltando")
                             continue
 
-                        # Buscar mejor coincidencia
-                        matched_student, match_score = self.find_best_match(
-                            student_name,
-                            all_students
-                        )
+                        degree = degrees[position]
+                        matched_student_id, match_score = sheet_matches[position]
+
+                        if (matched_student_id is None or match_score < self.matching_threshold) and len(created_index):
+                            created_student_id, created_score = created_index.best_match(student_name)
+                            if created_score > match_score:
+                                matched_student_id, match_score = created_student_id, created_score
 
                         # Decidir si usar el match o crear nuevo
-                        if matched_student and match_score >= self.matching_threshold:
+                        if matched_student_id is not None and match_score >= self.matching_threshold:
                             # Verificar si tiene notas
-                            has_grades = self._student_has_grades(matched_student.id)
+                            has_grades = matched_student_id in students_with_grades
 
                             if has_grades:
                                 stats['matched_with_grades'] += 1
                             else:
                                 stats['matched_without_grades'] += 1
 
+                            normalized_name = normalized_names[position]
+                            if normalized_name in alias_map:
+                                matched_to = alias_map[normalized_name][1]
+                            else:
+                                matched_to = name_index.names.get(matched_student_id) or created_index.names.get(matched_student_id)
+                                # Confirmar el emparejamiento aproximado como alias para las próximas cargas
+                                if match_score < 1.0 and normalized_name not in new_aliases:
+                                    sheet_aliases.setdefault(normalized_name, matched_student_id)
+
                             stats['matching_details'].append({
                                 'survey_name': student_name,
-                                'matched_to': matched_student.nombre_completo,
+                                'matched_to': matched_to,
                                 'score': match_score,
                                 'has_grades': has_grades
                             })
 
-                            student_registered = matched_student
+                            student_id = matched_student_id
 
                         else:
                             # Crear nuevo estudiante
@@ -519,27 +420,55 @@ class SurveyProcessor(BaseExcelProcessor):
                             student_registered = self.student_repo.create_student(
                                 student_name,
                                 None,
-                                gender
+                                gender,
+                                commit=False
                             )
                             stats['created_new'] += 1
-                            all_students.append(student_registered)  # Agregar a la lista
+                            student_id = student_registered.id
+                            sheet_created.append(student_id)
+                            # Agregar a los índices
+                            name_index.add(student_id, student_registered.nombre_completo, scope=degree)
+                            created_index.add(student_id, student_registered.nombre_completo)
 
-                        # Actualizar edad si está disponible
+                        # Actualizar edad si está disponible (se aplica junto con el resto de la hoja)
                         age = self._extract_age(row)
                         if age:
-                            self.student_repo.update_student(
-                                student_registered.id,
-                                age=age
-                            )
+                            student_updates.setdefault(student_id, {})["edad"] = age
 
                         # Procesar encuesta
-                        self._process_survey_responses(row, student_registered)
+                        sheet_surveys.append(self._process_survey_responses(
+                            sheet_codes[position],
+                            sheet_texts[position],
+                            student_id,
+                            academic_year_id
+                        ))
 
                     except Exception as e:
                         logger.error(f"Error procesando fila {index}: {str(e)}")
                         stats['errors'] += 1
                         continue
 
+                # Los datos de los alumnos, las encuestas de la hoja y sus perfiles se confirman juntos o no se confirman
+                try:
+                    self.student_repo.bulk_update_students(student_updates)
+                    self.save_sheet_surveys(sheet_surveys)
+                    sheet_students = set(student_updates).union(survey["alumno_id"] for survey in sheet_surveys)
+                    StudentProfileRepository(self.db).refresh(sheet_students, commit=False)
+                    self.db.commit()
+                    for normalized_name, student_id in sheet_aliases.items():
+                        new_aliases.setdefault(normalized_name, student_id)
+                except Exception as e:
+                    self.db.rollback()
+                    logger.error(f"Error guardando las encuestas de la hoja {sheet}: {str(e)}")
+                    stats['errors'] += len(sheet_surveys)
+                    # Los alumnos creados en la hoja no llegaron a guardarse: las hojas siguientes no deben emparejarlos
+                    for student_id in sheet_created:
+                        name_index.remove(student_id)
+                        created_index.remove(student_id)
+
+            stats['aliases_created'] = self.alias_repo.create_aliases(new_aliases)
+            invalidate_cached_counts()
+
             # Generar reporte de matching
             stats['matching_report'] = self._generate_matching_report(stats)
 
@@ -552,411 +481,139 @@ class SurveyProcessor(BaseExcelProcessor):
                 'message': str(e)
             }
 
-    def _extract_student_name(self, row) -> str:
-        """Extrae el nombre del estudiante de la fila"""
-        try:
-            # Asumiendo formato: apellidos, nombres
-            if pd.notna(row[0]) and pd.notna(row[1]) and row[0] != row[1]:
-                return f"{row[1]}, {row[0]}".upper()
-            elif pd.notna(row[0]):
-                return str(row[0]).upper()
-            return ""
-        except:
-            return ""
-
-    def _extract_age(self, row) -> Optional[int]:
-        """Extrae la edad del estudiante"""
-        try:
-            age = row[3]
-            if pd.notna(age) and isinstance(age, (int, float)):
-                return int(age)
-        except:
-            pass
-        return None
-
-    def _extract_gender(self, row) -> str:
-        """Extrae el género del estudiante"""
-        try:
-            if pd.notna(row[4]) and str(row[4]).lower() == "x":
-                return "MASCULINO"
-            elif pd.notna(row[5]) and str(row[5]).lower() == "x":
-                return "FEMENINO"
-            elif pd.notna(row[6]) and str(row[6]).lower() == "x":
-                return "OTRO"
-        except:
-            pass
-        return "NO_ESPECIFICADO"
-
-    def _student_has_grades(self, student_id: int) -> bool:
-        """Verifica si el estudiante tiene notas registradas"""
-        from app.api.v1.students.models import HistorialAcademico, Nota
-
-        historial = self.db.query(HistorialAcademico).filter(
-            HistorialAcademico.alumno_id == student_id
-        ).first()
-
-        if historial:
-            notas = self.db.query(Nota).filter(
-                Nota.historial_id == historial.id
-            ).first()
-            return notas is not None
-
-        return False
-
-    def create_survey(self, academic_year_id, student_id):
-        """Crea una encuesta en la base de datos"""
-        survey = self.survey_repo.create_survey(academic_year_id, student_id)
-        return survey
-    def _process_effort_level(self, row, survey):
-        """Procesa pregunta sobre nivel de esfuerzo"""
-        effort = next(
-            (i + 1 for i in range(4) if pd.notna(row[26 + i]) and str(row[26 + i]).lower() == "x"),
-            0
-        )
-
-        if effort > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Cuánto te esfuerzas en las tareas y exámenes?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                effort_map = {
-                    1: "Mucho",
-                    2: "Lo necesario",
-                    3: "Poco",
-                    4: "Casi nada"
-                }
-
-                target_option = effort_map.get(effort)
-                for option in options:
-                    if option.get("opcion") == target_option:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-    def _process_study_resources(self, row, survey):
-        """Procesa pregunta sobre recursos de estudio (respuesta múltiple)"""
-        # Mapeo de columnas a recursos
-        resource_columns = {
-            30: "Aplicaciones o plataformas digitales",
-            31: "Videos educativos",
-            32: "Libros físicos",
-            33: "Apuntes de clase",
-            34: "Tutorías o asesorías"
-        }
-
-        question = self.survey_repo.get_question_by_text(
-            "¿Qué recursos utilizas para estudiar?"
-        )
-
-        if question:
-            options = self.survey_repo.get_options_by_question_id(question.get("id"))
-
-            # Verificar cada columna de recursos
-            for col_index, resource_name in resource_columns.items():
-                if pd.notna(row[col_index]) and str(row[col_index]).lower() == "x":
-                    # Buscar la opción correspondiente
-                    for option in options:
-                        if option.get("opcion") == resource_name:
-                            self.create_answer_choice(
-                                survey.id,
-                                question.get("id"),
-                                option.get("id")
-                            )
-                            break
-
-    def _process_internet_access(self, row, survey):
-        """Procesa pregunta sobre acceso a internet"""
-        has_internet = None
-
-        if pd.notna(row[35]) and str(row[35]).lower() == "x":
-            has_internet = "Sí"
-        elif pd.notna(row[36]) and str(row[36]).lower() == "x":
-            has_internet = "No"
-
-        if has_internet:
-            question = self.survey_repo.get_question_by_text(
-                "¿Tienes acceso a internet en casa?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                for option in options:
-                    if option.get("opcion") == has_internet:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-    def _process_technology_use(self, row, survey):
-        """Procesa pregunta sobre uso de tecnología"""
-        tech_use = next(
-            (i + 1 for i in range(4) if pd.notna(row[37 + i]) and str(row[37 + i]).lower() == "x"),
-            0
-        )
-
-        if tech_use > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Cuánto utilizas la tecnología para aprender?"
-            )
-            if question:
-                self._save_frequency_answer(survey, question, tech_use)
-
-    def _process_extracurricular(self, row, survey):
-        """Procesa pregunta sobre actividades extracurriculares"""
-        extracurricular = None
-
-        if pd.notna(row[41]) and str(row[41]).lower() == "x":
-            extracurricular = "Sí"
-        elif pd.notna(row[42]) and str(row[42]).lower() == "x":
-            extracurricular = "No"
-
-        if extracurricular:
-            question = self.survey_repo.get_question_by_text(
-                "¿Participas en actividades extracurriculares (deporte, arte, clubes)?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                for option in options:
-                    if option.get("opcion") == extracurricular:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-    def _process_sleep_hours(self, row, survey):
-        """Procesa pregunta sobre horas de sueño"""
-        sleep = next(
-            (i + 1 for i in range(3) if pd.notna(row[43 + i]) and str(row[43 + i]).lower() == "x"),
-            0
-        )
-
-        if sleep > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Cuántas horas duermes en promedio por noche?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                sleep_map = {
-                    1: "Menos de 5 horas",
-                    2: "Entre 5 y 7 horas",
-                    3: "Más de 7 horas"
+    def get_question_catalog(self) -> Dict[str, Tuple[int, Dict[str, int]]]:
+        """Catálogo {pregunta: (id, {opción: id})}, cargado una sola vez por carga"""
+        if self._question_catalog is None:
+            self._question_catalog = self.survey_repo.get_question_catalog()
+        return self._question_catalog
+
+    def save_sheet_surveys(self, surveys: List[Dict]):
+        """
+        Guarda las encuestas de una hoja: obtiene o crea la encuesta de cada alumno y año,
+        elimina sus respuestas anteriores e inserta las nuevas en bloque.
+        Así volver a cargar la misma hoja no duplica encuestas ni respuestas.
+        No hace commit; process_student_survey confirma la hoja completa.
+        """
+        if not surveys:
+            return
+
+        # Si un alumno aparece más de una vez en la hoja, vale su última fila
+        surveys = list({(survey["alumno_id"], survey["anio"]): survey for survey in surveys}.values())
+
+        survey_ids = self.survey_repo.upsert_surveys(surveys)
+        self.survey_repo.delete_answers(survey_ids)
+
+        choice_answers = []
+        text_answers = []
+        for survey_id, survey in zip(survey_ids, surveys):
+            for question_id, option_id in survey["respuestas"]:
+                choice_answers.append({"encuesta_id": survey_id, "pregunta_id": question_id, "opcion_id": option_id})
+            for question_id, answer in survey["respuestas_texto"]:
+                text_answers.append({"encuesta_id": survey_id, "pregunta_id": question_id, "texto": answer})
+
+        self.survey_repo.create_answers(choice_answers, text_answers)
+        self.survey_repo.replace_compact_answers([
+            {
+                "encuesta_id": survey_id,
+                "alumno_id": survey["alumno_id"],
+                "anio": survey["anio"],
+                "codigos": survey["codigos"]
+            }
+            for survey_id, survey in zip(survey_ids, surveys)
+        ])
+
+    def get_answer_matrix(self, year: Optional[int] = None) -> Dict:
+        """
+        Retorna todas las encuestas como matriz de códigos (una fila por encuesta, una columna por pregunta),
+        leída de respuestas_encuesta_compactas en una sola consulta
+        """
+        return {
+            "preguntas": [
+                {
+                    "pregunta": question["pregunta"],
+                    "opciones": question["opciones"],
+                    "multiple": question["multiple"]
                 }
-
-                target_option = sleep_map.get(sleep)
-                for option in options:
-                    if option.get("opcion") == target_option:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-    def _process_stress_level(self, row, survey):
-        """Procesa pregunta sobre nivel de estrés"""
-        stress = next(
-            (i + 1 for i in range(4) if pd.notna(row[46 + i]) and str(row[46 + i]).lower() == "x"),
-            0
-        )
-
-        if stress > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Sientes estrés o ansiedad cuando tienes exámenes o tareas importantes?"
-            )
-            if question:
-                self._save_frequency_answer(survey, question, stress)
-
-    def _process_class_participation(self, row, survey):
-        """Procesa pregunta de participación en clase"""
-        participation = next(
-            (i + 1 for i in range(4) if pd.notna(row[10 + i]) and str(row[10 + i]).lower() == "x"),
-            0
-        )
-
-        if participation > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Sueles participar en clase respondiendo preguntas o haciendo comentarios?"
-            )
-            if question:
-                self._save_frequency_answer(survey, question, participation)
-
-    def _process_survey_responses(self, row, student):
-        """Procesa todas las respuestas de la encuesta para un estudiante"""
-        # Crear encuesta
-        current_year = 2025
-        academic_year = self.year_repo.get_or_create_academic_year(current_year)
-        survey = self.create_survey(academic_year.id, student.id)
-
-        # Procesar cada pregunta
-        self._process_study_hours(row, survey)
-        self._process_class_participation(row, survey)
-        self._process_help_seeking(row, survey)
-        self._process_class_enjoyment(row, survey)
-        self._process_difficulty_perception(row, survey)
-        self._process_effort_level(row, survey)
-        self._process_study_resources(row, survey)
-        self._process_internet_access(row, survey)
-        self._process_technology_use(row, survey)
-        self._process_extracurricular(row, survey)
-        self._process_sleep_hours(row, survey)
-        self._process_stress_level(row, survey)
-        self._process_text_responses(row, survey)
-
-
-
-    def _process_difficulty_perception(self, row, survey):
-        """Procesa pregunta sobre percepción de dificultad"""
-        difficulty = next(
-            (i + 1 for i in range(4) if pd.notna(row[22 + i]) and str(row[22 + i]).lower() == "x"),
-            0
-        )
-
-        if difficulty > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Cómo calificas la dificultad de las materias en general?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                difficulty_map = {
-                    1: "Muy fáciles",
-                    2: "Normales",
-                    3: "Difíciles",
-                    4: "Muy difíciles"
+                for question in self.survey_decoder.layout
+            ],
+            "encuestas": [
+                {
+                    "encuesta_id": survey_id,
+                    "alumno_id": student_id,
+                    "anio": survey_year,
+                    "codigos": list(codes)
                 }
+                for survey_id, student_id, survey_year, codes in self.survey_repo.get_compact_answers(year)
+            ]
+        }
 
-                target_option = difficulty_map.get(difficulty)
-                for option in options:
-                    if option.get("opcion") == target_option:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-
-
-
-
-    def _process_study_hours(self, row, survey):
-        """Procesa pregunta de horas de estudio"""
-        study_hours = next(
-            (i + 1 for i in range(3) if pd.notna(row[7 + i]) and str(row[7 + i]).lower() == "x"),
-            0
-        )
+    def rebuild_compact_answers(self) -> Dict:
+        """Vuelve a generar respuestas_encuesta_compactas a partir de respuestas_encuesta (encuestas anteriores)"""
+        catalog = self.get_question_catalog()
 
-        if study_hours > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Cuánto tiempo dedicas al estudio fuera del horario escolar?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                option_map = {
-                    1: "Menos de 1 hora al día",
-                    2: "Entre 1 y 2 horas al día",
-                    3: "Más de 2 horas al día"
+        # opcion_id -> (posición de la pregunta, posición de la opción)
+        option_positions = {}
+        for position, question in enumerate(self.survey_decoder.layout):
+            if question["pregunta"] not in catalog:
+                continue
+            _, options = catalog[question["pregunta"]]
+            for option_position, option_text in enumerate(question["opciones"]):
+                if option_text in options:
+                    option_positions[options[option_text]] = (position, option_position)
+
+        compact_answers = {}
+        for survey_id, student_id, survey_year, option_id in self.survey_repo.get_surveys_with_choice_answers():
+            if survey_id not in compact_answers:
+                compact_answers[survey_id] = {
+                    "encuesta_id": survey_id,
+                    "alumno_id": student_id,
+                    "anio": survey_year,
+                    "codigos": [0] * len(self.survey_decoder.layout)
                 }
+            if option_id not in option_positions:
+                continue
 
-                target_option = option_map.get(study_hours)
-                for option in options:
-                    if option.get("opcion") == target_option:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
-
-    def create_answer_choice(self, survey_id, question_id, option_id):
-        """Crea una respuesta en la base de datos"""
-        answer = self.survey_repo.create_answer_choice(survey_id, question_id, option_id)
-        return answer
-
-    def _process_class_participation(self, row, survey):
-        """Procesa pregunta de participación en clase"""
-        participation = next(
-            (i + 1 for i in range(4) if pd.notna(row[10 + i]) and str(row[10 + i]).lower() == "x"),
-            0
-        )
-
-        if participation > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Sueles participar en clase respondiendo preguntas o haciendo comentarios?"
-            )
-            if question:
-                self._save_frequency_answer(survey, question, participation)
-
-    def _process_help_seeking(self, row, survey):
-        """Procesa pregunta sobre pedir ayuda"""
-        help_seeking = next(
-            (i + 1 for i in range(4) if pd.notna(row[14 + i]) and str(row[14 + i]).lower() == "x"),
-            0
-        )
-
-        if help_seeking > 0:
-            question = self.survey_repo.get_question_by_text(
-                "¿Pides ayuda cuando no entiendes un tema?"
-            )
-            if question:
-                self._save_frequency_answer(survey, question, help_seeking)
-
-    def _save_frequency_answer(self, survey, question, level):
-        """Guarda respuestas de tipo frecuencia (Nunca, A veces, etc.)"""
-        options = self.survey_repo.get_options_by_question_id(question.get("id"))
-        frequency_map = {
-            1: "Nunca",
-            2: "A veces",
-            3: "Casi siempre",
-            4: "Siempre"
+            position, option_position = option_positions[option_id]
+            codes = compact_answers[survey_id]["codigos"]
+            if self.survey_decoder.layout[position]["multiple"]:
+                codes[position] |= 1 << option_position
+            elif not codes[position]:
+                codes[position] = option_position + 1
+
+        self.survey_repo.rebuild_compact_answers(list(compact_answers.values()))
+        return {"total_encuestas": len(compact_answers)}
+
+    def _process_survey_responses(self, codes, texts, student_id, academic_year_id) -> Dict:
+        """
+        Arma la encuesta de un estudiante a partir de su fila en la matriz de códigos,
+        buscando los ids de preguntas y opciones en el catálogo. No la guarda todavía.
+        """
+        catalog = self.get_question_catalog()
+        survey = {
+            "anio": academic_year_id,
+            "alumno_id": student_id,
+            "respuestas": [],
+            "respuestas_texto": [],
+            "codigos": [int(code) for code in codes]
         }
 
-        target_option = frequency_map.get(level)
-        for option in options:
-            if option.get("opcion") == target_option:
-                self.create_answer_choice(
-                    survey.id,
-                    question.get("id"),
-                    option.get("id")
-                )
-                break
-
-    def _process_text_responses(self, row, survey):
-        """Procesa respuestas de texto"""
-        # Pregunta 13: Mejoras en clases
-        if pd.notna(row[50]):
-            question = self.survey_repo.get_question_by_text(
-                "¿Qué mejorarías en las clases para aprender mejor?"
-            )
-            if question:
-                self.create_answer_text(
-                    survey.id,
-                    question.get("id"),
-                    str(row[50])
-                )
+        for position, code in enumerate(codes):
+            question = catalog.get(self.survey_decoder.layout[position]["pregunta"])
+            if not question or code <= 0:
+                continue
 
-        # Pregunta 14: Apoyo adicional
-        if pd.notna(row[51]):
-            question = self.survey_repo.get_question_by_text(
-                "¿Qué tipo de apoyo adicional te gustaría recibir para mejorar tu aprendizaje?"
-            )
-            if question:
-                self.create_answer_text(
-                    survey.id,
-                    question.get("id"),
-                    str(row[51])
-                )
+            question_id, options = question
+            for option_text in self.survey_decoder.option_labels(position, int(code)):
+                option_id = options.get(option_text)
+                if option_id is not None:
+                    survey["respuestas"].append((question_id, option_id))
 
-    def create_answer_text(self, survey_id, question_id, answer):
-        """Crea una respuesta en la base de datos"""
-        answer = self.survey_repo.create_answer_text(survey_id, question_id, answer)
-        return answer
+        for position, answer in enumerate(texts):
+            question = catalog.get(self.survey_decoder.text_layout[position]["pregunta"])
+            if question and answer is not None:
+                survey["respuestas_texto"].append((question[0], answer))
+
+        return survey
 
     def _generate_matching_report(self, stats: Dict) -> str:
         """Genera un reporte detallado del proceso de matching"""
@@ -977,34 +634,3 @@ class SurveyProcessor(BaseExcelProcessor):
                 )
 
         return "\n".join(report)
-
-    # Métodos restantes para procesar otras preguntas...
-    def _process_class_enjoyment(self, row, survey):
-        """Procesa pregunta sobre gusto por las clases"""
-        enjoyment = next(
-            (i + 1 for i in range(4) if pd.notna(row[18 + i]) and str(row[18 + i]).lower() == "x"),
-            0
-        )
-
-        if enjoyment > 0:
-            question = self.survey_repo.get_question_by_text(
-                "En general, ¿te gustan las clases?"
-            )
-            if question:
-                options = self.survey_repo.get_options_by_question_id(question.get("id"))
-                enjoyment_map = {
-                    1: "Sí, mucho",
-                    2: "A veces",
-                    3: "No mucho",
-                    4: "No me gustan"
-                }
-
-                target_option = enjoyment_map.get(enjoyment)
-                for option in options:
-                    if option.get("opcion") == target_option:
-                        self.create_answer_choice(
-                            survey.id,
-                            question.get("id"),
-                            option.get("id")
-                        )
-                        break
\ No newline at end of file
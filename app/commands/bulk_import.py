@@ -0,0 +1,406 @@
+"""
+Importador masivo de archivos Excel (notas de secundaria, notas de primaria y encuestas)
+que trabaja directamente contra la base de datos, sin pasar por la API HTTP.
+
+Uso:
+    python -m app.commands.bulk_import <directorio> [--workers 4] [--database-url URL] [--summary resumen.json]
+
+Las notas se importan en cuatro pasos, con los mismos procesadores que usan los endpoints:
+1. En paralelo, cada archivo se convierte al formato largo y se guarda su artefacto (sin escribir en la base).
+2. En el proceso principal se omiten los archivos con el mismo contenido que otro y se crean los
+   catálogos, alumnos e historiales de todos los archivos.
+   Ninguna de esas tablas tiene llave única, así que crearlos desde varios procesos a la vez los duplicaría.
+3. En paralelo se insertan las notas, agrupando los archivos por cohorte (nivel, año, grado y sección):
+   los archivos de una misma cohorte los carga un solo proceso, uno tras otro.
+4. En el proceso principal se arman los perfiles de análisis de los alumnos cargados: un alumno puede
+   estar en cohortes de procesos distintos y dos procesos no deben rearmar su perfil a la vez.
+Las encuestas emparejan y crean alumnos por nombre, así que se cargan al final en el proceso principal.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+import pandas as pd
+from app.commands.database import add_database_url_argument, use_database_url
+
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+
+TEMPLATE_SECONDARY = "secundaria"
+TEMPLATE_PRIMARY = "primaria"
+TEMPLATE_SURVEY = "encuesta"
+
+# La encuesta usa hasta la columna 52 (texto libre de la pregunta 14) más la columna de índice
+SURVEY_MIN_COLUMNS = 53
+
+
+def find_workbooks(directory: str) -> List[str]:
+    """Busca recursivamente los archivos Excel del directorio"""
+    workbooks = []
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            if file_name.startswith("~$"):
+                continue
+            if file_name.lower().endswith(EXCEL_EXTENSIONS):
+                workbooks.append(os.path.join(root, file_name))
+    return sorted(workbooks)
+
+
+def detect_template(excel_data: pd.ExcelFile) -> Optional[str]:
+    """Detecta el tipo de plantilla del Excel a partir de sus hojas y su primera hoja"""
+    sheet_names = excel_data.sheet_names
+    if not sheet_names:
+        return None
+
+    if {"Generalidades", "Parametros"}.issubset(sheet_names):
+        return TEMPLATE_SECONDARY
+
+    first_sheet = excel_data.parse(sheet_names[0], header=None, nrows=12)
+    if first_sheet.shape[1] > 1:
+        labels = " ".join(str(value) for value in first_sheet.iloc[1:10, 1].tolist()).upper()
+        if "UGEL" in labels:
+            return TEMPLATE_PRIMARY
+
+    if first_sheet.shape[1] >= SURVEY_MIN_COLUMNS:
+        return TEMPLATE_SURVEY
+
+    return None
+
+
+def process_content(template: str, db, file_content: bytes) -> Dict:
+    """Procesa el contenido con el mismo procesador que usa el endpoint de la plantilla"""
+    from app.api.v1.students.services.excel_proccessor_high_level import ExcelProcessor as ExcelProcessorHighSchool
+    from app.api.v1.students.services.excel_processor_primary_level import ExcelProcessor as ExcelProcessorPrimary
+    from app.api.v1.survey.services.survey_processor import SurveyProcessor
+
+    if template == TEMPLATE_SECONDARY:
+        return ExcelProcessorHighSchool(db).process_excel(file_content)
+    if template == TEMPLATE_PRIMARY:
+        return ExcelProcessorPrimary(db).process_student_califications(file_content)
+    return SurveyProcessor(db).process_student_survey(file_content)
+
+
+def count_rows(template: str, response: Dict) -> int:
+    """Cantidad de filas guardadas según la respuesta del procesador"""
+    if template == TEMPLATE_SURVEY:
+        return response.get("total_processed", 0)
+    return response.get("notas_insertadas", 0)
+
+
+def import_workbook(path: str) -> Dict:
+    """Importa un archivo en el proceso actual y retorna su resultado"""
+    from app.db.database import SessionLocal
+
+    started_at = time.perf_counter()
+    result = {"file": path, "template": None, "rows": 0, "error": None, "seconds": 0.0}
+    db = SessionLocal()
+    try:
+        with open(path, "rb") as file:
+            file_content = file.read()
+
+        template = detect_template(pd.ExcelFile(io.BytesIO(file_content)))
+        result["template"] = template
+        if template is None:
+            raise ValueError("No se reconoce el tipo de plantilla del archivo")
+
+        response = process_content(template, db, file_content)
+        if response.get("error") or response.get("status") == "error":
+            raise ValueError(response.get("error") or response.get("message"))
+
+        result["rows"] = count_rows(template, response)
+    except Exception as e:
+        db.rollback()
+        result["error"] = str(e)
+    finally:
+        db.close()
+        result["seconds"] = round(time.perf_counter() - started_at, 3)
+
+    return result
+
+
+def prepare_database():
+    """Crea las tablas, los catálogos base y las preguntas de la encuesta antes de importar"""
+    from app.db.database import SessionLocal, engine
+    from app.db.schema import prepare_schema
+    from app.api.v1.students import models  # noqa: F401 registra los modelos en Base
+    from app.api.v1.common.services.insert_base_data import InsertBaseData
+    from app.api.v1.survey.services.survey_processor import SurveyProcessor
+
+    prepare_schema(engine)
+
+    db = SessionLocal()
+    try:
+        InsertBaseData(db).insert_base_data()
+        SurveyProcessor(db).create_question_and_options()
+    finally:
+        db.close()
+
+
+def prepare_workbook(path: str) -> Dict:
+    """Paso 1: detecta la plantilla y, si es de notas, guarda su formato largo como artefacto"""
+    from app.db.database import SessionLocal
+    from app.api.v1.students.services.excel_proccessor_high_level import ExcelProcessor as ExcelProcessorHighSchool
+    from app.api.v1.students.services.excel_processor_primary_level import ExcelProcessor as ExcelProcessorPrimary
+    from app.api.v1.students.services.upload_artifacts import UploadArtifactStore
+
+    started_at = time.perf_counter()
+    result = {"file": path, "template": None, "rows": 0, "error": None, "seconds": 0.0}
+    db = SessionLocal()
+    try:
+        with open(path, "rb") as file:
+            file_content = file.read()
+
+        template = detect_template(pd.ExcelFile(io.BytesIO(file_content)))
+        result["template"] = template
+        if template is None:
+            raise ValueError("No se reconoce el tipo de plantilla del archivo")
+
+        if template != TEMPLATE_SURVEY:
+            processor = ExcelProcessorHighSchool(db) if template == TEMPLATE_SECONDARY else ExcelProcessorPrimary(db)
+            long_df, already_loaded = processor.prepare_long_format(file_content)
+            result["content_hash"] = UploadArtifactStore.content_hash(file_content)
+            result["already_loaded"] = already_loaded
+            result["cohorts"] = sorted(
+                tuple(str(value) for value in cohort)
+                for cohort in long_df[["nivel", "anio", "grado", "seccion"]].drop_duplicates().itertuples(index=False)
+            )
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        db.close()
+        result["seconds"] = round(time.perf_counter() - started_at, 3)
+
+    return result
+
+
+def seed_workbooks(prepared: List[Dict]):
+    """Paso 2: crea en este proceso los catálogos, alumnos e historiales de todos los archivos de notas"""
+    from app.db.database import SessionLocal
+    from app.api.v1.students.services.grades_loader import GradesLoader
+    from app.api.v1.students.services.upload_artifacts import UploadArtifactStore
+
+    store = UploadArtifactStore()
+    db = SessionLocal()
+    try:
+        loader = GradesLoader(db)
+        for result in prepared:
+            started_at = time.perf_counter()
+            try:
+                loader.seed(store.load(result["template"], result["content_hash"]))
+            except Exception as e:
+                db.rollback()
+                result["error"] = str(e)
+            result["seconds"] += round(time.perf_counter() - started_at, 3)
+    finally:
+        db.close()
+
+
+def skip_duplicates(prepared: List[Dict]) -> List[Dict]:
+    """
+    Deja un solo archivo por contenido. Dos archivos idénticos de la misma importación llegan ambos con
+    already_loaded=False (ninguno estaba guardado) y cargarían dos veces las mismas notas.
+    """
+    unique = {}
+    for result in prepared:
+        first = unique.setdefault(result["content_hash"], result)
+        if first is not result:
+            result["duplicate_of"] = first["file"]
+    return list(unique.values())
+
+
+def group_by_cohort(prepared: List[Dict]) -> List[List[Dict]]:
+    """Agrupa los archivos que comparten alguna cohorte, para que un solo proceso cargue cada grupo"""
+    parent = list(range(len(prepared)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    owners = {}
+    for index, result in enumerate(prepared):
+        for cohort in result["cohorts"]:
+            cohort = tuple(cohort)
+            if cohort in owners:
+                parent[find(index)] = find(owners[cohort])
+            else:
+                owners[cohort] = index
+
+    groups = {}
+    for index, result in enumerate(prepared):
+        groups.setdefault(find(index), []).append(result)
+    return list(groups.values())
+
+
+def load_group(group: List[Dict]) -> List[Dict]:
+    """Paso 3: inserta las notas de un grupo de archivos, uno tras otro"""
+    from app.db.database import SessionLocal
+    from app.api.v1.students.services.grades_loader import GradesLoader
+    from app.api.v1.students.services.upload_artifacts import UploadArtifactStore
+
+    store = UploadArtifactStore()
+    db = SessionLocal()
+    try:
+        for result in group:
+            started_at = time.perf_counter()
+            try:
+                long_df = store.load(result["template"], result["content_hash"])
+                # Igual que en los endpoints: un archivo que ya se había cargado reemplaza sus notas
+                response = GradesLoader(db).load(
+                    long_df,
+                    replace=result["already_loaded"],
+                    refresh_profiles=False,
+                    content_hash=result["content_hash"]
+                )
+                result["rows"] = count_rows(result["template"], response)
+                result["student_ids"] = [student["id"] for student in response["notas_de_alumnos_actualizados"]]
+            except Exception as e:
+                db.rollback()
+                result["error"] = str(e)
+            result["seconds"] = round(result["seconds"] + time.perf_counter() - started_at, 3)
+    finally:
+        db.close()
+
+    return group
+
+
+def refresh_profiles(loaded: List[Dict]):
+    """Paso 4: arma en este proceso los perfiles de análisis de los alumnos de los archivos cargados"""
+    from app.db.database import SessionLocal
+    from app.api.v1.students.repositories.student_profiles import StudentProfileRepository
+
+    student_ids = {student_id for result in loaded for student_id in result.get("student_ids", [])}
+    started_at = time.perf_counter()
+    db = SessionLocal()
+    try:
+        StudentProfileRepository(db).refresh(student_ids)
+    finally:
+        db.close()
+    print(f"Perfiles de análisis: {len(student_ids)} alumnos ({round(time.perf_counter() - started_at, 3)} s)")
+
+
+def print_result(result: Dict):
+    """Muestra en consola el resultado de un archivo"""
+    if result.get("duplicate_of"):
+        print(f"[OMITIDO] {result['file']} (mismo contenido que {result['duplicate_of']})")
+        return
+    status = "ERROR" if result["error"] else "OK"
+    print(f"[{status}] {result['file']} ({result['template']}, {result['rows']} filas, {result['seconds']} s)")
+
+
+def run_import(workbooks: List[str], workers: int) -> List[Dict]:
+    """Importa los archivos en los tres pasos descritos arriba y retorna un resultado por archivo"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        prepared = list(executor.map(prepare_workbook, workbooks))
+
+        results = [result for result in prepared if result["error"]]
+        grades = [result for result in prepared if not result["error"] and result["template"] != TEMPLATE_SURVEY]
+        surveys = [result["file"] for result in prepared if not result["error"] and result["template"] == TEMPLATE_SURVEY]
+        for result in results:
+            print_result(result)
+
+        unique_grades = skip_duplicates(grades)
+        for result in grades:
+            if result.get("duplicate_of"):
+                print_result(result)
+                results.append(result)
+        grades = unique_grades
+
+        seed_workbooks(grades)
+        results += [result for result in grades if result["error"]]
+        for result in grades:
+            if result["error"]:
+                print_result(result)
+
+        futures = [
+            executor.submit(load_group, group)
+            for group in group_by_cohort([result for result in grades if not result["error"]])
+        ]
+        loaded = []
+        for future in as_completed(futures):
+            for result in future.result():
+                print_result(result)
+                results.append(result)
+                loaded.append(result)
+
+    refresh_profiles([result for result in loaded if not result["error"]])
+
+    for path in surveys:
+        result = import_workbook(path)
+        print_result(result)
+        results.append(result)
+
+    return results
+
+
+def build_summary(results: List[Dict], elapsed: float) -> Dict:
+    """Arma el resumen final de la importación"""
+    failures = [result for result in results if result["error"]]
+    total_rows = sum(result["rows"] for result in results)
+    templates = {}
+    for result in results:
+        template = result["template"] or "desconocida"
+        templates[template] = templates.get(template, 0) + 1
+
+    return {
+        "files": len(results),
+        "failed": len(failures),
+        "rows": total_rows,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(results) / elapsed, 3) if elapsed > 0 else 0,
+        "rows_per_sec": round(total_rows / elapsed, 3) if elapsed > 0 else 0,
+        "templates": templates,
+        "failures": [{"file": result["file"], "error": result["error"]} for result in failures]
+    }
+
+
+def print_summary(summary: Dict):
+    """Muestra el resumen en consola"""
+    print("=== RESUMEN DE IMPORTACIÓN ===")
+    print(f"Archivos procesados: {summary['files']} ({summary['files_per_sec']} archivos/s)")
+    print(f"Filas guardadas: {summary['rows']} ({summary['rows_per_sec']} filas/s)")
+    print(f"Tiempo total: {summary['seconds']} s")
+    print(f"Plantillas: {summary['templates']}")
+    print(f"Errores: {summary['failed']}")
+    for failure in summary["failures"]:
+        print(f"- {failure['file']}: {failure['error']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Importa masivamente archivos Excel de notas y encuestas.")
+    parser.add_argument("directory", help="Directorio con los archivos Excel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Cantidad de procesos")
+    add_database_url_argument(parser)
+    parser.add_argument("--summary", help="Ruta donde guardar el resumen en JSON")
+    args = parser.parse_args(argv)
+
+    use_database_url(args.database_url)
+
+    workbooks = find_workbooks(args.directory)
+    if not workbooks:
+        print(f"No se encontraron archivos Excel en {args.directory}")
+        return 1
+
+    prepare_database()
+
+    started_at = time.perf_counter()
+    results = run_import(workbooks, args.workers)
+
+    summary = build_summary(results, time.perf_counter() - started_at)
+    print_summary(summary)
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as file:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+
+    return 0 if not summary["failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+"""Opción --database-url compartida por los comandos de app.commands"""
+import os
+from argparse import ArgumentParser
+from typing import Optional
+
+
+def add_database_url_argument(parser: ArgumentParser):
+    """Agrega al comando la opción para elegir la base de datos"""
+    parser.add_argument("--database-url", help="Base de datos a usar (por defecto DATABASE_URL)")
+
+
+def use_database_url(database_url: Optional[str]):
+    """
+    Hace que el comando use la base de datos indicada en lugar de DATABASE_URL.
+    Se llama antes de importar la configuración, para que la usen este proceso y los procesos hijos.
+    """
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
@@ -0,0 +1,90 @@
+"""
+Busca y fusiona alumnos repetidos (por ejemplo, creados por encuestas cuyo nombre no llegó al umbral
+de similitud o por nóminas con el nombre escrito distinto).
+
+Uso:
+    python -m app.commands.deduplicate_students [--report reporte.json] [--threshold 0.92] [--workers 4]
+    python -m app.commands.deduplicate_students --apply-report reporte.json
+    python -m app.commands.deduplicate_students --apply
+
+Sin opciones solo genera el reporte de revisión. El reporte se puede editar (quitar grupos o duplicados)
+y luego aplicar con --apply-report; --apply fusiona directamente lo encontrado.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+from app.commands.database import add_database_url_argument, use_database_url
+
+
+def print_report(report: Dict):
+    """Muestra el resumen del reporte en consola"""
+    print("=== ALUMNOS REPETIDOS ===")
+    print(f"Alumnos revisados: {report['total_alumnos']}")
+    print(f"Pares comparados: {report['pares_comparados']}")
+    print(f"Grupos encontrados: {report['total_grupos']} ({report['total_duplicados']} duplicados)")
+    skipped_blocks = report.get("bloques_omitidos", [])
+    if skipped_blocks:
+        print(f"Bloques omitidos por superar --max-block-size: {len(skipped_blocks)}")
+        for block in skipped_blocks[:20]:
+            print(f"- apellido '{block['apellido']}', inicial '{block['inicial']}': {block['alumnos']} alumnos")
+    for group in report["grupos"][:20]:
+        survivor = group["sobreviviente"]
+        duplicates = ", ".join(
+            f"{duplicate['id']} '{duplicate['nombre']}' ({duplicate['similitud']:.2%})" for duplicate in group["duplicados"]
+        )
+        print(f"- {survivor['id']} '{survivor['nombre']}' <- {duplicates}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Busca y fusiona alumnos repetidos.")
+    parser.add_argument("--threshold", type=float, default=0.92, help="Similitud mínima para considerar dos alumnos iguales")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Cantidad de procesos para puntuar pares")
+    parser.add_argument("--max-block-size", type=int, default=300, help="Tamaño máximo de un bloque de apellidos")
+    parser.add_argument("--report", help="Ruta donde guardar el reporte de revisión en JSON")
+    parser.add_argument("--apply", action="store_true", help="Fusiona los grupos encontrados")
+    parser.add_argument("--apply-report", help="Fusiona los grupos de un reporte ya revisado")
+    add_database_url_argument(parser)
+    args = parser.parse_args(argv)
+
+    use_database_url(args.database_url)
+
+    from app.db.database import SessionLocal
+    from app.api.v1.students.repositories.student import StudentRepository
+    from app.api.v1.students.services.student_deduplication import StudentDeduplicator
+
+    db = SessionLocal()
+    try:
+        deduplicator = StudentDeduplicator(
+            StudentRepository(db),
+            threshold=args.threshold,
+            max_block_size=args.max_block_size,
+            workers=args.workers
+        )
+
+        if args.apply_report:
+            with open(args.apply_report, "r", encoding="utf-8") as file:
+                report = json.load(file)
+        else:
+            started_at = time.perf_counter()
+            report = deduplicator.find_duplicates()
+            report["segundos"] = round(time.perf_counter() - started_at, 3)
+            print_report(report)
+
+            if args.report:
+                with open(args.report, "w", encoding="utf-8") as file:
+                    json.dump(report, file, ensure_ascii=False, indent=2)
+
+        if args.apply or args.apply_report:
+            result = deduplicator.merge(report)
+            print(f"Fusión aplicada: {result}")
+    finally:
+        db.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Arma los perfiles de análisis precalculados (perfiles_alumnos), por ejemplo después de desplegar
+sobre una base de datos con alumnos cargados antes de existir la tabla.
+
+Uso:
+    python -m app.commands.rebuild_profiles [--only-missing] [--database-url URL]
+
+Hace lo mismo que POST /analytics/rebuild-profiles/, sin pasar por la API HTTP.
+"""
+import argparse
+import sys
+import time
+from typing import List, Optional
+from app.commands.database import add_database_url_argument, use_database_url
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Arma los perfiles de análisis precalculados.")
+    parser.add_argument("--only-missing", action="store_true", help="Solo los alumnos que aún no tienen perfiles")
+    add_database_url_argument(parser)
+    args = parser.parse_args(argv)
+
+    use_database_url(args.database_url)
+
+    from app.db.database import SessionLocal
+    from app.api.v1.students.repositories.student_profiles import StudentProfileRepository
+
+    db = SessionLocal()
+    try:
+        started_at = time.perf_counter()
+        profile_repo = StudentProfileRepository(db)
+        result = profile_repo.refresh_missing() if args.only_missing else profile_repo.refresh_all()
+        print(f"Perfiles actualizados: {result['alumnos_actualizados']} alumnos en {time.perf_counter() - started_at:.1f} s")
+    finally:
+        db.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,12 @@ class Settings(BaseSettings):
     """Clase de configuración de la aplicación FastAPI, proveendo variables de entorno."""
     database_url: str = os.getenv("DATABASE_URL")
     cors_origins: list[str] = ["*"]
+    # "index": índice de nombres en memoria por carga; "database": candidatos desde pg_trgm
+    survey_name_matching: str = os.getenv("SURVEY_NAME_MATCHING", "index")
+    upload_artifacts_dir: str = os.getenv("UPLOAD_ARTIFACTS_DIR", "storage/upload_artifacts")
+    # Total de los listados paginados: "exact", "estimated" (planificador de PostgreSQL) o "cached"
+    pagination_count_strategy: str = os.getenv("PAGINATION_COUNT_STRATEGY", "exact")
+    count_cache_ttl_seconds: int = int(os.getenv("COUNT_CACHE_TTL_SECONDS", "300"))
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
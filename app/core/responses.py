@@ -0,0 +1,111 @@
+import datetime
+import decimal
+import json
+from typing import Any, Iterable, Iterator
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional, sin él se usa el JSON de FastAPI
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional, sin él siempre se responde JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class RawJSON:
+    """JSON ya armado (por ejemplo por PostgreSQL) que se inserta tal cual en la respuesta, sin volver a codificarlo"""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _default(value: Any):
+    """Tipos que orjson y msgpack no serializan por sí solos"""
+    if isinstance(value, RawJSON):
+        return json.loads(value.text)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if hasattr(value, "tolist"):  # escalares y arreglos de numpy
+        return value.tolist()
+    if hasattr(value, "__table__"):  # instancias del ORM devueltas tal cual
+        from app.api.v1.students.serializers import to_dict
+        return to_dict(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def _json_default(value: Any):
+    """Como _default, pero el JSON ya armado se inserta sin decodificarlo (orjson.Fragment, orjson 3.9+)"""
+    if isinstance(value, RawJSON):
+        return orjson.Fragment(value.text)
+    return _default(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """Respuesta JSON codificada con orjson (o con el codificador de FastAPI si no está instalado)"""
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, RawJSON):
+            return content.text.encode("utf-8")
+        if orjson is None:
+            return super().render(jsonable_encoder(content, custom_encoder={RawJSON: _default}))
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
+class MsgpackResponse(Response):
+    """Respuesta en MessagePack, para clientes que la piden con Accept: application/msgpack"""
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_default, datetime=False)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Indica si el cliente pidió MessagePack y se puede responder en ese formato"""
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def negotiated_response(request: Request, content: Any) -> Response:
+    """
+    Responde en MessagePack o JSON según el encabezado Accept.
+    Al devolver la respuesta ya armada se evita la pasada de jsonable_encoder sobre payloads grandes;
+    el contenido debe ser de tipos simples (dicts, listas, fechas), como el que arman los repositorios.
+    """
+    if wants_msgpack(request):
+        return MsgpackResponse(content)
+    return FastJSONResponse(content)
+
+
+def ndjson_lines(items: Iterable[Any]) -> Iterator[bytes]:
+    """Codifica cada elemento como una línea JSON terminada en salto de línea"""
+    for item in items:
+        if orjson is None:
+            yield json.dumps(jsonable_encoder(item), ensure_ascii=False).encode("utf-8") + b"\n"
+        else:
+            yield orjson.dumps(
+                item,
+                default=_default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+            )
+
+
+def ndjson_response(items: Iterable[Any]) -> StreamingResponse:
+    """
+    Respuesta NDJSON (un objeto por línea) que se envía a medida que se generan los elementos,
+    sin armar la lista completa en memoria.
+    """
+    return StreamingResponse(ndjson_lines(items), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,101 @@
+from sqlalchemy import inspect, text
+from app.db.database import Base
+from app.utils.normalize_text import normalize_text
+
+
+def is_postgresql(engine) -> bool:
+    """Indica si el motor apunta a PostgreSQL"""
+    return engine.dialect.name == "postgresql"
+
+
+def create_extensions(engine):
+    """Crea las extensiones de PostgreSQL que necesitan los índices del modelo"""
+    if not is_postgresql(engine):
+        return
+
+    with engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+def add_normalized_name_column(engine):
+    """Agrega y completa alumnos.nombre_normalizado en bases de datos creadas antes de la columna"""
+    columns = {column["name"] for column in inspect(engine).get_columns("alumnos")}
+
+    with engine.begin() as connection:
+        if "nombre_normalizado" not in columns:
+            connection.execute(text("ALTER TABLE alumnos ADD COLUMN nombre_normalizado VARCHAR"))
+
+        if is_postgresql(engine):
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_alumnos_nombre_normalizado_trgm "
+                "ON alumnos USING gin (nombre_normalizado gin_trgm_ops)"
+            ))
+
+        pending = connection.execute(text(
+            "SELECT id, nombre_completo FROM alumnos WHERE nombre_normalizado IS NULL"
+        )).all()
+        if pending:
+            connection.execute(
+                text("UPDATE alumnos SET nombre_normalizado = :nombre_normalizado WHERE id = :id"),
+                [{"id": row.id, "nombre_normalizado": normalize_text(row.nombre_completo)} for row in pending]
+            )
+
+
+def add_survey_unique_key(engine):
+    """
+    Agrega la llave única (alumno_id, anio) de encuestas en bases de datos creadas antes de ella.
+    Antes se eliminan las encuestas repetidas, dejando la más reciente de cada alumno y año.
+    """
+    inspector = inspect(engine)
+    names = {index["name"] for index in inspector.get_indexes("encuestas")}
+    names |= {constraint["name"] for constraint in inspector.get_unique_constraints("encuestas")}
+    if "uq_encuestas_alumno_anio" in names:
+        return
+
+    duplicated = (
+        "SELECT id FROM encuestas e WHERE e.anio IS NOT NULL AND e.id < ("
+        "SELECT MAX(e2.id) FROM encuestas e2 WHERE e2.alumno_id = e.alumno_id AND e2.anio = e.anio)"
+    )
+    with engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM respuestas_encuesta WHERE encuesta_id IN ({duplicated})"))
+        connection.execute(text(f"DELETE FROM respuestas_texto_encuesta WHERE encuesta_id IN ({duplicated})"))
+        connection.execute(text(f"DELETE FROM encuestas WHERE id IN ({duplicated})"))
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_encuestas_alumno_anio ON encuestas (alumno_id, anio)"
+        ))
+
+
+def add_upload_column(engine):
+    """Agrega notas.carga en bases de datos creadas antes de la columna; las notas existentes quedan sin carga"""
+    columns = {column["name"] for column in inspect(engine).get_columns("notas")}
+
+    with engine.begin() as connection:
+        if "carga" not in columns:
+            connection.execute(text("ALTER TABLE notas ADD COLUMN carga VARCHAR(64)"))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_notas_carga ON notas (carga)"))
+
+
+# Índices de llaves foráneas usados por los filtros y las cargas por lotes (tabla, columna)
+FOREIGN_KEY_INDEXES = [
+    ("historial_academico", "alumno_id"),
+    ("notas", "historial_id"),
+    ("notas", "materia_id"),
+    ("notas", "bimestre_id"),
+]
+
+
+def add_foreign_key_indexes(engine):
+    """Crea los índices de llaves foráneas en bases de datos creadas antes de declararlos en el modelo"""
+    with engine.begin() as connection:
+        for table, column in FOREIGN_KEY_INDEXES:
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+
+
+def prepare_schema(engine):
+    """Crea las tablas y aplica los cambios de esquema que create_all no aplica sobre tablas existentes"""
+    create_extensions(engine)
+    Base.metadata.create_all(bind=engine)
+    add_normalized_name_column(engine)
+    add_survey_unique_key(engine)
+    add_upload_column(engine)
+    add_foreign_key_indexes(engine)
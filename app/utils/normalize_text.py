@@ -0,0 +1,26 @@
+import re
+import unicodedata
+
+
+def normalize_text(texto: str) -> str:
+    """Normaliza texto para comparación (sin tildes, en minúsculas y sin símbolos)"""
+    if not texto:
+        return ""
+
+    # Convertir a string si no lo es
+    texto = str(texto).strip()
+
+    # Normalizar unicode
+    texto = unicodedata.normalize('NFD', texto)
+    texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+
+    # Convertir a minúsculas
+    texto = texto.lower()
+
+    # Eliminar caracteres especiales pero mantener espacios
+    texto = re.sub(r'[^\w\s]', '', texto)
+
+    # Normalizar espacios múltiples
+    texto = re.sub(r'\s+', ' ', texto).strip()
+
+    return texto
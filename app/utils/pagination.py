@@ -0,0 +1,114 @@
+import base64
+import json
+import threading
+import time
+from typing import Dict, Hashable, Optional
+from app.core.config import settings
+
+COUNT_EXACT = "exact"
+COUNT_ESTIMATED = "estimated"
+COUNT_CACHED = "cached"
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_ESTIMATED, COUNT_CACHED)
+
+# Totales guardados por combinación de filtros: {llave: (total, momento en que se contó)}.
+# Es por proceso; las cargas lo invalidan y el TTL acota lo desactualizado entre procesos.
+_count_cache: Dict[Hashable, tuple] = {}
+_count_cache_lock = threading.Lock()
+
+
+def encode_cursor(**values) -> str:
+    """Convierte la llave de la última fila de una página en un cursor opaco para la URL"""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """Lee un cursor generado por encode_cursor; lanza ValueError si no es válido"""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise ValueError("El cursor no es válido")
+    if not isinstance(values, dict) or not isinstance(values.get("id"), int):
+        raise ValueError("El cursor no es válido")
+    return values
+
+
+def keyset_page(query, column, after: Optional[str] = None, limit: int = 10):
+    """
+    Pagina por cursor sobre una columna indexada y única (normalmente la llave primaria).
+
+    En lugar de OFFSET se filtra por "columna > última llave vista", así cada página cuesta lo mismo
+    sin importar qué tan adentro esté. Las filas deben exponer la llave como atributo `id`.
+
+    Returns:
+        tuple: (filas de la página, cursor de la página siguiente o None si no hay más)
+    """
+    limit = max(limit, 1)
+    if after:
+        query = query.filter(column > decode_cursor(after)["id"])
+
+    # Se pide una fila extra solo para saber si hay página siguiente
+    rows = query.order_by(column).limit(limit + 1).all()
+    next_cursor = encode_cursor(id=rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def offset_page(query, column, page: int = 1, page_size: int = 10):
+    """
+    Pagina por número de página, ordenando por una columna única para que las páginas sean estables.
+
+    Returns:
+        tuple: (filas de la página, cursor para seguir por cursor desde esta página o None si no hay más)
+    """
+    page, page_size = max(page, 1), max(page_size, 1)
+    rows = query.order_by(column).offset((page - 1) * page_size).limit(page_size + 1).all()
+    next_cursor = encode_cursor(id=rows[page_size - 1].id) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def count_total(query, strategy: Optional[str] = None, cache_key: Optional[Hashable] = None) -> int:
+    """
+    Cuenta las filas de una consulta paginada según la estrategia indicada (por defecto la de configuración).
+
+    - exact: COUNT sobre la consulta.
+    - estimated: filas estimadas por el planificador de PostgreSQL (EXPLAIN), sin recorrer la tabla;
+      en otras bases se cuenta exacto.
+    - cached: conteo exacto guardado por cache_key hasta la siguiente carga o hasta que venza el TTL.
+    """
+    strategy = strategy or settings.pagination_count_strategy
+    if strategy not in COUNT_STRATEGIES:
+        raise ValueError(f"Estrategia de conteo no válida: {strategy} (opciones: {', '.join(COUNT_STRATEGIES)})")
+
+    query = query.order_by(None)
+    if strategy == COUNT_ESTIMATED:
+        return _estimated_count(query)
+    if strategy == COUNT_CACHED and cache_key is not None:
+        with _count_cache_lock:
+            cached = _count_cache.get(cache_key)
+        if cached and time.monotonic() - cached[1] < settings.count_cache_ttl_seconds:
+            return cached[0]
+        total = query.count()
+        with _count_cache_lock:
+            _count_cache[cache_key] = (total, time.monotonic())
+        return total
+    return query.count()
+
+
+def invalidate_cached_counts():
+    """Descarta los totales guardados; se llama después de cada carga de notas, encuestas o fusión de alumnos"""
+    with _count_cache_lock:
+        _count_cache.clear()
+
+
+def _estimated_count(query) -> int:
+    """Filas estimadas por el planificador (usa las estadísticas de pg_class.reltuples, sin ejecutar la consulta)"""
+    connection = query.session.connection()
+    if connection.dialect.name != "postgresql":
+        return query.count()
+
+    compiled = query.statement.compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
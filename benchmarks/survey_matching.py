@@ -0,0 +1,289 @@
+"""
+Benchmark del emparejamiento de nombres de encuestas con alumnos, con respuestas correctas conocidas.
+
+Genera nóminas sintéticas y hojas de encuesta cuyos nombres tienen variaciones controladas
+(tildes, apellidos invertidos, errores de tipeo, nombres incompletos, orden cambiado) más una parte
+de nombres que no están en la nómina. Mide, para cada estrategia de emparejamiento:
+
+- nombres/s: nombres de la hoja emparejados por segundo (sin contar la construcción del índice)
+- precisión: emparejamientos correctos / emparejamientos aceptados (puntaje >= umbral)
+- recall: emparejamientos correctos / nombres que sí están en la nómina
+
+Uso:
+    python -m benchmarks.survey_matching [--sizes 1000 10000 50000] [--survey-size 500]
+        [--threshold 0.85] [--max-linear 10000] [--seed 7] [--json resultados.json]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from app.utils.normalize_text import normalize_text
+from app.api.v1.survey.services.name_matching import BatchNameMatcher, StudentNameIndex, cdist, linear_best_match
+
+SURNAMES = [
+    "QUISPE", "MAMANI", "FLORES", "RODRÍGUEZ", "SÁNCHEZ", "GARCÍA", "ROJAS", "HUAMÁN", "CHÁVEZ", "RAMOS",
+    "TORRES", "DÍAZ", "LÓPEZ", "GONZÁLES", "PÉREZ", "VÁSQUEZ", "CASTILLO", "MENDOZA", "RAMÍREZ", "ESPINOZA",
+    "CRUZ", "GUTIÉRREZ", "CÓRDOVA", "MORALES", "CASTRO", "VARGAS", "REYES", "ORTIZ", "HERRERA", "SALAZAR",
+    "MEDINA", "AGUILAR", "PALACIOS", "CAMPOS", "VEGA", "RÍOS", "LEÓN", "NÚÑEZ", "SOTO", "CARDENAS",
+    "PAREDES", "CHOQUE", "APAZA", "TICONA", "CONDORI", "CCAMA", "YUPANQUI", "INGA", "POMA", "VILCA",
+    "ALVARADO", "BENITES", "CABRERA", "DELGADO", "ESCOBAR", "FERNÁNDEZ", "GUERRERO", "IBÁÑEZ", "JIMÉNEZ", "LUNA",
+]
+
+GIVEN_NAMES = [
+    "JOSÉ", "MARÍA", "JUAN", "ROSA", "LUIS", "ANA", "CARLOS", "LUCÍA", "JORGE", "ELENA",
+    "MIGUEL", "SOFÍA", "DIEGO", "CARMEN", "ÁNGEL", "VALERIA", "RAÚL", "CAMILA", "ÓSCAR", "XIMENA",
+    "PEDRO", "ANDREA", "HUGO", "NICOLE", "MARCO", "DANIELA", "CÉSAR", "FERNANDA", "JESÚS", "ALEJANDRA",
+    "VÍCTOR", "GABRIELA", "MANUEL", "PAOLA", "RENZO", "MILAGROS", "EDUARDO", "YESENIA", "ALONSO", "FIORELLA",
+    "SEBASTIÁN", "KIARA", "MATÍAS", "ARIANA", "GAEL", "BRENDA", "THIAGO", "NAYELI", "JHON", "MARYORI",
+]
+
+DEGREES = ["1", "2", "3", "4", "5"]
+
+PERTURBATIONS = [
+    "exacto",
+    "sin_tildes",
+    "apellidos_invertidos",
+    "error_tipeo",
+    "sin_segundo_nombre",
+    "orden_invertido",
+]
+
+
+def strip_accents(name: str) -> str:
+    return name.translate(str.maketrans("ÁÉÍÓÚÑ", "AEIOUN"))
+
+
+def random_student_name(rng: random.Random) -> Tuple[List[str], List[str]]:
+    """Apellidos y nombres al azar, como en la nómina ("APELLIDO APELLIDO, NOMBRE NOMBRE")"""
+    surnames = rng.sample(SURNAMES, 2)
+    given_names = rng.sample(GIVEN_NAMES, rng.choice([1, 2, 2]))
+    return surnames, given_names
+
+
+def format_name(surnames: List[str], given_names: List[str]) -> str:
+    return f"{' '.join(surnames)}, {' '.join(given_names)}"
+
+
+def typo(name: str, rng: random.Random) -> str:
+    """Cambia, quita o intercambia una letra del nombre"""
+    positions = [i for i, char in enumerate(name) if char.isalpha()]
+    i = rng.choice(positions)
+    kind = rng.choice(["cambio", "omision", "intercambio"])
+    if kind == "cambio":
+        return name[:i] + rng.choice("ABCDEFGHIJLMNOPRSTUVY") + name[i + 1:]
+    if kind == "omision":
+        return name[:i] + name[i + 1:]
+    if i + 1 < len(name) and name[i + 1].isalpha():
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name[:i] + name[i + 1:]
+
+
+def perturb(surnames: List[str], given_names: List[str], kind: str, rng: random.Random) -> str:
+    """Nombre tal como lo escribiría el alumno en la encuesta"""
+    if kind == "sin_tildes":
+        return strip_accents(format_name(surnames, given_names))
+    if kind == "apellidos_invertidos":
+        return format_name(list(reversed(surnames)), given_names)
+    if kind == "error_tipeo":
+        return typo(format_name(surnames, given_names), rng)
+    if kind == "sin_segundo_nombre":
+        return format_name(surnames, given_names[:1])
+    if kind == "orden_invertido":
+        return f"{' '.join(given_names)} {' '.join(surnames)}"
+    return format_name(surnames, given_names)
+
+
+def build_roster(size: int, rng: random.Random) -> List[Dict]:
+    """Nómina sintética sin nombres repetidos"""
+    roster = []
+    seen = set()
+    while len(roster) < size:
+        surnames, given_names = random_student_name(rng)
+        full_name = format_name(surnames, given_names)
+        if normalize_text(full_name) in seen:
+            continue
+        seen.add(normalize_text(full_name))
+        roster.append({
+            "id": len(roster) + 1,
+            "nombre_completo": full_name,
+            "apellidos": surnames,
+            "nombres": given_names,
+            "grado": rng.choice(DEGREES)
+        })
+    return roster
+
+
+def build_survey(roster: List[Dict], size: int, unknown_ratio: float, rng: random.Random) -> List[Dict]:
+    """
+    Hoja de encuesta sintética: cada fila tiene el nombre escrito, el grado y el id correcto
+    (None si el alumno no está en la nómina)
+    """
+    known_names = {normalize_text(student["nombre_completo"]) for student in roster}
+    rows = []
+    for _ in range(size):
+        if rng.random() < unknown_ratio:
+            while True:
+                surnames, given_names = random_student_name(rng)
+                if normalize_text(format_name(surnames, given_names)) not in known_names:
+                    break
+            rows.append({
+                "nombre": format_name(surnames, given_names),
+                "grado": rng.choice(DEGREES),
+                "esperado": None,
+                "variacion": "desconocido"
+            })
+            continue
+
+        student = rng.choice(roster)
+        kind = rng.choice(PERTURBATIONS)
+        rows.append({
+            "nombre": perturb(student["apellidos"], student["nombres"], kind, rng),
+            "grado": student["grado"],
+            "esperado": student["id"],
+            "variacion": kind
+        })
+    return rows
+
+
+def linear_matcher(roster: List[Dict], threshold: float) -> Callable:
+    """Búsqueda lineal contra toda la nómina (comportamiento anterior al índice)"""
+    candidates = [(student["id"], normalize_text(student["nombre_completo"])) for student in roster]
+
+    def match(rows: List[Dict]) -> List[Tuple[Optional[int], float]]:
+        return [linear_best_match(normalize_text(row["nombre"]), candidates) for row in rows]
+    return match
+
+
+def index_matcher(name_index: StudentNameIndex, threshold: float) -> Callable:
+    """Índice invertido, una búsqueda por fila"""
+    def match(rows: List[Dict]) -> List[Tuple[Optional[int], float]]:
+        return [name_index.best_match(row["nombre"], scope=row["grado"], threshold=threshold) for row in rows]
+    return match
+
+
+def batch_matcher(name_index: StudentNameIndex, threshold: float, use_rapidfuzz: bool) -> Callable:
+    """Índice invertido más puntuación en lote de toda la hoja"""
+    matcher = BatchNameMatcher(name_index, use_rapidfuzz=use_rapidfuzz)
+
+    def match(rows: List[Dict]) -> List[Tuple[Optional[int], float]]:
+        best_ids, best_scores = matcher.match(
+            [row["nombre"] for row in rows],
+            [row["grado"] for row in rows],
+            threshold
+        )
+        return [
+            (int(student_id) if student_id >= 0 else None, float(score))
+            for student_id, score in zip(best_ids, best_scores)
+        ]
+    return match
+
+
+def evaluate(rows: List[Dict], matches: List[Tuple[Optional[int], float]], threshold: float) -> Dict:
+    """Calcula precisión y recall, en total y por tipo de variación"""
+    accepted = correct = 0
+    known = sum(1 for row in rows if row["esperado"] is not None)
+    by_variation = {}
+
+    for row, (student_id, score) in zip(rows, matches):
+        is_accepted = student_id is not None and score >= threshold
+        is_correct = is_accepted and student_id == row["esperado"]
+        accepted += is_accepted
+        correct += is_correct
+
+        stats = by_variation.setdefault(row["variacion"], {"filas": 0, "correctos": 0, "aceptados": 0})
+        stats["filas"] += 1
+        stats["correctos"] += is_correct
+        stats["aceptados"] += is_accepted
+
+    return {
+        "precision": round(correct / accepted, 4) if accepted else 0.0,
+        "recall": round(correct / known, 4) if known else 0.0,
+        "aceptados": accepted,
+        "correctos": correct,
+        "variaciones": by_variation
+    }
+
+
+def run(sizes: List[int], survey_size: int, threshold: float, unknown_ratio: float,
+        max_linear: int, seed: int) -> List[Dict]:
+    results = []
+    for size in sizes:
+        rng = random.Random(seed)
+        roster = build_roster(size, rng)
+        rows = build_survey(roster, survey_size, unknown_ratio, rng)
+
+        started_at = time.perf_counter()
+        name_index = StudentNameIndex.from_tuples(
+            ((student["id"], student["nombre_completo"]) for student in roster),
+            ((student["id"], student["grado"]) for student in roster)
+        )
+        index_seconds = time.perf_counter() - started_at
+
+        matchers = {}
+        if size <= max_linear:
+            matchers["lineal"] = linear_matcher(roster, threshold)
+        matchers["indice"] = index_matcher(name_index, threshold)
+        matchers["lote_difflib"] = batch_matcher(name_index, threshold, use_rapidfuzz=False)
+        if cdist is not None:
+            matchers["lote_rapidfuzz"] = batch_matcher(name_index, threshold, use_rapidfuzz=True)
+
+        for name, match in matchers.items():
+            started_at = time.perf_counter()
+            matches = match(rows)
+            seconds = time.perf_counter() - started_at
+
+            result = {
+                "alumnos": size,
+                "filas": len(rows),
+                "estrategia": name,
+                "segundos": round(seconds, 3),
+                "nombres_por_segundo": round(len(rows) / seconds, 1) if seconds > 0 else None,
+                "segundos_indice": round(index_seconds, 3) if name != "lineal" else 0.0,
+                **evaluate(rows, matches, threshold)
+            }
+            results.append(result)
+            print(
+                f"{size:>7} alumnos | {name:<15} | {result['nombres_por_segundo']:>10} nombres/s | "
+                f"precisión {result['precision']:.3f} | recall {result['recall']:.3f}"
+            )
+            sys.stdout.flush()
+    return results
+
+
+def print_variations(results: List[Dict]):
+    """Recall por tipo de variación de cada estrategia"""
+    print("\n=== RECALL POR VARIACIÓN ===")
+    for result in results:
+        parts = []
+        for variation, stats in sorted(result["variaciones"].items()):
+            if variation == "desconocido":
+                parts.append(f"{variation}: {stats['aceptados']}/{stats['filas']} aceptados por error")
+            else:
+                parts.append(f"{variation}: {stats['correctos']}/{stats['filas']}")
+        print(f"{result['alumnos']:>7} {result['estrategia']:<15} " + ", ".join(parts))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mide velocidad y exactitud del emparejamiento de nombres de encuestas.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="Tamaños de nómina")
+    parser.add_argument("--survey-size", type=int, default=500, help="Filas de la hoja de encuesta")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Umbral de similitud (matching_threshold)")
+    parser.add_argument("--unknown-ratio", type=float, default=0.2, help="Proporción de nombres que no están en la nómina")
+    parser.add_argument("--max-linear", type=int, default=10000, help="Nómina máxima para medir la búsqueda lineal")
+    parser.add_argument("--seed", type=int, default=7, help="Semilla de los datos sintéticos")
+    parser.add_argument("--json", help="Ruta donde guardar los resultados en JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.survey_size, args.threshold, args.unknown_ratio, args.max_linear, args.seed)
+    print_variations(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.students.controllers import router as student_router
 from app.api.v1.common.controllers import router as common_router
 from app.api.v1.survey.controller import router as survey_router
-from app.db.database import Base, engine
+from app.db.database import engine
+from app.db.schema import prepare_schema
 from app.core.config import settings
+from app.core.responses import FastJSONResponse
 
-Base.metadata.create_all(bind=engine)
+prepare_schema(engine)
 
-app = FastAPI()
+# orjson para todas las respuestas; los endpoints de datos además negocian MessagePack
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
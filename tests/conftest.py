@@ -0,0 +1,24 @@
+import os
+
+# La configuración exige DATABASE_URL al importarse; las pruebas usan su propia base SQLite en memoria
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import app.api.v1.students.models  # noqa: F401  registra las tablas en Base
+from app.db.database import Base
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre una base SQLite en memoria nueva para cada prueba"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,34 @@
+from app.commands.bulk_import import group_by_cohort, skip_duplicates
+
+
+def prepared(file, content_hash, cohorts):
+    return {"file": file, "content_hash": content_hash, "cohorts": cohorts, "error": None}
+
+
+def test_identical_workbooks_are_loaded_once():
+    workbooks = [
+        prepared("a.xlsx", "1" * 64, [("SECUNDARIA", "2024", "PRIMERO", "A")]),
+        prepared("copia de a.xlsx", "1" * 64, [("SECUNDARIA", "2024", "PRIMERO", "A")]),
+        prepared("b.xlsx", "2" * 64, [("SECUNDARIA", "2024", "PRIMERO", "B")]),
+    ]
+
+    unique = skip_duplicates(workbooks)
+
+    assert [result["file"] for result in unique] == ["a.xlsx", "b.xlsx"]
+    assert workbooks[1]["duplicate_of"] == "a.xlsx"
+
+
+def test_workbooks_sharing_a_cohort_go_to_the_same_group():
+    workbooks = [
+        prepared("1a.xlsx", "1" * 64, [("SECUNDARIA", "2024", "PRIMERO", "A")]),
+        prepared("1a-1b.xlsx", "2" * 64, [("SECUNDARIA", "2024", "PRIMERO", "A"), ("SECUNDARIA", "2024", "PRIMERO", "B")]),
+        prepared("1b.xlsx", "3" * 64, [("SECUNDARIA", "2024", "PRIMERO", "B")]),
+        prepared("2a.xlsx", "4" * 64, [("SECUNDARIA", "2024", "SEGUNDO", "A")]),
+    ]
+
+    groups = group_by_cohort(workbooks)
+
+    assert sorted(sorted(result["file"] for result in group) for group in groups) == [
+        ["1a-1b.xlsx", "1a.xlsx", "1b.xlsx"],
+        ["2a.xlsx"],
+    ]
@@ -0,0 +1,151 @@
+import pandas as pd
+from app.api.v1.students.models import Alumno, HistorialAcademico, Materia, Nota, PerfilAlumno
+from app.api.v1.students.repositories.student import StudentRepository
+from app.api.v1.students.services.grades_loader import GradesLoader, LONG_FORMAT_COLUMNS
+from app.api.v1.students.services.students import Student
+from app.api.v1.students.services.upload_artifacts import UploadArtifactStore
+
+
+def long_format(rows):
+    """Formato largo con los valores de cada fila que cambian entre pruebas"""
+    base = {
+        "nivel": "SECUNDARIA",
+        "anio": "2024",
+        "grado": "PRIMERO",
+        "seccion": "A",
+        "bimestre": "PRIMER BIMESTRE",
+        "genero": "MASCULINO",
+        "codigo_materia": "MAT",
+        "nombre_materia": "MATEMÁTICA",
+    }
+    return pd.DataFrame([{**base, **row} for row in rows], columns=LONG_FORMAT_COLUMNS)
+
+
+GRADES = long_format([
+    {"codigo_alumno": "A1", "nombre_alumno": "PEREZ LOPEZ, JUAN", "criterio": "01 = Resuelve problemas", "valor_criterio": "Resuelve", "nivel_logro": "A"},
+    {"codigo_alumno": "A1", "nombre_alumno": "PEREZ LOPEZ, JUAN", "criterio": "02 = Comunica", "valor_criterio": "Comunica", "nivel_logro": "B"},
+    {"codigo_alumno": "A2", "nombre_alumno": "DIAZ RUIZ, ANA", "criterio": "01 = Resuelve problemas", "valor_criterio": "Resuelve", "nivel_logro": "C"},
+    {"codigo_alumno": "A2", "nombre_alumno": "DIAZ RUIZ, ANA", "criterio": "02 = Comunica", "valor_criterio": "Comunica", "nivel_logro": "No calificado"},
+])
+
+
+def achievement_values(db):
+    return sorted(
+        (note.historial.alumno.codigo_alumno, note.criterio_evaluacion.nombre, note.nivel_logro.valor)
+        for note in db.query(Nota)
+    )
+
+
+def test_load_creates_students_histories_and_notes(db):
+    result = GradesLoader(db).load(GRADES)
+
+    assert result["notas_insertadas"] == 4
+    assert db.query(Alumno).count() == 2
+    assert db.query(HistorialAcademico).count() == 2
+    assert ("A1", "Resuelve problemas", "A") in achievement_values(db)
+    # Las cargas dejan listos los documentos de análisis de sus alumnos
+    assert db.query(PerfilAlumno).count() == 4
+
+
+def test_load_with_replace_is_idempotent(db):
+    loader = GradesLoader(db)
+    loader.load(GRADES)
+    first = achievement_values(db)
+
+    loader.load(GRADES, replace=True)
+    loader.load(GRADES, replace=True)
+
+    assert achievement_values(db) == first
+    assert db.query(Alumno).count() == 2
+    assert db.query(HistorialAcademico).count() == 2
+
+
+def test_load_with_replace_overwrites_only_its_subject_and_bimester(db):
+    loader = GradesLoader(db)
+    loader.load(GRADES)
+    other_bimester = GRADES.assign(bimestre="SEGUNDO BIMESTRE")
+    loader.load(other_bimester)
+
+    corrected = GRADES.assign(nivel_logro="AD")
+    loader.load(corrected, replace=True)
+
+    levels = {}
+    for note in db.query(Nota):
+        levels.setdefault(note.bimestre.nombre, []).append(note.nivel_logro.valor)
+    assert sorted(levels["PRIMER BIMESTRE"]) == ["AD", "AD", "AD", "AD"]
+    assert sorted(levels["SEGUNDO BIMESTRE"]) == ["A", "B", "C", "No calificado"]
+
+
+def test_bimester_not_applicable_is_stored_in_every_bimester(db):
+    GradesLoader(db).load(GRADES.assign(bimestre="NO APLICA"))
+
+    assert db.query(Nota).count() == 16
+
+
+def test_replay_of_an_artifact_does_not_duplicate_notes(db, tmp_path, monkeypatch):
+    store = UploadArtifactStore(str(tmp_path))
+    content_hash = UploadArtifactStore.content_hash(b"libro de notas")
+    store.save("secundaria", content_hash, GRADES)
+    monkeypatch.setattr(
+        "app.api.v1.students.services.grades_loader.UploadArtifactStore",
+        lambda: UploadArtifactStore(str(tmp_path))
+    )
+
+    loader = GradesLoader(db)
+    loader.load(GRADES)
+    result = loader.replay("secundaria")
+    loader.replay("secundaria", content_hash)
+
+    assert result["total_artefactos"] == 1
+    assert result["artefactos"][0]["notas_insertadas"] == 4
+    assert db.query(Nota).count() == 4
+
+
+def test_replace_of_an_upload_drops_its_notes_from_an_older_mapping(db):
+    loader = GradesLoader(db)
+    content_hash = UploadArtifactStore.content_hash(b"libro de notas")
+    loader.load(GRADES, content_hash=content_hash)
+    other_upload = UploadArtifactStore.content_hash(b"otro libro")
+    loader.load(GRADES.assign(bimestre="TERCER BIMESTRE"), content_hash=other_upload)
+
+    # El mismo archivo leído con otro mapeo termina en otro bimestre: no deben quedar las notas anteriores
+    loader.load(GRADES.assign(bimestre="SEGUNDO BIMESTRE"), replace=True, content_hash=content_hash)
+
+    bimesters = sorted({note.bimestre.nombre for note in db.query(Nota)})
+    assert bimesters == ["SEGUNDO BIMESTRE", "TERCER BIMESTRE"]
+    assert db.query(Nota).count() == 8
+
+
+def test_course_found_by_code_takes_its_name_from_courses_json(db):
+    db.add(Materia(nombre="ARTE", codigo="0001-ART Y CULT"))
+    db.commit()
+
+    GradesLoader(db).load(GRADES.assign(codigo_materia="0001-ART Y CULT", nombre_materia=None))
+
+    assert [course.nombre for course in db.query(Materia)] == ["ARTE Y CULTURA"]
+
+
+def test_academic_history_keeps_bimesters_with_only_ungraded_notes(db):
+    ungraded = GRADES.assign(bimestre="SEGUNDO BIMESTRE", nivel_logro="No calificado")
+    GradesLoader(db).load(pd.concat([GRADES, ungraded]))
+    student_id = db.query(Alumno.id).filter(Alumno.codigo_alumno == "A2").scalar()
+
+    [period] = StudentRepository(db)._academic_histories([student_id])[student_id]
+
+    first, second = period["bimestres"]
+    assert first["bimestre_nombre"] == "PRIMER BIMESTRE"
+    assert [grade["achievement"] for grade in first["materias"][0]["grades"]] == ["C"]
+    assert second["bimestre_nombre"] == "SEGUNDO BIMESTRE"
+    assert second["materias"] == []
+
+
+def test_updating_a_student_refreshes_its_profiles(db):
+    GradesLoader(db).load(GRADES)
+    student_id = db.query(Alumno.id).filter(Alumno.codigo_alumno == "A1").scalar()
+
+    Student(db).update_student(student_id, age=14)
+
+    document = db.query(PerfilAlumno.documento).filter(
+        PerfilAlumno.alumno_id == student_id, PerfilAlumno.tipo == "rendimiento"
+    ).scalar()
+    assert document["demographic_features"]["age"] == 14
@@ -0,0 +1,82 @@
+import random
+import pytest
+from app.api.v1.survey.services.name_matching import BatchNameMatcher, StudentNameIndex, cdist
+
+SURNAMES = ["GARCIA", "RODRIGUEZ", "QUISPE", "FLORES", "HUAMAN", "MAMANI", "SANCHEZ", "TORRES", "RAMOS", "DIAZ"]
+GIVEN_NAMES = ["JUAN", "MARIA", "JOSE", "ANA", "LUIS", "ROSA", "CARLOS", "LUCIA", "PEDRO", "SOFIA"]
+DEGREES = ["1", "2", "3"]
+
+
+def random_name(rng):
+    return f"{' '.join(rng.sample(SURNAMES, 2))}, {' '.join(rng.sample(GIVEN_NAMES, 2))}"
+
+
+def perturb(name, rng):
+    """Quita una letra, intercambia apellidos o deja el nombre igual"""
+    surnames, given_names = name.split(", ")
+    choice = rng.randrange(3)
+    if choice == 0:
+        position = rng.randrange(len(name))
+        return name[:position] + name[position + 1:]
+    if choice == 1:
+        return f"{' '.join(reversed(surnames.split()))}, {given_names}"
+    return name
+
+
+@pytest.fixture(scope="module")
+def name_index():
+    rng = random.Random(3)
+    roster = {random_name(rng) for _ in range(300)}
+    return StudentNameIndex.from_tuples(
+        enumerate(sorted(roster), start=1),
+        ((student_id, rng.choice(DEGREES)) for student_id in range(1, len(roster) + 1))
+    )
+
+
+@pytest.mark.skipif(cdist is None, reason="rapidfuzz no está instalado")
+def test_rapidfuzz_and_difflib_give_the_same_matches(name_index):
+    rng = random.Random(11)
+    names = [perturb(name, rng) for name in rng.sample(sorted(name_index.names.values()), 120)]
+    names += [random_name(rng) for _ in range(30)]
+    degrees = [rng.choice(DEGREES + [None]) for _ in names]
+
+    rapidfuzz_ids, rapidfuzz_scores = BatchNameMatcher(name_index, use_rapidfuzz=True).match(names, degrees, 0.85)
+    difflib_ids, difflib_scores = BatchNameMatcher(name_index, use_rapidfuzz=False).match(names, degrees, 0.85)
+
+    assert rapidfuzz_ids.tolist() == difflib_ids.tolist()
+    assert rapidfuzz_scores.tolist() == difflib_scores.tolist()
+
+
+def test_batch_matches_agree_with_one_by_one_matching(name_index):
+    rng = random.Random(5)
+    names = [perturb(name, rng) for name in rng.sample(sorted(name_index.names.values()), 60)]
+    degrees = [rng.choice(DEGREES) for _ in names]
+
+    best_ids, best_scores = BatchNameMatcher(name_index).match(names, degrees, 0.85)
+
+    for name, degree, student_id, score in zip(names, degrees, best_ids, best_scores):
+        expected_id, expected_score = name_index.best_match(name, scope=degree, threshold=0.85)
+        assert (int(student_id) if student_id >= 0 else None, float(score)) == (expected_id, expected_score)
+
+
+def test_difflib_pool_gives_the_same_matches_as_in_process(name_index):
+    rng = random.Random(17)
+    names = [perturb(name, rng) for name in rng.sample(sorted(name_index.names.values()), 80)]
+    degrees = [rng.choice(DEGREES + [None]) for _ in names]
+
+    serial_ids, serial_scores = BatchNameMatcher(name_index, workers=1, use_rapidfuzz=False).match(names, degrees, 0.85)
+    pooled = BatchNameMatcher(name_index, workers=2, chunk_size=16, min_parallel_comparisons=0, use_rapidfuzz=False)
+    pooled_ids, pooled_scores = pooled.match(names, degrees, 0.85)
+
+    assert pooled_ids.tolist() == serial_ids.tolist()
+    assert pooled_scores.tolist() == serial_scores.tolist()
+
+
+def test_removed_students_are_no_longer_matched():
+    name_index = StudentNameIndex.from_tuples([(1, "PEREZ LOPEZ JUAN"), (2, "PEREZ LOPEZ JUANA")])
+
+    name_index.remove(1)
+
+    student_id, _ = name_index.best_match("PEREZ LOPEZ JUAN")
+    assert student_id == 2
+    assert 1 not in name_index.candidates("perez lopez juan")
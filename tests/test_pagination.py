@@ -0,0 +1,112 @@
+import base64
+import json
+import pytest
+from fastapi import HTTPException
+from app.api.v1.students.models import Alumno
+from app.api.v1.students.repositories.student import StudentRepository
+from app.api.v1.students.services.students import Student
+from app.utils.pagination import (
+    count_total, decode_cursor, encode_cursor, invalidate_cached_counts, keyset_page, offset_page
+)
+
+
+@pytest.fixture
+def students(db):
+    """25 alumnos; los de id par se llaman GARCIA para probar la búsqueda"""
+    db.add_all([
+        Alumno(nombre_completo=f"{'GARCIA' if number % 2 == 0 else 'PEREZ'} ALUMNO {number}", genero="MASCULINO")
+        for number in range(1, 26)
+    ])
+    db.commit()
+    invalidate_cached_counts()
+    return [student_id for student_id, in db.query(Alumno.id).order_by(Alumno.id)]
+
+
+def walk_keyset(query, limit):
+    """Recorre todas las páginas por cursor y retorna los ids de cada página"""
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(query, Alumno.id, cursor, limit)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(id=1234, nombre="PÉREZ")
+
+    assert decode_cursor(cursor) == {"id": 1234, "nombre": "PÉREZ"}
+    # Seguro para la URL y sin relleno
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", [
+    "no es un cursor",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(json.dumps({"otro": 1}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"id": "1"}).encode()).decode(),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit", [1, 5, 7, 25, 30])
+def test_keyset_pages_cover_every_row_once(db, students, limit):
+    pages = walk_keyset(db.query(Alumno.id), limit)
+
+    assert [student_id for page in pages for student_id in page] == students
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+
+
+def test_offset_cursor_continues_with_keyset(db, students):
+    query = db.query(Alumno.id)
+    first_page, cursor = offset_page(query, Alumno.id, page=2, page_size=10)
+    next_page, _ = keyset_page(query, Alumno.id, cursor, 10)
+
+    assert [row.id for row in first_page] == students[10:20]
+    assert [row.id for row in next_page] == students[20:]
+    assert offset_page(query, Alumno.id, page=3, page_size=10)[1] is None
+
+
+def test_count_strategies(db, students):
+    query = db.query(Alumno.id)
+
+    assert count_total(query, "exact") == 25
+    # Fuera de PostgreSQL la estimación cuenta exacto
+    assert count_total(query, "estimated") == 25
+
+    assert count_total(query, "cached", "alumnos") == 25
+    db.add(Alumno(nombre_completo="NUEVO ALUMNO", genero="FEMENINO"))
+    db.commit()
+    assert count_total(query, "cached", "alumnos") == 25
+    invalidate_cached_counts()
+    assert count_total(query, "cached", "alumnos") == 26
+
+    with pytest.raises(ValueError):
+        count_total(query, "aproximado")
+
+
+def test_student_list_by_cursor_matches_pages(db, students):
+    repository = StudentRepository(db)
+    by_page = repository.get_all_students_with_associated_data(page=1, page_size=20, search="garcia")
+
+    seen, cursor = [], None
+    while True:
+        result = repository.get_all_students_with_associated_data(search="garcia", after=cursor, limit=4)
+        seen.extend(student["id"] for student in result["students"])
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+
+    assert by_page["total_records"] == 12
+    assert seen == [student["id"] for student in by_page["students"]] == students[1::2]
+
+
+def test_invalid_cursor_is_a_bad_request(db, students):
+    with pytest.raises(HTTPException) as error:
+        Student(db).get_students(1, 10, after="no-es-un-cursor")
+
+    assert error.value.status_code == 400
+    assert error.value.detail == "El cursor no es válido"
@@ -0,0 +1,65 @@
+from app.api.v1.students.models import Alumno, Encuesta, HistorialAcademico, Nota
+from app.api.v1.students.repositories.student import StudentRepository
+from app.api.v1.students.services.student_deduplication import StudentDeduplicator
+
+
+def add_history(db, history_id, student_id, year, scopes):
+    """Historial con dos notas por cada (materia, bimestre) indicado; el valor indica de qué historial vienen"""
+    db.add(HistorialAcademico(id=history_id, alumno_id=student_id, anio_academico_id=year, nivel_id=1, grado_id=1, seccion_id=1))
+    for subject_id, bimester_id in scopes:
+        for criteria_id in (1, 2):
+            db.add(Nota(
+                historial_id=history_id, materia_id=subject_id, bimestre_id=bimester_id,
+                criterio_evaluacion_id=criteria_id, valor_criterio_de_evaluacion=f"h{history_id}"
+            ))
+
+
+def test_merge_collapses_histories_of_the_same_cohort(db):
+    db.add_all([Alumno(id=student_id, nombre_completo=f"ALUMNO {student_id}", genero="MASCULINO") for student_id in (1, 2, 3)])
+    add_history(db, 10, 1, 2024, [(1, 1)])
+    add_history(db, 20, 2, 2024, [(1, 1), (2, 1)])
+    add_history(db, 30, 3, 2024, [(2, 1), (3, 1)])
+    add_history(db, 40, 3, 2025, [(1, 1)])
+    db.commit()
+
+    result = StudentRepository(db).merge_students({2: 1, 3: 1})
+
+    assert result["historiales_unidos"] == 2
+    assert db.query(HistorialAcademico.id, HistorialAcademico.alumno_id).order_by(HistorialAcademico.id).all() == [(10, 1), (40, 1)]
+    # Cada materia y bimestre queda con las notas de un solo historial, primero las del conservado
+    notes = sorted((note.historial_id, note.materia_id, note.valor_criterio_de_evaluacion) for note in db.query(Nota))
+    assert notes == [
+        (10, 1, "h10"), (10, 1, "h10"),
+        (10, 2, "h20"), (10, 2, "h20"),
+        (10, 3, "h30"), (10, 3, "h30"),
+        (40, 1, "h40"), (40, 1, "h40"),
+    ]
+    assert db.query(Alumno.id).all() == [(1,)]
+
+
+def test_merge_keeps_the_latest_survey_of_each_year(db):
+    db.add_all([Alumno(id=student_id, nombre_completo=f"ALUMNO {student_id}", genero="MASCULINO") for student_id in (1, 2)])
+    db.add_all([Encuesta(id=1, alumno_id=1, anio=1), Encuesta(id=2, alumno_id=2, anio=1), Encuesta(id=3, alumno_id=2, anio=2)])
+    db.commit()
+
+    result = StudentRepository(db).merge_students({2: 1})
+
+    assert result["encuestas_eliminadas"] == 1
+    assert db.query(Encuesta.id, Encuesta.alumno_id).order_by(Encuesta.id).all() == [(2, 1), (3, 1)]
+
+
+def test_common_surnames_are_sub_blocked_and_reported():
+    names = [
+        "GARCIA LOPEZ, ANA", "GARCIA LOPES, ANA", "GARCIA RUIZ, BETO", "GARCIA RUIS, BETO",
+        "GARCIA DIAZ, ALBERTO", "GARCIA PAZ, ALICIA", "GARCIA SOTO, ARTURO",
+    ]
+    students = {
+        student_id: {"id": student_id, "nombre_completo": name}
+        for student_id, name in enumerate(names, start=1)
+    }
+
+    pairs, skipped = StudentDeduplicator(None, max_block_size=3).candidate_pairs(students)
+
+    # El bloque GARCIA se divide por inicial: la B se compara y la A sigue siendo muy grande
+    assert pairs == {(3, 4)}
+    assert skipped == [{"apellido": "garcia", "inicial": "a", "alumnos": 5}]
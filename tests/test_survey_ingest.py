@@ -0,0 +1,105 @@
+import io
+import pandas as pd
+from app.api.v1.students.models import Alumno, Encuesta, RespuestaEncuesta, RespuestaEncuestaCompacta, RespuestaTextoEncuesta
+from app.api.v1.survey.services.survey_layout import SURVEY_LAYOUT, SURVEY_TEXT_LAYOUT, SurveyDecoder
+from app.api.v1.survey.services.survey_processor import SurveyProcessor
+
+STUDENTS = [
+    {"nombres": "JUAN CARLOS", "apellidos": "PEREZ LOPEZ", "grado": "1", "edad": 12},
+    {"nombres": "ANA MARIA", "apellidos": "DIAZ RUIZ", "grado": "1", "edad": 13},
+]
+
+
+def survey_workbook(students, option=0) -> bytes:
+    """
+    Hoja de encuestas como la de la plantilla: una columna de índice, la fila de encabezado y tres filas
+    de títulos antes de los alumnos. Cada alumno marca la opción indicada en todas las preguntas cerradas.
+    """
+    width = SurveyDecoder().width + 1
+    rows = [[None] * width for _ in range(3)]
+    for number, student in enumerate(students, start=1):
+        row = [None] * width
+        row[0] = number
+        # Las posiciones del procesador no cuentan la columna de índice
+        row[1], row[2], row[3], row[4] = student["nombres"], student["apellidos"], student["grado"], student["edad"]
+        row[5] = "x"
+        for question in SURVEY_LAYOUT:
+            row[question["columna"] + option + 1] = "x"
+        row[SURVEY_TEXT_LAYOUT[0]["columna"] + 1] = f"Más práctica, opción {option}"
+        rows.append(row)
+
+    buffer = io.BytesIO()
+    pd.DataFrame(rows, columns=[f"columna {i}" for i in range(width)]).to_excel(buffer, index=False, sheet_name="1A")
+    return buffer.getvalue()
+
+
+def survey_counts(db):
+    return {
+        "alumnos": db.query(Alumno).count(),
+        "encuestas": db.query(Encuesta).count(),
+        "respuestas": db.query(RespuestaEncuesta).count(),
+        "respuestas_texto": db.query(RespuestaTextoEncuesta).count(),
+        "compactas": db.query(RespuestaEncuestaCompacta).count(),
+    }
+
+
+def test_survey_upload_creates_students_and_answers(db):
+    stats = SurveyProcessor(db).process_student_survey(survey_workbook(STUDENTS))
+
+    assert stats["created_new"] == 2
+    assert survey_counts(db) == {
+        "alumnos": 2,
+        "encuestas": 2,
+        "respuestas": 2 * len(SURVEY_LAYOUT),
+        "respuestas_texto": 2,
+        "compactas": 2,
+    }
+    assert {student.edad for student in db.query(Alumno)} == {12, 13}
+
+
+def test_uploading_the_same_survey_twice_does_not_duplicate_anything(db):
+    workbook = survey_workbook(STUDENTS)
+    SurveyProcessor(db).process_student_survey(workbook)
+    first = survey_counts(db)
+
+    stats = SurveyProcessor(db).process_student_survey(workbook)
+
+    assert stats["created_new"] == 0
+    assert stats["matched_without_grades"] == 2
+    assert survey_counts(db) == first
+
+
+def test_uploading_a_corrected_survey_replaces_the_answers(db):
+    SurveyProcessor(db).process_student_survey(survey_workbook(STUDENTS, option=0))
+    first = survey_counts(db)
+
+    SurveyProcessor(db).process_student_survey(survey_workbook(STUDENTS, option=1))
+
+    assert survey_counts(db) == first
+    # Todas las preguntas tienen al menos dos opciones; la segunda es el código 2, o el bit 1 si es múltiple
+    expected = [2 ** 1 if question["multiple"] else 2 for question in SURVEY_LAYOUT]
+    assert all(row.codigos == expected for row in db.query(RespuestaEncuestaCompacta))
+    assert {row.texto for row in db.query(RespuestaTextoEncuesta)} == {"Más práctica, opción 1"}
+
+
+def test_answer_matrix_filters_by_academic_year_value(db):
+    processor = SurveyProcessor(db)
+    processor.process_student_survey(survey_workbook(STUDENTS))
+
+    matrix = processor.get_answer_matrix(2025)
+
+    assert [survey["anio"] for survey in matrix["encuestas"]] == [2025, 2025]
+    assert processor.get_answer_matrix(2024)["encuestas"] == []
+
+
+def test_a_failed_sheet_leaves_no_students_or_aliases(db, monkeypatch):
+    processor = SurveyProcessor(db)
+
+    def fail(surveys):
+        raise RuntimeError("fallo al guardar")
+    monkeypatch.setattr(processor, "save_sheet_surveys", fail)
+    stats = processor.process_student_survey(survey_workbook(STUDENTS))
+
+    assert stats["errors"] == 2
+    assert stats["aliases_created"] == 0
+    assert survey_counts(db)["alumnos"] == 0